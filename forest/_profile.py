@@ -39,20 +39,17 @@ into values, selectors can do that job on behalf of the view.
 import datetime as dt
 import glob
 import os
+from functools import lru_cache
 from itertools import cycle
 import collections
-from collections import defaultdict
+from collections import namedtuple
 import bokeh.palettes
 import numpy as np
 import netCDF4
-try:
-    import xarray
-except ModuleNotFoundError:
-    xarray = None
+import forest.catalogue
 from forest import geo
 from forest.observe import Observable
 from forest.redux import Action
-from forest.util import initial_time as _initial_time
 from forest.util import to_datetime as _to_datetime
 from forest.screen import SET_POSITION
 try:
@@ -61,8 +58,19 @@ except ModuleNotFoundError:
     iris = None
     # ReadTheDocs can't import iris
 
-#Nanoseconds per second
-NS = 1e-9
+Axes = namedtuple("Axes", ("index", "dimensions", "times", "time_axis",
+                           "pressures", "pressure_axis", "lons", "lats",
+                           "signature"))
+
+
+class UnsupportedFile(Exception):
+    """File layout not supported by netCDF4 fast path"""
+
+
+def _axis(coord_var, dims):
+    """Axis of variable related to 1D coordinate, None if scalar"""
+    if (len(coord_var.dimensions) == 1) and (coord_var.dimensions[0] in dims):
+        return dims.index(coord_var.dimensions[0])
 
 def select_args(state):
     """Select args needed by :func:`ProfileView.render`
@@ -88,10 +96,6 @@ def select_args(state):
             state["position"]["y"],
             state["tools"]["profile"]) + optional
 
-def _find_nearest(value, array):
-    idx = (np.abs(array - value)).argmin()
-    return array[np.array(idx)]
-
 
 class ProfileView(Observable):
     """Profile view
@@ -153,6 +157,9 @@ class ProfileView(Observable):
                 renderers=circles)
         self.figure.add_tools(tool)
 
+        self.args = None
+        forest.catalogue.get_catalogue().subscribe(self)
+
         super().__init__()
 
     @classmethod
@@ -165,8 +172,16 @@ class ProfileView(Observable):
                 loaders[group.label] = ProfileLoader.from_pattern(pattern)
         return cls(figure, loaders)
 
+    def on_catalogue(self):
+        """Redraw once files found during the session have been read"""
+        document = self.figure.document
+        if (document is None) or (self.args is None):
+            return
+        document.add_next_tick_callback(lambda: self.render(*self.args))
+
     def render(self, initial_time, variable, x, y, visible, time=None):
         """Update data for a particular application setting"""
+        self.args = (initial_time, variable, x, y, visible, time)
         if visible:
             assert isinstance(initial_time, dt.datetime), "only support datetime"
             self.figure.title.text = variable
@@ -189,7 +204,9 @@ class ProfileLoader(object):
 
     @classmethod
     def from_pattern(cls, pattern):
-        return cls(sorted(glob.glob(os.path.expanduser(pattern))))
+        loader = cls(sorted(glob.glob(os.path.expanduser(pattern))))
+        loader.locator.pattern = os.path.expanduser(pattern)
+        return loader
 
     def profile(self,
             initial_time,
@@ -212,7 +229,110 @@ class ProfileLoader(object):
 
     def profile_file(self, *args, **kwargs):
         """ Read profile data from a file."""
-        return self._load_cube(*args, **kwargs)
+        try:
+            return self._load_netcdf4(*args, **kwargs)
+        except UnsupportedFile as ex:
+            print("WARNING: {} revert to iris.load_cube".format(ex))
+            return self._load_cube(*args, **kwargs)
+
+    def _load_netcdf4(self, path, variable, lon0, lat0, time=None):
+        """ Read vertical profile hyperslab, e.g. var[t, :, j, i] """
+        axes = self._axes(path, os.path.getmtime(path), variable)
+        if axes is None:
+            return {
+                "x": [],
+                "y": []}
+        i, j = axes.index(lon0, lat0)
+        selected = self.hyperslab(axes, time, j, i)
+        if selected is None:
+            return {
+                "x": [],
+                "y": []}
+        pts, mask = selected
+
+        with netCDF4.Dataset(path) as dataset:
+            values = dataset.variables[variable][pts]
+        values = np.ma.atleast_1d(values)
+        if axes.pressures is None:
+            pressures = np.zeros(values.shape)
+        else:
+            pressures = axes.pressures
+        if (mask is not None) and (mask.shape == values.shape):
+            # Time and pressure share an axis, e.g. dim0
+            values, pressures = values[mask], pressures[mask]
+        return {
+            "x": values,
+            "y": pressures}
+
+    @staticmethod
+    def hyperslab(axes, time, j, i):
+        """Index of all levels at a valid time and horizontal position
+
+        :returns: index tuple and mask along a shared time/pressure
+                  axis, or None if time not in file
+        """
+        pts = [slice(None)] * len(axes.dimensions)
+        pts[-2:] = [j, i]
+        mask = None
+        if axes.times is not None:
+            if time is None:
+                target = axes.times[0]
+            else:
+                target = np.datetime64(_to_datetime(time), "s")
+            mask = axes.times == target
+            if not mask.any():
+                return None
+            if (
+                    (axes.time_axis is not None) and
+                    (axes.time_axis != axes.pressure_axis)):
+                pts[axes.time_axis] = np.where(mask)[0][0]
+                mask = None
+        return tuple(pts), mask
+
+    @lru_cache(maxsize=256)
+    def _axes(self, path, mtime, variable):
+        """Axis meta-data related to variable
+
+        :returns: :class:`Axes` or None if variable not in file
+        :raises UnsupportedFile: if file layout not understood
+        """
+        with netCDF4.Dataset(path) as dataset:
+            try:
+                var = dataset.variables[variable]
+            except KeyError:
+                return None
+            dims = var.dimensions
+            if (len(dims) < 2) or (len(dims) > 4):
+                raise UnsupportedFile(f"{variable} dimensions {dims}")
+            names = list(dims) + getattr(var, "coordinates", "").split()
+            coords = {}
+            for prefix in ("longitude", "latitude", "time", "pressure"):
+                for name in names:
+                    if name.startswith(prefix) and (name in dataset.variables):
+                        coords[prefix] = dataset.variables[name]
+                        break
+            try:
+                lons, lats = coords["longitude"], coords["latitude"]
+            except KeyError:
+                raise UnsupportedFile(f"{variable} longitude/latitude")
+            if (lons.dimensions != dims[-1:]) or (lats.dimensions != dims[-2:-1]):
+                raise UnsupportedFile(f"{variable} curvilinear grid")
+            lons, lats = geo._as_float(lons[:]), geo._as_float(lats[:])
+            index = geo.nearest_index(lons, lats)
+            times, time_axis = None, None
+            if "time" in coords:
+                tvar = coords["time"]
+                times = np.array(
+                    netCDF4.num2date(np.atleast_1d(tvar[:]), units=tvar.units),
+                    dtype="datetime64[s]")
+                time_axis = _axis(tvar, dims)
+            pressures, pressure_axis = None, None
+            if "pressure" in coords:
+                pvar = coords["pressure"]
+                pressures = np.atleast_1d(pvar[:])
+                pressure_axis = _axis(pvar, dims)
+        return Axes(index, dims, times, time_axis, pressures, pressure_axis,
+                    lons, lats, geo.grid_signature(lons, lats))
 
     def _load_cube(self, path, variable, lon0, lat0, time=None):
         """ Load vertical profile slice from file via iris. """
@@ -228,27 +348,23 @@ class ProfileLoader(object):
         # reference longitude axis by "axis='X'" and latitude axis as axis='Y',
         # to accommodate various types of coordinate system.
         # e.g. 'grid_longitude'. See iris.utils.guess_coord_axis.
-        if cube.coord(axis='X').points[-1] > 180.0:
-            # get circular longitude values
-            lon0 = iris.analysis.cartography.wrap_lons(np.asarray(lon0), 0, 360)
-        # Construct constraint
-        lon_nearest = _find_nearest(lon0, cube.coord(axis='X').points)
-        lat_nearest = _find_nearest(lat0, cube.coord(axis='Y').points)
-        coord_values={
-            cube.coord(axis='X').standard_name: (lambda cell: lon_nearest == cell.point),
-            cube.coord(axis='Y').standard_name: (lambda cell: lat_nearest == cell.point),
-            }
-        if time is not None and 'time' in [coord.name() for coord in cube.coords()]:
-            coord_values['time'] = (
-                lambda cell: _to_datetime(time) == cell
-            )
-        constraint = iris.Constraint(coord_values=coord_values)
+        x_coord = cube.coord(axis='X')
+        y_coord = cube.coord(axis='Y')
 
-        # Extract nearest profile
-        cube = cube.extract(constraint)
+        # Index nearest profile
+        i, j = geo.nearest_index(x_coord.points, y_coord.points)(lon0, lat0)
+        pts = [slice(None)] * cube.ndim
+        pts[cube.coord_dims(x_coord)[0]] = i
+        pts[cube.coord_dims(y_coord)[0]] = j
+        cube = cube[tuple(pts)]
+
+        if time is not None and 'time' in [coord.name() for coord in cube.coords()]:
+            constraint = iris.Constraint(
+                time=lambda cell: _to_datetime(time) == cell)
+            cube = cube.extract(constraint)
         assert cube is not None, ("Error: No profile data found for {}\n\t"
                                   "at these coordinates: time,lat,lon {},{},{}").format(
-                                  path, _to_datetime(time), lat_nearest, lon_nearest)
+                                  path, _to_datetime(time), lat0, lon0)
 
         # Get level info and data values
         if 'pressure' in [coord.name() for coord in cube.coords()]:
@@ -268,34 +384,43 @@ class ProfileLoader(object):
 
 
 class ProfileLocator(object):
-    """Helper to find files related to Profile"""
-    def __init__(self, paths):
-        self.paths = paths
-        self.valid_times_to_paths = defaultdict(list)
-        self._ini_times_to_paths = None
+    """Helper to find files related to Profile
+
+    Initial times are shared with :class:`forest.series.SeriesLocator`
+    via :func:`forest.catalogue.get_catalogue`
+
+    :param paths: files to search
+    :param catalogue: optional :class:`forest.catalogue.InitialTimeCatalogue`
+    :param pattern: optional glob pattern to find files added later
+    """
+    def __init__(self, paths, catalogue=None, pattern=None):
+        self._paths = paths
+        self.pattern = pattern
+        self._valid_times = {}  # path to (mtime, keys)
+        self._searched = None
+        if catalogue is None:
+            catalogue = forest.catalogue.get_catalogue()
+        self.catalogue = catalogue
+        self.catalogue.update(paths)
 
     @property
-    def ini_times_to_paths(self):
-        if self._ini_times_to_paths is None:
-            self._ini_times_to_paths = self._map_ini_times_to_paths(self.paths)
-        return self._ini_times_to_paths
+    def paths(self):
+        """Files to search, pattern is re-globbed if one is set"""
+        if self.pattern is None:
+            return self._paths
+        return self.catalogue.glob(self.pattern)
 
-    def _map_ini_times_to_paths(self, paths):
-        """
-        .. note:: Potentially expensive I/O operation
-        """
-        mapping = defaultdict(list)
-        for path in paths:
-            initial_time = _initial_time(path)
-            try:
-                with netCDF4.Dataset(path) as dataset:
-                    if initial_time is None:
-                        var = dataset.variables["forecast_reference_time"]
-                        initial_time = netCDF4.num2date(var[:], units=var.units)
-            except (FileNotFoundError, KeyError) as ex:
-                pass
-            mapping[self.key(initial_time)].append(path)
-        return mapping
+    @property
+    def ini_times_to_paths(self):
+        paths = self.paths
+        if paths is not self._searched:
+            # Forget files that are no longer found
+            known = set(paths)
+            self._valid_times = {path: value for path, value
+                                 in self._valid_times.items()
+                                 if path in known}
+            self._searched = paths
+        return self.catalogue.table(paths)
 
     def initial_times(self):
         return np.array(list(self.ini_times_to_paths.keys()),
@@ -311,25 +436,35 @@ class ProfileLocator(object):
             initial_time_paths = self.ini_times_to_paths[self.key(initial_time)]
         if valid_time is None:
             return initial_time_paths
-        elif xarray is None:
-            return []  # Always return list
-        else:
-            # set valid times
-            for path in initial_time_paths:
-                with xarray.open_dataset(path) as xr_ds:
-                    for name in xr_ds.coords:
-                        if getattr(xr_ds.coords[name], "standard_name", None) == 'time':
-                            times = xr_ds.coords[name].values
-                            try:
-                                for time in times:
-                                    time = dt.datetime.utcfromtimestamp(time.astype(int)*NS)
-                                    self.valid_times_to_paths[self.key(time)].append(path)
-                            except TypeError:
-                                time = dt.datetime.utcfromtimestamp(times.astype(int)*NS)
-                                self.valid_times_to_paths[self.key(time)].append(path)
-                            break
-            valid_time_paths = self.valid_times_to_paths[self.key(valid_time)]
-            return list(set(initial_time_paths).intersection(set(valid_time_paths)))
+        key = self.key(valid_time)
+        return [path for path in initial_time_paths
+                if key in self.valid_times(path)]
+
+    def valid_times(self, path):
+        """Keys of valid times in file, read once per modification time
+
+        .. note:: Index is bounded by the number of files
+        """
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        entry = self._valid_times.get(path)
+        if (entry is None) or (entry[0] != mtime):
+            keys = set()
+            try:
+                with netCDF4.Dataset(path) as dataset:
+                    for var in dataset.variables.values():
+                        if getattr(var, "standard_name", None) != "time":
+                            continue
+                        times = netCDF4.num2date(np.atleast_1d(var[:]),
+                                                 units=var.units)
+                        keys.update(self.key(_to_datetime(t)) for t in times)
+                        break
+            except FileNotFoundError:
+                pass
+            self._valid_times[path] = (mtime, frozenset(keys))
+        return self._valid_times[path][1]
 
     def key(self, time):
-        return "{:%Y-%m-%d %H:%M:%S}".format(time)
+        return forest.catalogue.key(time)
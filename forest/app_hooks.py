@@ -17,10 +17,11 @@ class DatasetSyncCallback:
 
 
 def on_server_loaded(server_context):
-    data.on_server_loaded()
     # Add periodic callback to keep database(s) up to date
     _, argv = forest.cli.main.parse_args()
     config = forest.main.configure(argv)
+    # Natural Earth lines are cached under data.CACHE_DIRECTORY
+    data.on_server_loaded()
     #config = forest.main.configure(parse_forest_args())
     interval_ms = 15 * 60 * 1000  # 15 minutes in miliseconds
     callback = DatasetSyncCallback(list(config.datasets))
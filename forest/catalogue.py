@@ -0,0 +1,254 @@
+"""
+Initial time catalogue
+----------------------
+
+Time series and profile tools need to know which files belong to a
+model run. Most file names contain the initial time, other files
+must be opened to read ``forecast_reference_time``. A single
+:class:`InitialTimeCatalogue` is shared by
+:class:`forest.series.SeriesLocator` and
+:class:`forest._profile.ProfileLocator` so that each file is
+opened at most once per process.
+
+Files are read in a background thread so that document creation is
+never blocked, results are persisted under ``cache: directory:`` so
+that a restarted server only reads files it has not seen before.
+Results are kept with the modification time of the file they were
+read from, modified files and files that could not be read are read
+again. Processes sharing a cache directory merge their results into
+the same file.
+Locators created from a glob pattern re-glob it through
+:meth:`InitialTimeCatalogue.glob` to find files added during a
+session, views subscribed with :meth:`InitialTimeCatalogue.subscribe`
+are told when background reads finish so that they can redraw.
+
+.. autoclass:: InitialTimeCatalogue
+    :members:
+
+.. autofunction:: get_catalogue
+
+"""
+import os
+import json
+import threading
+import weakref
+import datetime as dt
+from collections import defaultdict
+import netCDF4
+import forest.data
+try:
+    import fcntl
+except ImportError:
+    # Windows does not support fcntl
+    fcntl = None
+import forest.util
+from forest.util import initial_time as _initial_time
+
+
+CACHE_FILE = "initial_times.json"
+GLOB_INTERVAL = dt.timedelta(minutes=1)
+
+
+def key(time):
+    """Format time as used by locators"""
+    try:
+        return "{:%Y-%m-%d %H:%M:%S}".format(time)
+    except TypeError:
+        return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class InitialTimeCatalogue:
+    """Map files to initial times, reading each file at most once
+
+    :param cache_path: JSON file to persist results, None for memory only
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._keys = {}  # path to (mtime, key)
+        self._reading = set()
+        self._persisted = self._load()
+        self._queue = []
+        self._thread = None
+        self._globbed = {}
+        self._glob = forest.util.cached_glob(GLOB_INTERVAL)
+        self._subscribers = weakref.WeakSet()
+
+    def glob(self, pattern):
+        """Paths matching pattern, new paths are added to the catalogue
+
+        The file system is searched at most once every GLOB_INTERVAL
+        """
+        paths = self._glob(pattern)
+        if self._globbed.get(pattern) is not paths:
+            self.update(paths)
+            self._globbed[pattern] = paths
+        return paths
+
+    def subscribe(self, subscriber):
+        """Call ``subscriber.on_catalogue()`` when background reads finish
+
+        Subscribers are held by weak reference, the call is made from
+        the background thread
+        """
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def update(self, paths):
+        """Add paths, files that need to be opened are read in background
+
+        Files modified since they were read, or that could not be read,
+        e.g. because they were still being written, are read again
+        """
+        pending = []
+        with self._lock:
+            for path in paths:
+                if path in self._reading:
+                    continue
+                entry = self._keys.get(path)
+                if _current(entry, None):
+                    continue  # Initial time in file name
+                if entry is None:
+                    time = _initial_time(path)
+                    if time is not None:
+                        self._keys[path] = (None, key(time))
+                        continue
+                mtime = _mtime(path)
+                if _current(entry, mtime):
+                    continue
+                entry = self._persisted.get(path)
+                if _current(entry, mtime):
+                    self._keys[path] = tuple(entry)
+                    continue
+                pending.append(path)
+            if len(pending) == 0:
+                return
+            self._reading.update(pending)
+            self._queue += pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work,
+                                                daemon=True)
+                self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until background reads have finished"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def table(self, paths):
+        """Initial time keys mapped to paths known so far
+
+        :returns: defaultdict preserving order of paths
+        """
+        result = defaultdict(list)
+        with self._lock:
+            for path in paths:
+                entry = self._keys.get(path)
+                if (entry is not None) and (entry[1] is not None):
+                    result[entry[1]].append(path)
+        return result
+
+    def _work(self):
+        while True:
+            with self._lock:
+                paths, self._queue = self._queue, []
+            for path in paths:
+                mtime = _mtime(path)
+                value = self.read(path)
+                with self._lock:
+                    self._keys[path] = (mtime, value)
+                    self._persisted[path] = [mtime, value]
+                    self._reading.discard(path)
+            self._save()
+            with self._lock:
+                if len(self._queue) == 0:
+                    # Next update starts a new thread
+                    self._thread = None
+                    subscribers = list(self._subscribers)
+                    break
+        for subscriber in subscribers:
+            subscriber.on_catalogue()
+
+    @staticmethod
+    def read(path):
+        """Read initial time key from file, None if not available"""
+        try:
+            with netCDF4.Dataset(path) as dataset:
+                var = dataset.variables["forecast_reference_time"]
+                time = netCDF4.num2date(var[:], units=var.units)
+        except (OSError, KeyError):
+            return None
+        return key(time)
+
+    def _load(self):
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path) as stream:
+                return json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        """Merge results with those of other processes sharing the file"""
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = self._load()
+                with self._lock:
+                    for path, entry in self._persisted.items():
+                        if _newer(entry, data.get(path)):
+                            data[path] = entry
+                    self._persisted = dict(data)
+                tmp = "{}.{}.{}.tmp".format(self.cache_path, os.getpid(),
+                                            threading.get_ident())
+                with open(tmp, "w") as stream:
+                    json.dump(data, stream)
+                os.replace(tmp, self.cache_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _current(entry, mtime):
+    """True if entry was read from file at mtime and holds a key"""
+    return ((entry is not None) and (entry[0] == mtime) and
+            (entry[1] is not None))
+
+
+def _newer(entry, other):
+    """True if entry should replace an entry saved by another process"""
+    if other is None:
+        return True
+    if (entry[0] == other[0]) and (entry[1] is None):
+        return False  # Keep a key read by another process
+    return (entry[0] or 0) >= (other[0] or 0)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+_CATALOGUE = None
+
+
+def get_catalogue():
+    """Catalogue shared by all locators in this process"""
+    global _CATALOGUE
+    if _CATALOGUE is None:
+        if forest.data.CACHE_DIRECTORY is None:
+            cache_path = None
+        else:
+            cache_path = os.path.join(forest.data.CACHE_DIRECTORY,
+                                      CACHE_FILE)
+        _CATALOGUE = InitialTimeCatalogue(cache_path)
+    return _CATALOGUE
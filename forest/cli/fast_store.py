@@ -0,0 +1,30 @@
+"""
+Copy unified model variables into a store optimised for FOREST
+
+See :mod:`forest.drivers.fast_store` for details of the layout
+"""
+import argparse
+import forest.drivers.fast_store
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="forest fast-store",
+                                     description=__doc__)
+    parser.add_argument(
+        "--directory", required=True, metavar="DIR",
+        help="store to create or extend")
+    parser.add_argument(
+        "--variable", action="append", dest="variables", required=True,
+        metavar="NAME",
+        help="variable to copy, may be repeated")
+    parser.add_argument(
+        "paths", nargs="+", metavar="FILE",
+        help="unified model netcdf files")
+    return parser.parse_args(args=argv)
+
+
+def main(argv=None):
+    args = parse_args(argv=argv)
+    forest.drivers.fast_store.convert(args.paths,
+                                      args.directory,
+                                      args.variables)
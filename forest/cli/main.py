@@ -1,16 +1,30 @@
 """
 Command line interface to FOREST application
+
+Use ``forest prerender --help`` to warm the image cache ahead of time
+and ``forest fast-store --help`` to convert files for faster access
 """
 import os
+import sys
 import argparse
 import bokeh.command.bootstrap
+import forest.cli.fast_store
+import forest.cli.prerender
 from forest.parse_args import add_arguments
 
 
 APP_PATH = os.path.join(os.path.dirname(__file__), "..")
+COMMANDS = {
+    "fast-store": forest.cli.fast_store.main,
+    "prerender": forest.cli.prerender.main
+}
 
 
 def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if (len(argv) > 0) and (argv[0] in COMMANDS):
+        return COMMANDS[argv[0]](argv[1:])
     bokeh.command.bootstrap.main(bokeh_command(APP_PATH, argv=argv))
 
 
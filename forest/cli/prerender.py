@@ -0,0 +1,176 @@
+"""
+Render every frame of the most recent model runs into the image cache
+
+Frames are rendered in parallel through the same loader used by the
+server and stored under the ``cache: directory:`` of the
+configuration file, see :mod:`forest.image_cache`. Frames already in
+the cache are skipped so the command can be run after each model run
+arrives.
+"""
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+from collections import namedtuple
+import forest.config as cfg
+import forest.data
+import forest.db
+import forest.drivers
+import forest.image_cache
+from forest.exceptions import PressuresNotFound
+
+
+Frame = namedtuple("Frame", (
+    "file_type",
+    "settings",
+    "variable",
+    "initial_time",
+    "valid_time",
+    "pressure",
+    "pressures"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="forest prerender",
+                                     description=__doc__)
+    parser.add_argument(
+        "--config-file", required=True, metavar="YAML_FILE",
+        help="YAML file used to configure application")
+    parser.add_argument(
+        "--var", action="append", dest="variables",
+        nargs=2, metavar=("KEY", "VALUE"),
+        help="variable(s) to substitute in --config-file, may be repeated")
+    parser.add_argument(
+        "--cache-directory", metavar="DIR",
+        help="override cache directory specified in --config-file")
+    parser.add_argument(
+        "--latest", type=int, default=1, metavar="N",
+        help="number of most recent initial times to render (default: 1)")
+    parser.add_argument(
+        "--processes", type=int, default=os.cpu_count(), metavar="N",
+        help="number of worker processes (default: number of CPUs)")
+    return parser.parse_args(args=argv)
+
+
+def main(argv=None):
+    args = parse_args(argv=argv)
+    config = cfg.Config.load(
+        args.config_file,
+        variables=cfg.combine_variables(os.environ, args.variables))
+    directory = args.cache_directory or config.cache_directory
+    if directory is None:
+        sys.exit("please specify 'cache: directory:' in --config-file "
+                 "or --cache-directory")
+    forest.data.CACHE_DIRECTORY = directory
+    forest.data.CACHE_MAX_BYTES = config.cache_max_bytes
+    cache = forest.image_cache.ImageCache(os.path.join(directory, "images"))
+
+    todo = []
+    skipped = 0
+    for group in config.file_groups:
+        dataset = forest.drivers.get_dataset(group.file_type, group.settings)
+        if not hasattr(dataset, "image_loader"):
+            print(f"prerender: skip '{group.label}' "
+                  f"file_type '{group.file_type}' not supported")
+            continue
+        for frame in find_frames(group, dataset.navigator(), args.latest):
+            if frame_key(frame) in cache:
+                skipped += 1
+            else:
+                todo.append(frame)
+    print(f"prerender: {len(todo)} frames to render, "
+          f"{skipped} already cached")
+    render_all(todo, directory, config.cache_max_bytes, args.processes)
+
+
+def find_frames(group, navigator, latest):
+    """Frames belonging to the latest initial times of a file group"""
+    pattern = group.pattern
+    for variable in navigator.variables(pattern):
+        initial_times = sorted(navigator.initial_times(pattern, variable))
+        for initial_time in initial_times[-latest:]:
+            valid_times = navigator.valid_times(pattern, variable,
+                                                initial_time)
+            try:
+                pressures = list(navigator.pressures(pattern, variable,
+                                                     initial_time))
+            except PressuresNotFound:
+                pressures = []
+            for valid_time in sorted(valid_times):
+                for pressure in (pressures or [None]):
+                    yield Frame(group.file_type,
+                                group.settings,
+                                variable,
+                                initial_time,
+                                valid_time,
+                                pressure,
+                                pressures)
+
+
+def frame_key(frame):
+    """Image cache key related to frame"""
+    return forest.image_cache.image_key(frame.settings["pattern"],
+                                        frame.variable,
+                                        frame.initial_time,
+                                        frame.valid_time,
+                                        frame.pressure)
+
+
+def render_all(frames, directory, max_bytes, processes):
+    """Render frames in a process pool, reporting progress"""
+    total = len(frames)
+    if total == 0:
+        return
+    every = max(1, total // 20)
+    done = 0
+    missing = 0
+    failed = 0
+    start = time.time()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_initialize,
+            initargs=(directory, max_bytes)) as executor:
+        futures = {executor.submit(render, frame): frame
+                   for frame in frames}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                found = future.result()
+            except Exception as ex:
+                frame = futures[future]
+                print(f"WARNING: prerender failed for "
+                      f"{frame.settings.get('pattern')} {frame.variable} "
+                      f"{frame.initial_time} {frame.valid_time} "
+                      f"{frame.pressure}: {type(ex).__name__}: {ex}")
+                failed += 1
+            else:
+                if not found:
+                    missing += 1
+            done += 1
+            if (done % every == 0) or (done == total):
+                elapsed = time.time() - start
+                print(f"prerender: {done}/{total} frames "
+                      f"({100 * done / total:.0f}%) "
+                      f"{done / elapsed:.2f} frames/s")
+    elapsed = time.time() - start
+    print(f"prerender: rendered {total - missing - failed} frames "
+          f"in {elapsed:.1f}s, {missing} not found, {failed} failed")
+
+
+def _initialize(directory, max_bytes):
+    forest.data.CACHE_DIRECTORY = directory
+    forest.data.CACHE_MAX_BYTES = max_bytes
+
+
+def render(frame):
+    """Load frame through dataset loader, True if image found"""
+    dataset = forest.drivers.get_dataset(frame.file_type, frame.settings)
+    loader = dataset.image_loader()
+    state = forest.db.State(
+        variable=frame.variable,
+        initial_time=frame.initial_time,
+        valid_time=frame.valid_time,
+        pressure=frame.pressure,
+        pressures=frame.pressures)
+    data = loader.image(state)
+    return len(data["image"]) > 0
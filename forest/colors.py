@@ -476,6 +476,9 @@ class SourceLimits(Observable):
         """Add ColumnDataSource to listened sources"""
         if source not in self.sources:
             source.on_change("data", self.on_change)
+            if hasattr(source, "current"):
+                # Frames swapped in by the browser only change the key
+                source.on_change("key", self.on_change)
             self.sources.append(source)
 
     def remove_source(self, source):
@@ -485,6 +488,11 @@ class SourceLimits(Observable):
             source.remove_on_change("data", self.on_change)
         except ValueError:
             pass
+        if hasattr(source, "current"):
+            try:
+                source.remove_on_change("key", self.on_change)
+            except ValueError:
+                pass
 
         # Remove source from limit calculation
         if source in self.sources:
@@ -502,9 +510,10 @@ class SourceLimits(Observable):
         """Calculate limits from underlying sources"""
         images = []
         for source in sources:
-            if len(source.data["image"]) == 0:
+            data = getattr(source, "current", source.data)
+            if len(data["image"]) == 0:
                 continue
-            images.append(source.data["image"][0])
+            images.append(data["image"][0])
         if len(images) > 0:
             low = np.min([np.min(x) for x in images])
             high = np.max([np.max(x) for x in images])
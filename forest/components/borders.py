@@ -1,25 +1,50 @@
 """User-defined border overlays"""
+import bokeh.events
 import bokeh.models
 import bokeh.layouts
 import forest.actions
 from forest import data
+from forest.spatial_index import CulledSource, screen_size, viewport
 from forest.observe import Observable
 from forest.state import State
 from forest.mark import component
 
 
 class View:
+    """Natural Earth lines
+
+    Lines are simplified to match the zoom level, see
+    :func:`forest.data.select_level`, and only lines inside the
+    viewport are sent to the browser
+    """
     def __init__(self):
-        self.sources = {
-            "borders": bokeh.models.ColumnDataSource(data.BORDERS),
-            "coastlines": bokeh.models.ColumnDataSource(data.COASTLINES),
-            "disputed": bokeh.models.ColumnDataSource(data.DISPUTED),
-            "lakes": bokeh.models.ColumnDataSource(data.LAKES),
-        }
+        self.levels = {
+            name: self.levels_of_detail(name, full)
+            for name, full in (("borders", data.BORDERS),
+                               ("coastlines", data.COASTLINES),
+                               ("disputed", data.DISPUTED),
+                               ("lakes", data.LAKES))}
+        self.culled = {}
+        self.selected = {}
+        for name, levels in self.levels.items():
+            level = levels[0]
+            self.culled[name] = CulledSource(level.data, boxes=level.boxes)
+            self.selected[name] = level.tolerance
+        self.sources = {name: culled.source
+                        for name, culled in self.culled.items()}
         self.renderers = {
             "all": [],
             "coastline": []
         }
+        self.figures = []
+
+    @staticmethod
+    def levels_of_detail(name, full):
+        """Levels loaded at server start or full resolution lines"""
+        levels = data.LEVELS.get(name)
+        if levels:
+            return levels
+        return [data.Level(0., full, None)]
 
     def add_figure(self, figure):
         # Lakes
@@ -52,6 +77,38 @@ class View:
                                      color="red")
         self.renderers["all"].append(renderer)
 
+        # Figures share ranges, one viewport listener is enough
+        if len(self.figures) == 0:
+            figure.on_event(bokeh.events.LODEnd, self.on_viewport)
+            figure.on_event(bokeh.events.Reset, self.on_viewport)
+            figure.on_change("inner_width", self.on_resize)
+        self.figures.append(figure)
+        self.on_viewport()
+
+    def on_resize(self, attr, old, new):
+        """Re-select level of detail once the browser measures the figure"""
+        self.on_viewport()
+
+    def on_viewport(self, event=None):
+        """Select level of detail and cull lines after pan or zoom"""
+        if len(self.figures) == 0:
+            return
+        figure = self.figures[0]
+        ranges = viewport(figure, margin=0.25)
+        if ranges is None:
+            return
+        (x_start, x_end), _ = ranges
+        # Metres per pixel, ranges include a margin on either side
+        plot_width, _ = screen_size(figure)
+        resolution = (x_end - x_start) / (1.5 * plot_width)
+        for name, culled in self.culled.items():
+            level = data.select_level(self.levels[name], resolution)
+            if level.tolerance != self.selected[name]:
+                self.selected[name] = level.tolerance
+                culled.ranges = ranges
+                culled.update(level.data, boxes=level.boxes)
+            culled.cull(*ranges)
+
     def connect(self, store):
         store.add_subscriber(self.render)
 
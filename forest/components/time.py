@@ -178,23 +178,65 @@ class TimeUI(Observable):
         }
 
         # Play JS
-        custom_js = bokeh.models.CustomJS(args=dict(source=self.source), code="""
+        custom_js = bokeh.models.CustomJS(args=dict(
+            span=selected_span,
+            source=self.source), code="""
             // Simple JS animation
             console.log('Play');
+            if (window.playing) {
+                // Already animating
+                return;
+            }
             window.playing = true;
             var interval = 500;
-            let nextFrame = function() {
-                if (window.playing) {
+            var frameInterval = 100;
+            var previous = null;
+
+            // Only the most recently started loop may run
+            window.playLoop = (window.playLoop || 0) + 1;
+            var loop = window.playLoop;
+
+            // Frames held by forest.frame_cache.FrameCacheSource
+            let caches = function() {
+                return Object.values(window.forestFrameCaches || {});
+            };
+            let allCached = function() {
+                let active = caches();
+                return (active.length > 0) &&
+                       active.every((cache) => cache.has_all());
+            };
+
+            let nextFrame = function(timestamp) {
+                if (!window.playing || (window.playLoop !== loop)) {
+                    return;
+                }
+                let n = source.data['x'].length;
+                if (allCached() && (source.selected.indices.length > 0)) {
+                    // Loop cached frames without server round trips
+                    if ((previous === null) ||
+                        ((timestamp - previous) >= frameInterval)) {
+                        previous = timestamp;
+                        if (typeof window.playIndex === 'undefined') {
+                            window.playIndex = source.selected.indices[0];
+                        }
+                        let i = (window.playIndex + 1) % n;
+                        caches().forEach((cache) => cache.show_index(i));
+                        span.location = source.data['x'][i];
+                        window.playIndex = i;
+                    }
+                } else if ((previous === null) ||
+                           ((timestamp - previous) >= interval)) {
+                    // First pass fills client-side caches
+                    previous = timestamp;
                     if (source.selected.indices.length > 0) {
                         let i = source.selected.indices[0];
-                        let n = source.data['x'].length;
                         source.selected.indices = [(i + 1) % n];
                         source.change.emit();
                     }
-                    setTimeout(nextFrame, interval);
                 }
+                window.requestAnimationFrame(nextFrame);
             };
-            setTimeout(nextFrame, interval);
+            window.requestAnimationFrame(nextFrame);
         """)
         self.buttons["play"].js_on_click(custom_js)
 
@@ -202,6 +244,13 @@ class TimeUI(Observable):
         custom_js = bokeh.models.CustomJS(args=dict(source=self.source), code="""
             console.log('Pause');
             window.playing = false;
+
+            // Synchronise server with frame shown by display rate loop
+            if (typeof window.playIndex !== 'undefined') {
+                source.selected.indices = [window.playIndex];
+                source.change.emit();
+                delete window.playIndex;
+            }
         """)
         self.buttons["pause"].js_on_click(custom_js)
 
@@ -94,6 +94,22 @@ class Viewport:
         self.lat_range = lat_range
 
 
+def _parse_bytes(value):
+    """Convert size, e.g. 512MB, to bytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper()
+    for suffix, factor in [
+            ("TB", 1024**4),
+            ("GB", 1024**3),
+            ("MB", 1024**2),
+            ("KB", 1024),
+            ("B", 1)]:
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+
 def combine_variables(os_environ, args_variables):
     """Utility function to update environment with user-specified variables
 
@@ -185,6 +201,38 @@ class Config(object):
         """
         return self.data.get("presets", {}).get("file", None)
 
+    @property
+    def cache_directory(self):
+        """Directory used to persist caches between server restarts
+
+        Use the following syntax to declare the cache location
+
+        .. code-block:: yaml
+
+            cache:
+              directory: ${HOME}/.forest/cache
+
+        :returns: location on disk or None if caches are memory-only
+        """
+        return self.data.get("cache", {}).get("directory", None)
+
+    @property
+    def cache_max_bytes(self):
+        """Approximate size limit of on-disk caches
+
+        .. code-block:: yaml
+
+            cache:
+              directory: ${HOME}/.forest/cache
+              max_size: 10GB
+
+        :returns: number of bytes or None if unlimited
+        """
+        value = self.data.get("cache", {}).get("max_size", None)
+        if value is None:
+            return None
+        return _parse_bytes(value)
+
     @property
     def patterns(self):
         if "files" in self.data:
@@ -252,14 +300,7 @@ class Config(object):
     @property
     def datasets(self):
         for group in self.file_groups:
-            settings = {
-                "label": group.label,
-                "pattern": group.pattern,
-                "locator": group.locator,
-                "database_path": group.database_path,
-                "directory": group.directory
-            }
-            yield forest.drivers.get_dataset(group.file_type, settings)
+            yield forest.drivers.get_dataset(group.file_type, group.settings)
 
 
 class FileGroup(object):
@@ -293,6 +334,17 @@ class FileGroup(object):
         self.directory = directory
         self.database_path = database_path
 
+    @property
+    def settings(self):
+        """Keyword arguments passed to driver"""
+        return {
+            "label": self.label,
+            "pattern": self.pattern,
+            "locator": self.locator,
+            "database_path": self.database_path,
+            "directory": self.directory
+        }
+
     @property
     def full_pattern(self):
         if self.directory is None:
@@ -0,0 +1,365 @@
+"""
+Cross section
+-------------
+
+Vertical cross section of a pressure level variable along a line
+drawn with the BARC freehand tool, see
+:class:`forest.barc.toolbar.BARC`.
+
+The drawn line is resampled into equally spaced points and bilinear
+interpolation weights are computed once per line and grid by
+:func:`path_weights`. Each file reads all levels of the window
+bounding the line at the current valid time in a single hyperslab,
+:meth:`forest._profile.ProfileLoader.hyperslab`, after which sampling
+is a vectorised gather. Recently read hyperslabs are kept so that
+redrawing a line inside the same window does not touch the disk.
+
+.. autoclass:: CrossSectionView
+    :members:
+
+.. autoclass:: CrossSectionLoader
+    :members:
+
+.. autofunction:: path_weights
+
+"""
+import os
+from functools import lru_cache
+from collections import OrderedDict, namedtuple
+import numpy as np
+import netCDF4
+import bokeh.colors
+import bokeh.models
+import bokeh.palettes
+import forest.catalogue
+import forest.state
+from forest import geo, rx
+from forest._profile import ProfileLoader, UnsupportedFile
+from forest.region import region
+
+
+EARTH_RADIUS = 6371.  # km
+
+
+Weights = namedtuple("Weights", (
+    "distance",
+    "window",
+    "j0", "j1", "wy",
+    "i0", "i1", "wx",
+    "valid"))
+
+
+def resample(vertices, points):
+    """Equally spaced points along a line of (lon, lat) vertices
+
+    :returns: lons, lats and distance along line in km
+    """
+    lons, lats = np.asarray(vertices, dtype=float).T
+    steps = _haversine(lons[:-1], lats[:-1], lons[1:], lats[1:])
+    cumulative = np.concatenate([[0.], np.cumsum(steps)])
+    distance = np.linspace(0., cumulative[-1], points)
+    return (np.interp(distance, cumulative, lons),
+            np.interp(distance, cumulative, lats),
+            distance)
+
+
+def _haversine(lon0, lat0, lon1, lat1):
+    lon0, lat0, lon1, lat1 = map(np.radians, (lon0, lat0, lon1, lat1))
+    a = (np.sin((lat1 - lat0) / 2)**2 +
+         np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2)**2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def path_weights(lons, lats, vertices, points=200):
+    """Bilinear interpolation weights along a line on a 1D lon/lat grid
+
+    :param lons: 1D monotonic longitudes
+    :param lats: 1D monotonic latitudes
+    :param vertices: sequence of (lon, lat) pairs
+    :param points: number of samples along line
+    :returns: :class:`Weights`, indices are relative to ``window``,
+              a (j, i) tuple of slices bounding the line
+    """
+    x, y, distance = resample(vertices, points)
+    lons = geo._as_float(lons)
+    lats = geo._as_float(lats)
+    # Sample longitudes in the same convention as the grid
+    start = np.nanmean([lons[0], lons[-1]]) - 180.
+    x = (x - start) % 360. + start
+    fi = _fractional(lons, x)
+    fj = _fractional(lats, y)
+    valid = np.isfinite(fi) & np.isfinite(fj)
+    fi, fj = np.where(valid, fi, 0.), np.where(valid, fj, 0.)
+    i0, i1, wx = _corners(fi, len(lons))
+    j0, j1, wy = _corners(fj, len(lats))
+    if valid.any():
+        i_start, i_end = i0[valid].min(), i1[valid].max() + 1
+        j_start, j_end = j0[valid].min(), j1[valid].max() + 1
+    else:
+        i_start, i_end, j_start, j_end = 0, 1, 0, 1
+    window = (slice(j_start, j_end), slice(i_start, i_end))
+    return Weights(distance, window,
+                   np.clip(j0 - j_start, 0, None),
+                   np.clip(j1 - j_start, 0, None), wy,
+                   np.clip(i0 - i_start, 0, None),
+                   np.clip(i1 - i_start, 0, None), wx,
+                   valid)
+
+
+def _fractional(axis, points):
+    """Fractional index of points along a monotonic axis, NaN outside"""
+    index = np.arange(len(axis), dtype=float)
+    if len(axis) == 1:
+        return np.where(np.isclose(points, axis[0]), 0., np.nan)
+    if axis[0] > axis[-1]:
+        axis, index = axis[::-1], index[::-1]
+    return np.interp(points, axis, index, left=np.nan, right=np.nan)
+
+
+def _corners(fractional, n):
+    lower = np.clip(np.floor(fractional).astype(int), 0, max(n - 2, 0))
+    upper = np.minimum(lower + 1, n - 1)
+    return lower, upper, fractional - lower
+
+
+def interpolate(block, weights):
+    """Sample (..., y, x) block at weights, invalid points are NaN"""
+    values = np.ma.filled(np.ma.asarray(block, dtype="f8"), np.nan)
+    w = weights
+    result = (
+        (1 - w.wy) * (1 - w.wx) * values[..., w.j0, w.i0] +
+        (1 - w.wy) * w.wx * values[..., w.j0, w.i1] +
+        w.wy * (1 - w.wx) * values[..., w.j1, w.i0] +
+        w.wy * w.wx * values[..., w.j1, w.i1])
+    result[..., ~w.valid] = np.nan
+    return result
+
+
+_WEIGHTS = OrderedDict()
+
+
+def _weights(axes, vertices, points, max_size=32):
+    """Shared weights, computed once per grid and line"""
+    key = (axes.signature, vertices, points)
+    if key in _WEIGHTS:
+        _WEIGHTS.move_to_end(key)
+        return _WEIGHTS[key]
+    weights = path_weights(axes.lons, axes.lats, vertices, points)
+    _WEIGHTS[key] = weights
+    while len(_WEIGHTS) > max_size:
+        _WEIGHTS.popitem(last=False)
+    return weights
+
+
+class CrossSectionLoader(ProfileLoader):
+    """Sample all levels of a variable along a line
+
+    :param paths: files to search
+    :param points: number of samples along line
+    """
+    def __init__(self, paths, points=200):
+        super().__init__(paths)
+        self.points = points
+
+    def cross_section(self, initial_time, variable, vertices, time):
+        """Values shaped (pressure, distance) at a valid time
+
+        :param vertices: (lon, lat) pairs, see :func:`forest.region.region`
+        :returns: dict with "distance", "pressure" and "values" or None
+        """
+        for path in self.locator.locate(initial_time, time):
+            data = self.cross_section_file(path, variable, vertices, time)
+            if data is not None:
+                return data
+
+    def cross_section_file(self, path, variable, vertices, time):
+        """Read one hyperslab of all levels bounding line"""
+        try:
+            axes = self._axes(path, os.path.getmtime(path), variable)
+        except UnsupportedFile as ex:
+            print("WARNING: cross section not supported {}".format(ex))
+            return None
+        if (axes is None) or (axes.pressures is None):
+            return None
+        weights = _weights(axes, tuple(vertices), self.points)
+        if not weights.valid.any():
+            return None
+        window = tuple((s.start, s.stop) for s in weights.window)
+        selected = self._block(path, os.path.getmtime(path), variable,
+                               time, window)
+        if selected is None:
+            return None
+        block, pressures = selected
+        values = interpolate(block, weights)
+        values = values.reshape(-1, len(weights.distance))
+        order = np.argsort(pressures)
+        return {
+            "distance": weights.distance,
+            "pressure": np.asarray(pressures)[order],
+            "values": values[order]}
+
+    @lru_cache(maxsize=32)
+    def _block(self, path, mtime, variable, time, window):
+        """All levels of a (j, i) window at a valid time
+
+        :param window: ((start, stop), (start, stop)) row and column bounds
+        :returns: block and pressures or None if time not in file
+        """
+        axes = self._axes(path, mtime, variable)
+        j, i = (slice(start, stop) for start, stop in window)
+        selected = self.hyperslab(axes, time, j, i)
+        if selected is None:
+            return None
+        pts, mask = selected
+        with netCDF4.Dataset(path) as dataset:
+            block = dataset.variables[variable][pts]
+        pressures = axes.pressures
+        if mask is not None:
+            # Time and pressure share an axis, e.g. dim0
+            block, pressures = block[mask], pressures[mask]
+        return block, pressures
+
+
+class CrossSectionView:
+    """Cross section of the most recently drawn line
+
+    :param figure: cross section figure, distance along x and pressure
+                   along a flipped y axis
+    :param loaders: dict of dataset label to :class:`CrossSectionLoader`
+    """
+    def __init__(self, figure, loaders):
+        self.figure = figure
+        self.loaders = loaders
+        self.lines = None
+        self.props = None
+        self.empty = {
+            "left": [],
+            "right": [],
+            "top": [],
+            "bottom": [],
+            "value": []}
+        self.source = bokeh.models.ColumnDataSource(self.empty)
+        self.color_mapper = bokeh.models.LinearColorMapper(
+            palette=bokeh.palettes.Viridis256,
+            nan_color=bokeh.colors.RGB(0, 0, 0, a=0))
+        renderer = self.figure.quad(
+            left="left", right="right", top="top", bottom="bottom",
+            fill_color={"field": "value", "transform": self.color_mapper},
+            line_color=None,
+            source=self.source)
+        self.figure.add_tools(bokeh.models.HoverTool(
+            renderers=[renderer],
+            tooltips=[
+                ("Value", "@value"),
+                ("Level", "@bottom{0} - @top{0}"),
+                ("Distance", "@left{0} - @right{0} km")]))
+        self.figure.add_layout(
+            bokeh.models.ColorBar(color_mapper=self.color_mapper,
+                                  location=(0, 0)),
+            "right")
+
+    @classmethod
+    def from_datasets(cls, figure, datasets):
+        """Use datasets that provide ``cross_section_loader()``"""
+        loaders = {}
+        for label, dataset in datasets.items():
+            if hasattr(dataset, "cross_section_loader"):
+                loaders[label] = dataset.cross_section_loader()
+        return cls(figure, loaders)
+
+    def add_source(self, source):
+        """Follow lines drawn into a BARC ColumnDataSource"""
+        self.lines = source
+        source.on_change("data", self.on_lines)
+
+    def connect(self, store):
+        """Render only when the properties used by the view change"""
+        stream = (rx.Stream()
+                    .listen_to(store)
+                    .map(self.to_props)
+                    .filter(lambda x: x is not None)
+                    .distinct())
+        stream.map(lambda props: self.render(*props))
+        forest.catalogue.get_catalogue().subscribe(self)
+        return self
+
+    def to_props(self, state):
+        """Initial time, valid time and dataset variables shown by view"""
+        if isinstance(state, dict):
+            state = forest.state.State.from_dict(state)
+        if not state.tools.cross_section:
+            return
+        return (state.initial_time, state.valid_time,
+                tuple(self.variables(state)))
+
+    def on_catalogue(self):
+        """Redraw once files found during the session have been read"""
+        document = self.figure.document
+        if (document is None) or (self.props is None):
+            return
+        document.add_next_tick_callback(lambda: self.render(*self.props))
+
+    def on_lines(self, attr, old, new):
+        if self.props is not None:
+            self.render(*self.props)
+
+    def render(self, initial_time, valid_time, variables):
+        """Draw first (label, variable) pair with data along line"""
+        self.props = (initial_time, valid_time, variables)
+        vertices = self.vertices()
+        data = None
+        if vertices is not None:
+            for label, variable in variables:
+                data = self.loaders[label].cross_section(
+                    initial_time, variable, vertices, valid_time)
+                if data is not None:
+                    self.figure.title.text = variable
+                    break
+        if data is None:
+            self.source.data = self.empty
+            return
+        self.source.data = self.quads(data)
+        if np.isfinite(data["values"]).any():
+            self.color_mapper.low = np.nanmin(data["values"])
+            self.color_mapper.high = np.nanmax(data["values"])
+
+    def variables(self, state):
+        """Dataset label and variable of each layer with a loader"""
+        for _, settings in sorted(state.layers.index.items()):
+            label = settings.get("dataset")
+            if (label in self.loaders) and settings.get("variable"):
+                yield label, settings["variable"]
+
+    def vertices(self):
+        """(lon, lat) vertices of the most recently drawn line"""
+        if self.lines is None:
+            return None
+        for xs, ys in zip(self.lines.data["xs"][::-1],
+                          self.lines.data["ys"][::-1]):
+            if len(xs) > 1:
+                return region(xs, ys)
+
+    @staticmethod
+    def quads(data):
+        """Cell edges surrounding each sample"""
+        x = _edges(data["distance"])
+        y = _edges(data["pressure"])
+        values = data["values"]
+        left, bottom = np.meshgrid(x[:-1], y[:-1])
+        right, top = np.meshgrid(x[1:], y[1:])
+        return {
+            "left": left.ravel(),
+            "right": right.ravel(),
+            "top": top.ravel(),
+            "bottom": bottom.ravel(),
+            "value": values.ravel()}
+
+
+def _edges(centres):
+    """Mid-points between centres, extended half a step at either end"""
+    centres = np.asarray(centres, dtype=float)
+    if len(centres) == 1:
+        return np.array([centres[0] - 0.5, centres[0] + 0.5])
+    mid = 0.5 * (centres[1:] + centres[:-1])
+    return np.concatenate([[2 * centres[0] - mid[0]], mid,
+                           [2 * centres[-1] - mid[-1]]])
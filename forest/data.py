@@ -1,4 +1,6 @@
-from collections import defaultdict
+import os
+import threading
+from collections import defaultdict, namedtuple
 try:
     import cartopy
 except ImportError:
@@ -35,28 +37,57 @@ EMPTY = {
     "ys": [],
 }
 
+# Natural Earth lines simplified at several tolerances, see
+# on_server_loaded and forest.components.borders.View
+Level = namedtuple("Level", ("tolerance", "data", "boxes"))
+TOLERANCES = (10000., 2500., 500., 0.)  # Web Mercator metres, coarsest first
+LEVELS = {}
+
 AUTO_SHUTDOWN = False
 FEATURE_FLAGS = defaultdict(lambda: False)
+CACHE_DIRECTORY = None
+CACHE_MAX_BYTES = None
 
 def on_server_loaded():
+    """Load Natural Earth lines, cached to disk if CACHE_DIRECTORY is set"""
     global DISPUTED
     global COASTLINES
     global LAKES
     global BORDERS
-    # Load coastlines/borders
+    loaders = {
+        "coastlines": load_coastlines,
+        "lakes": load_lakes,
+        "disputed": load_disputed,
+        "borders": load_borders,
+    }
+    for name, load in loaders.items():
+        LEVELS[name] = cached_levels(name, load)
+    # Full resolution lines
+    COASTLINES = LEVELS["coastlines"][-1].data
+    LAKES = LEVELS["lakes"][-1].data
+    DISPUTED = LEVELS["disputed"][-1].data
+    BORDERS = LEVELS["borders"][-1].data
+
+
+def load_lakes():
     EXTENT = (-10, 50, -20, 10)
-    COASTLINES = load_coastlines()
-    LAKES = xs_ys(iterlines(
+    return xs_ys(iterlines(
         cartopy.feature.NaturalEarthFeature(
             'physical',
             'lakes',
             '10m').intersecting_geometries(EXTENT)))
-    DISPUTED = xs_ys(iterlines(
+
+
+def load_disputed():
+    return xs_ys(iterlines(
             cartopy.feature.NaturalEarthFeature(
                 "cultural",
                 "admin_0_boundary_lines_disputed_areas",
                 "50m").geometries()))
-    BORDERS = xs_ys(iterlines(
+
+
+def load_borders():
+    return xs_ys(iterlines(
         cartopy.feature.NaturalEarthFeature(
             'cultural',
             'admin_0_boundary_lines_land',
@@ -107,3 +138,141 @@ def iterlines(geometries):
                 yield xy(g)
         except TypeError:
             yield xy(geometry)
+
+
+def cached_levels(name, load, tolerances=TOLERANCES):
+    """Levels of detail stored as NumPy arrays under CACHE_DIRECTORY
+
+    :param name: file name stem
+    :param load: function returning full resolution xs/ys dict
+    :returns: list of :class:`Level` ordered coarsest first
+    """
+    if CACHE_DIRECTORY is None:
+        path = None
+    else:
+        path = os.path.join(CACHE_DIRECTORY, "natural_earth",
+                            "{}.npz".format(name))
+    if (path is not None) and os.path.exists(path):
+        levels = load_levels(path, tolerances)
+        if levels is not None:
+            return levels
+    levels = levels_of_detail(load(), tolerances)
+    if path is not None:
+        save_levels(path, levels)
+    return levels
+
+
+def levels_of_detail(data, tolerances=TOLERANCES):
+    """Simplify lines at each tolerance
+
+    :returns: list of :class:`Level`
+    """
+    levels = []
+    for tolerance in tolerances:
+        x, y, offsets = pack(simplify(data, tolerance))
+        levels.append(Level(tolerance, unpack(x, y, offsets),
+                            boxes(x, y, offsets)))
+    return levels
+
+
+def simplify(data, tolerance):
+    """Douglas-Peucker simplification of projected lines
+
+    Non-finite points are removed, lines with fewer than two points
+    are dropped
+
+    :param data: dict with "xs" and "ys" in Web Mercator metres
+    :param tolerance: largest distance in metres a vertex may move
+    """
+    xs, ys = [], []
+    for x, y in zip(data["xs"], data["ys"]):
+        x = np.ma.filled(np.ma.asarray(x, dtype=float), np.nan)
+        y = np.ma.filled(np.ma.asarray(y, dtype=float), np.nan)
+        pts = np.isfinite(x) & np.isfinite(y)
+        x, y = x[pts], y[pts]
+        if len(x) < 2:
+            continue
+        if tolerance > 0:
+            line = shapely.geometry.LineString(np.column_stack([x, y]))
+            x, y = np.asarray(line.simplify(tolerance,
+                                            preserve_topology=False).xy)
+            if len(x) < 2:
+                continue
+        xs.append(x)
+        ys.append(y)
+    return {"xs": xs, "ys": ys}
+
+
+def pack(data):
+    """Concatenate lines into flat x, y arrays and line offsets"""
+    offsets = np.cumsum([0] + [len(x) for x in data["xs"]])
+    if len(data["xs"]) == 0:
+        return np.empty(0), np.empty(0), offsets
+    return (np.concatenate(data["xs"]).astype("f8"),
+            np.concatenate(data["ys"]).astype("f8"),
+            offsets)
+
+
+def unpack(x, y, offsets):
+    """Inverse of :func:`pack`"""
+    return {
+        "xs": np.split(x, offsets[1:-1]),
+        "ys": np.split(y, offsets[1:-1])
+    }
+
+
+def boxes(x, y, offsets):
+    """Bounding box of each packed line, see forest.spatial_index"""
+    if len(offsets) < 2:
+        return np.empty((0, 4))
+    starts = offsets[:-1]
+    return np.stack([
+        np.minimum.reduceat(x, starts),
+        np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(x, starts),
+        np.maximum.reduceat(y, starts)], axis=-1)
+
+
+def save_levels(path, levels):
+    """Write levels of detail to a single .npz file"""
+    arrays = {"tolerances": np.array([level.tolerance for level in levels])}
+    for k, level in enumerate(levels):
+        x, y, offsets = pack(level.data)
+        arrays["x_{}".format(k)] = x
+        arrays["y_{}".format(k)] = y
+        arrays["offsets_{}".format(k)] = offsets
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+    with open(tmp, "wb") as stream:
+        np.savez(stream, **arrays)
+    os.replace(tmp, path)  # Atomic for concurrent server processes
+
+
+def load_levels(path, tolerances=TOLERANCES):
+    """Read levels of detail, None if file was made with other tolerances"""
+    try:
+        with np.load(path) as arrays:
+            if not np.array_equal(arrays["tolerances"], tolerances):
+                return None
+            levels = []
+            for k, tolerance in enumerate(tolerances):
+                x = arrays["x_{}".format(k)]
+                y = arrays["y_{}".format(k)]
+                offsets = arrays["offsets_{}".format(k)]
+                levels.append(Level(tolerance, unpack(x, y, offsets),
+                                    boxes(x, y, offsets)))
+    except (OSError, KeyError, ValueError):
+        return None
+    return levels
+
+
+def select_level(levels, resolution):
+    """Coarsest level with errors smaller than a screen pixel
+
+    :param levels: list of :class:`Level` ordered coarsest first
+    :param resolution: metres per screen pixel
+    """
+    for level in levels:
+        if level.tolerance <= resolution:
+            return level
+    return levels[-1]
@@ -1,24 +1,39 @@
 import re
 import os
 import glob
+import io
+import hashlib
+import threading
+import bisect
 import datetime as dt
-import datashader
 import pandas as pd
 from functools import lru_cache
+from collections import namedtuple
 from forest import geo
+import forest.data
 from forest.util import to_datetime as _to_datetime
+from forest.util import timeout_cache
 import forest.util
 from forest.old_state import old_state, unique
+from forest.spatial_index import (
+    CulledSource, on_viewport, viewport, screen_size)
 import bokeh.models
+import bokeh.plotting
 import bokeh.palettes
 import bokeh.colors
 import numpy as np
 
 
 class Dataset:
-    """High-level class to relate navigators, loaders and views"""
-    def __init__(self, pattern=None, **kwargs):
+    """High-level class to relate navigators, loaders and views
+
+    :param pattern: glob pattern of lightning files
+    :param live: stream flashes appended to the newest files, see
+                 :meth:`View.poll`
+    """
+    def __init__(self, pattern=None, live=False, **kwargs):
         self.pattern = pattern
+        self.live = live
         self.loader = Loader()
         self.locator = TimestampLocator(pattern)
 
@@ -26,15 +41,34 @@ class Dataset:
         """Construct navigator"""
         return Navigator(self.locator)
 
+    def sync(self):
+        """Add lightning files that have arrived since start up"""
+        self.locator.refresh()
+
     def map_view(self):
         """Construct view"""
-        return View(self.loader, self.locator)
+        return View(self.loader, self.locator, live=self.live)
 
 
 class View:
-    def __init__(self, loader, locator):
+    """Lightning images, optionally with live flashes
+
+    :param live: poll newest files for appended flashes
+    :param rollover: number of live flashes kept in the browser
+    :param interval_ms: time between polls
+    """
+    def __init__(self, loader, locator, live=False, rollover=5000,
+                 interval_ms=10000):
         self.loader = loader
         self.locator = locator
+        self.live = live
+        self.rollover = rollover
+        self.interval_ms = interval_ms
+        self.streamed = {}
+        self.state = None
+        self.debounce_ms = 250
+        self._pending = None
+        self.shown_grid = None
         palette = bokeh.palettes.all_palettes['Spectral'][11][::-1]
         self.color_mapper = bokeh.models.LinearColorMapper(low=-1000, high=0, palette=palette)
         self.empty_image = {
@@ -56,8 +90,11 @@ class View:
             palette="Inferno256",
             nan_color=bokeh.colors.RGB(0, 0, 0, a=0)
         )
+        # Flashes outside the viewport are not sent to the browser
+        self.scatter_source = CulledSource(self.empty_image, max_features=400)
+        self.figures = []
         self.sources = {}
-        self.sources["scatter"] = bokeh.models.ColumnDataSource(self.empty_image)
+        self.sources["scatter"] = self.scatter_source.source
         self.sources["image"] = bokeh.models.ColumnDataSource({
             "x": [],
             "y": [],
@@ -65,6 +102,13 @@ class View:
             "dh": [],
             "image": [],
         })
+        self.sources["live"] = bokeh.models.ColumnDataSource({
+            "x": [],
+            "y": [],
+            "date": [],
+            "flash_type": [],
+        })
+        self.grid = default_grid()
         self.variable_to_method = {
             "Lightning": self.scatter,
         }
@@ -76,65 +120,86 @@ class View:
             return
         if state.variable is None:
             return
+        self.state = state
         self.variable_to_method.get(state.variable, self.image)(state)
 
+    def on_range(self, attr, old, new):
+        """Re-aggregate once the viewport has stopped changing"""
+        document = self.figures[0].document if self.figures else None
+        if document is None:
+            self.reaggregate()
+            return
+        if self._pending is not None:
+            try:
+                document.remove_timeout_callback(self._pending)
+            except ValueError:
+                pass  # Already called
+        self._pending = document.add_timeout_callback(self.reaggregate,
+                                                      self.debounce_ms)
+
+    def reaggregate(self):
+        """Image of current state binned onto the current viewport"""
+        self._pending = None
+        state = self.state
+        if (state is None) or (state.variable is None):
+            return
+        if state.variable in self.variable_to_method:
+            return
+        if self.image_grid() == self.shown_grid:
+            return  # Pre-aggregated image still resolves viewport
+        self.image(state)
+
     def image(self, state):
-        """Image colored by time since flash or flash density"""
+        """Image colored by time since flash or flash density
+
+        Images are reduced from per-minute aggregates of each file,
+        see :func:`aggregate`, while the pre-aggregated grid is fine
+        enough for the viewport. Zoomed in or outside the grid,
+        cached projected flashes are binned onto the viewport instead,
+        see :func:`point_rows`
+        """
         valid_time =_to_datetime(state.valid_time)
 
         # 15 minute/1 hour slice of data?
         window = dt.timedelta(minutes=60)  # 1 hour window
         paths = self.locator.find_period(valid_time, window)
-        frame = self.loader.load(paths)
-        frame = self.select_date(frame, valid_time, window)
 
         # Filter intra-cloud/cloud-ground rows
-        if "intra-cloud" in state.variable.lower():
-            frame = frame[frame["flash_type"] == "IC"]
-        elif "cloud-ground" in state.variable.lower():
-            frame = frame[frame["flash_type"] == "CG"]
-
-        # EarthNetworks validity box (not needed if tiling algorithm)
-        longitude_range = (26, 40)
-        latitude_range = (-12, 4)
-        x_range, y_range = geo.web_mercator(longitude_range,
-                                            latitude_range)
-
-        x, y = geo.web_mercator(frame["longitude"], frame["latitude"])
-        frame["x"] = x
-        frame["y"] = y
-        pixels = 256
-        canvas = datashader.Canvas(
-            plot_width=pixels,
-            plot_height=pixels,
-            x_range=x_range,
-            y_range=y_range
-        )
-
+        codes = flash_codes(state.variable)
+
+        start = np.datetime64(valid_time, "ns")
+        end = start + np.timedelta64(window)
+        grid = self.image_grid()
+        self.shown_grid = grid
+        if grid == self.grid:
+            aggregates = [self.loader.aggregate(path, grid) for path in paths]
+            rows = _window(aggregates, start, end, codes)
+        else:
+            rows = concatenate([
+                point_rows(self.loader.load_columns(path),
+                           *self.loader.projected(path),
+                           start, end, codes, grid)
+                for path in paths])
         if "density" in state.variable.lower():
             # N flashes per pixel
-            agg = canvas.points(frame, "x", "y", datashader.count())
+            values = count_image(rows, grid)
+            image = np.ma.masked_equal(values, 0.)  # Remove pixels with no data
         else:
-            frame["since_flash"] = self.since_flash(frame["date"], valid_time)
-            agg = canvas.points(frame, "x", "y", datashader.max("since_flash"))
-
-        # Note: DataArray objects are not JSON serializable, .values is the
-        #       same data cast as a numpy array
-        x = agg.x.values.min()
-        y = agg.y.values.min()
-        dw = agg.x.values.max() - x
-        dh = agg.y.values.max() - y
-        image = np.ma.masked_array(agg.values.astype(np.float),
-                                   mask=np.isnan(agg.values))
-        if "density" in state.variable.lower():
-            image[image == 0] = np.ma.masked # Remove pixels with no data
+            last = last_image(rows, grid)
+            seconds = (last.astype("f8") - start.astype("i8")) / 1e9
+            seconds[last == NO_FLASH] = np.nan
+            image = np.ma.masked_invalid(seconds)
+
+        (x, x_end), (y, y_end) = grid.x_range, grid.y_range
+        dw = x_end - x
+        dh = y_end - y
 
         # Update color_mapper
         color_mapper = self.color_mappers["image"]
         if "density" in state.variable.lower():
             color_mapper.palette = bokeh.palettes.all_palettes["Spectral"][8]
             color_mapper.low = 0
-            color_mapper.high = agg.values.max()
+            color_mapper.high = image.max() if image.count() else 0
         else:
             color_mapper.palette = bokeh.palettes.all_palettes["RdGy"][8]
             color_mapper.low = 0
@@ -166,22 +231,32 @@ class View:
         data.update(meta_data)
         self.sources["image"].data = data
 
+    def image_grid(self):
+        """Pre-aggregated grid if it resolves the viewport, else viewport"""
+        if len(self.figures) == 0:
+            return self.grid
+        grid = viewport_grid(self.figures[0])
+        if (grid is None) or covers(self.grid, grid):
+            return self.grid
+        return grid
+
     def scatter(self, state):
         """Scatter plot of flash position colored by time since flash"""
         valid_time = _to_datetime(state.valid_time)
+        window = dt.timedelta(minutes=60)
         paths = self.locator.find(valid_time)
         frame = self.loader.load(paths)
-        frame = self.select_date(frame, valid_time)
-        frame = frame[:400]  # Limit points
+        frame = self.select_date(frame, valid_time, window)
         frame['time_since_flash'] = self.since_flash(frame['date'], valid_time)
         if len(frame) == 0:
-            return self.empty_image
+            self.scatter_source.update(self.empty_image)
+            return
         x, y = geo.web_mercator(
                 frame.longitude,
                 frame.latitude)
         self.color_mapper.low = np.min(frame.time_since_flash)
         self.color_mapper.high = np.max(frame.time_since_flash)
-        self.sources["scatter"].data = {
+        self.scatter_source.update({
             "x": x,
             "y": y,
             "date": frame.date,
@@ -189,7 +264,7 @@ class View:
             "latitude": frame.latitude,
             "flash_type": frame.flash_type,
             "time_since_flash": frame.time_since_flash
-        }
+        })
 
     def select_date(self, frame, date, window):
         if len(frame) == 0:
@@ -238,7 +313,54 @@ class View:
         else:
             return {**defaults, **{'@image': 'numeral'}}
 
+    def poll(self):
+        """Stream flashes appended since the last poll
+
+        Rows are parsed once per process by a shared :class:`Tail`,
+        each session only sends rows it has not sent before
+        """
+        self.locator.refresh()
+        latest = self.locator.latest(2)
+        for path in list(self.streamed):
+            if path not in latest:
+                # Superseded by a newer file
+                del self.streamed[path]
+                unfollow(path)
+        for path in latest:
+            tail = follow(path)
+            tail.update()
+            columns = tail.columns
+            start = self.streamed.get(path, 0)
+            if start > len(columns):
+                start = 0  # File was truncated
+            self.streamed[path] = len(columns)
+            rows = columns[start:][-self.rollover:]
+            if len(rows) == 0:
+                continue
+            x, y = geo.web_mercator(np.asarray(rows["longitude"], dtype="f8"),
+                                    np.asarray(rows["latitude"], dtype="f8"))
+            self.sources["live"].stream({
+                "x": np.asarray(x),
+                "y": np.asarray(y),
+                "date": rows["date"].astype("datetime64[ns]"),
+                "flash_type": flash_types(rows["flash_type"]),
+            }, rollover=self.rollover)
+
     def add_figure(self, figure):
+        if len(self.figures) == 0:
+            on_viewport(figure, [self.scatter_source])
+            for range_ in (figure.x_range, figure.y_range):
+                range_.on_change("start", self.on_range)
+                range_.on_change("end", self.on_range)
+            figure.on_change("inner_width", self.on_range)
+            figure.on_change("inner_height", self.on_range)
+            if self.live:
+                document = bokeh.plotting.curdoc()
+                document.add_periodic_callback(self.poll, self.interval_ms)
+        self.figures.append(figure)
+        if self.live:
+            figure.cross(x="x", y="y", size=6, line_color="black",
+                         source=self.sources["live"])
         renderer = figure.cross(
                 x="x",
                 y="y",
@@ -289,31 +411,86 @@ class View:
 
 
 class TimestampLocator:
-    """Find files by time stamp"""
-    def __init__(self, pattern):
-        if pattern is None:
-            paths = []
-        else:
-            paths = glob.glob(pattern)
+    """Find files by time stamp
 
-        # TODO: Find better way to reduce data volume
-        if len(paths) > 1000:
-            paths = sorted(paths)[-1000:]
-        self.paths = paths
+    File start times are kept sorted so that files overlapping a time
+    window are found by binary search. New files are merged in as they
+    appear, see :meth:`refresh`
 
+    :param pattern: glob pattern of lightning files
+    """
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.paths = []
         self.table = {}
-        for path in self.paths:
-            self.table[self._parse_date(path)] = path
+        self._starts = []
+        self._sorted_paths = []
+        self._globbed = None
+        self._valid_times = None
+        self.refresh()
 
-        times = [
-            self._parse_date(path) for path in self.paths
-        ]
-        times = [t for t in times if t is not None]
-        index = pd.DatetimeIndex(times)
-        self._valid_times = index.sort_values()
+    @staticmethod
+    @timeout_cache(dt.timedelta(minutes=1))
+    def find_paths(pattern):
+        return glob.glob(pattern)
+
+    def refresh(self, paths=None):
+        """Merge files that appeared since the last search
+
+        :param paths: files to merge, by default files matching pattern
+        :returns: list of new paths
+        """
+        if paths is None:
+            if self.pattern is None:
+                return []
+            paths = self.find_paths(self.pattern)
+            if paths is self._globbed:
+                return []  # Glob result unchanged since last refresh
+            self._globbed = paths
+        known = set(self.paths)
+        added = sorted(path for path in paths if path not in known)
+        if len(added) == 0:
+            return []
+        self.paths += added
+        entries = list(zip(self._starts, self._sorted_paths))
+        for path in added:
+            date = self._parse_date(path)
+            if date is None:
+                continue
+            self.table[date] = path
+            entries.append((date, path))
+        entries.sort()  # Nearly sorted, linear time in practice
+        self._starts = [date for date, _ in entries]
+        self._sorted_paths = [path for _, path in entries]
+        self._valid_times = None
+        return added
 
     def find_period(self, date, window):
-        return self.find(date)  # TODO: implement search window
+        """Files overlapping [date, date + window)
+
+        A file is assumed to cover the period up to the next file, the
+        most recent file the typical spacing between files
+        """
+        self.refresh()
+        starts = self._starts
+        if len(starts) == 0:
+            return []
+        date = _to_datetime(date)
+        i = bisect.bisect_right(starts, date) - 1
+        j = bisect.bisect_left(starts, date + window)
+        if (i == len(starts) - 1) and (date >= starts[i] + self.spacing()):
+            i += 1  # After the end of the most recent file
+        return self._sorted_paths[max(i, 0):max(j, 0)]
+
+    def spacing(self):
+        """Median interval between file start times"""
+        if len(self._starts) < 2:
+            return dt.timedelta(0)
+        return pd.Series(self._starts).diff().median().to_pytimedelta()
+
+    def latest(self, count=1):
+        """Most recent files by start time"""
+        return self._sorted_paths[-count:]
 
     def find(self, date):
         if date in self.table:
@@ -328,8 +505,11 @@ class TimestampLocator:
             return dt.datetime.strptime(groups[0], "%Y%m%dT%H%M")
 
     def valid_times(self):
-        if len(self._valid_times) == 0:
+        self.refresh()
+        if len(self._starts) == 0:
             return []
+        if self._valid_times is None:
+            self._valid_times = pd.DatetimeIndex(self._starts).unique()
         return self._valid_times
 
 
@@ -358,38 +538,417 @@ class Navigator:
 
 
 class Loader:
-    """Methods to manipulate EarthNetworks data"""
+    """Methods to manipulate EarthNetworks data
+
+    Parsed files are kept as compact columns, see :data:`COLUMNS`,
+    shared by every session and persisted under ``cache: directory:``
+    so that later reads are a memory-mapped load
+    """
     def load(self, csv_files):
         if isinstance(csv_files, str):
             csv_files = [csv_files]
-        frames = []
-        for csv_file in csv_files:
-            frame = self.load_file(csv_file)
-            frames.append(frame)
-        if len(frames) == 0:
-            return pd.DataFrame({
-                "flash_type": [],
-                "date": [],
-                "latitude": [],
-                "longitude": [],
-            })
+        arrays = [self.load_columns(path) for path in csv_files]
+        if len(arrays) == 0:
+            columns = np.empty(0, dtype=COLUMNS)
         else:
-            return pd.concat(frames, ignore_index=True)
+            columns = np.concatenate(arrays)
+        return to_frame(columns)
 
-    @lru_cache(maxsize=32)
     def load_file(self, path):
-        return pd.read_csv(
-            path,
-            parse_dates=[1],
-            converters={0: self.flash_type},
-            usecols=[0, 1, 2, 3],
-            names=["flash_type", "date", "latitude", "longitude"],
-            header=None)
+        return to_frame(self.load_columns(path))
+
+    def aggregate(self, path, grid):
+        """Per-minute flash counts and times of a file, see :func:`aggregate`"""
+        return _aggregate(path, os.stat(path).st_mtime_ns, grid)
+
+    def projected(self, path):
+        """Web Mercator x, y of each flash in a file"""
+        return _projected(path, os.stat(path).st_mtime_ns)
 
     @staticmethod
-    def flash_type(value):
-        return {
-            "0": "CG",
-            "1": "IC",
-            "9": "Keep alive"
-        }.get(value, value)
+    def load_columns(path):
+        """Structured array of a single file, see :data:`COLUMNS`"""
+        tail = _TAILS.get(path)
+        if tail is not None:
+            # Growing file, only appended rows are parsed
+            tail.update()
+            return tail.columns
+        return _load_columns(path, os.stat(path).st_mtime_ns)
+
+
+# Compact columnar representation of a lightning file
+COLUMNS = np.dtype([
+    ("date", "<i8"),  # datetime64[ns]
+    ("latitude", "<f4"),
+    ("longitude", "<f4"),
+    ("flash_type", "i1")])
+FLASH_TYPES = {
+    0: "CG",
+    1: "IC",
+    9: "Keep alive"
+}
+DATE_FORMAT = "%Y%m%dT%H%M%S.%f"
+
+
+# Flash density grid covering EarthNetworks validity box
+Grid = namedtuple("Grid", ("x_range", "y_range", "shape"))
+Aggregate = namedtuple("Aggregate", (
+    "minute",
+    "flash_type",
+    "cell",
+    "count",
+    "last"))
+NO_FLASH = np.iinfo("i8").min
+NS_PER_MINUTE = 60 * 10**9
+
+
+def default_grid(longitude_range=(26, 40), latitude_range=(-12, 4),
+                 pixels=256):
+    """Web Mercator grid used by density and time since flash images"""
+    x_range, y_range = geo.web_mercator(longitude_range, latitude_range)
+    return Grid((float(x_range[0]), float(x_range[1])),
+                (float(y_range[0]), float(y_range[1])),
+                (pixels, pixels))
+
+
+def flash_codes(variable):
+    """Flash type codes selected by a variable, None for all types"""
+    if "intra-cloud" in variable.lower():
+        return [1]
+    elif "cloud-ground" in variable.lower():
+        return [0]
+    return None
+
+
+def bin_points(x, y, grid):
+    """Flat index of grid cell containing each point, -1 if outside"""
+    ny, nx = grid.shape
+    (x0, x1), (y0, y1) = grid.x_range, grid.y_range
+    i = np.floor((np.asarray(x) - x0) * (nx / (x1 - x0)))
+    j = np.floor((np.asarray(y) - y0) * (ny / (y1 - y0)))
+    inside = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+    return np.where(inside, j * nx + i, -1).astype("i8")
+
+
+def aggregate(columns, x, y, grid):
+    """Flash counts and most recent flash per minute, type and cell
+
+    :param columns: structured array, see :data:`COLUMNS`
+    :param x: projected longitudes
+    :param y: projected latitudes
+    :returns: :class:`Aggregate` of arrays sorted by minute
+    """
+    cell = bin_points(x, y, grid)
+    inside = cell >= 0
+    cell = cell[inside]
+    date = np.asarray(columns["date"])[inside]
+    flash_type = np.asarray(columns["flash_type"])[inside]
+    minute = date // NS_PER_MINUTE
+    order = np.lexsort((cell, flash_type, minute))
+    minute, flash_type = minute[order], flash_type[order]
+    cell, date = cell[order], date[order]
+    if len(order) == 0:
+        starts = np.array([], dtype="i8")
+    else:
+        change = ((np.diff(minute) != 0) |
+                  (np.diff(flash_type) != 0) |
+                  (np.diff(cell) != 0))
+        starts = np.concatenate([[0], np.flatnonzero(change) + 1])
+    count = np.diff(np.append(starts, len(order)))
+    if len(starts) == 0:
+        last = np.array([], dtype="i8")
+    else:
+        last = np.maximum.reduceat(date, starts)
+    return Aggregate(minute[starts], flash_type[starts], cell[starts],
+                     count, last)
+
+
+def _window(aggregates, start, end, codes):
+    """Rows of aggregates between start and end minutes inclusive"""
+    first = start.astype("datetime64[ns]").astype("i8") // NS_PER_MINUTE
+    final = end.astype("datetime64[ns]").astype("i8") // NS_PER_MINUTE
+    rows = []
+    for agg in aggregates:
+        lo = np.searchsorted(agg.minute, first, side="left")
+        hi = np.searchsorted(agg.minute, final, side="right")
+        row = Aggregate(*(values[lo:hi] for values in agg))
+        if codes is not None:
+            pts = np.isin(row.flash_type, codes)
+            row = Aggregate(*(values[pts] for values in row))
+        rows.append(row)
+    return concatenate(rows)
+
+
+def concatenate(rows):
+    """Join aggregate rows from several files"""
+    if len(rows) == 0:
+        return Aggregate(*(np.array([], dtype="i8") for _ in Aggregate._fields))
+    return Aggregate(*(np.concatenate(values) for values in zip(*rows)))
+
+
+def window_count(aggregates, start, end, codes, grid):
+    """Number of flashes per cell in a window"""
+    return count_image(_window(aggregates, start, end, codes), grid)
+
+
+def window_last(aggregates, start, end, codes, grid):
+    """Time of most recent flash per cell in nanoseconds, NO_FLASH if none"""
+    return last_image(_window(aggregates, start, end, codes), grid)
+
+
+def point_rows(columns, x, y, start, end, codes, grid):
+    """Flashes in a window binned onto any grid, one row per flash
+
+    Used when the viewport does not match the pre-aggregated grid,
+    only projected points are needed so re-binning is vectorised
+
+    :returns: :class:`Aggregate` suitable for :func:`count_image`
+              and :func:`last_image`
+    """
+    n = min(len(columns), len(x))  # Followed files may have grown
+    date = np.asarray(columns["date"][:n])
+    flash_type = np.asarray(columns["flash_type"][:n])
+    first = start.astype("datetime64[ns]").astype("i8")
+    final = end.astype("datetime64[ns]").astype("i8")
+    # Same minute resolution as aggregates, end minute included
+    first -= first % NS_PER_MINUTE
+    final += NS_PER_MINUTE - final % NS_PER_MINUTE
+    pts = (date >= first) & (date < final)
+    if codes is not None:
+        pts &= np.isin(flash_type, codes)
+    cell = bin_points(x[:n][pts], y[:n][pts], grid)
+    inside = cell >= 0
+    date = date[pts][inside]
+    return Aggregate(date // NS_PER_MINUTE,
+                     flash_type[pts][inside],
+                     cell[inside],
+                     np.ones(len(date), dtype="i8"),
+                     date)
+
+
+def count_image(rows, grid):
+    """Sum of flash counts per cell of aggregate rows"""
+    n = grid.shape[0] * grid.shape[1]
+    counts = np.bincount(rows.cell, weights=rows.count, minlength=n)
+    return counts.reshape(grid.shape)
+
+
+def last_image(rows, grid):
+    """Most recent flash per cell of aggregate rows, NO_FLASH if none"""
+    n = grid.shape[0] * grid.shape[1]
+    last = np.full(n, NO_FLASH, dtype="i8")
+    np.maximum.at(last, rows.cell, rows.last)
+    return last.reshape(grid.shape)
+
+
+def viewport_grid(figure, pixel_size=2):
+    """Grid covering a figure with cells of pixel_size screen pixels
+
+    :returns: :class:`Grid` or None if figure ranges are unknown
+    """
+    ranges = viewport(figure)
+    if ranges is None:
+        return None
+    x_range, y_range = ranges
+    width, height = screen_size(figure)
+    nx = max(int(width // pixel_size), 1)
+    ny = max(int(height // pixel_size), 1)
+    return Grid(tuple(map(float, x_range)), tuple(map(float, y_range)),
+                (ny, nx))
+
+
+def covers(grid, other):
+    """True if grid contains other at the same or finer resolution"""
+    (x0, x1), (y0, y1) = grid.x_range, grid.y_range
+    (u0, u1), (v0, v1) = other.x_range, other.y_range
+    if (u0 < x0) or (u1 > x1) or (v0 < y0) or (v1 > y1):
+        return False
+    dx = (x1 - x0) / grid.shape[1]
+    du = (u1 - u0) / other.shape[1]
+    return dx <= du
+
+
+@lru_cache(maxsize=256)
+def _projected(path, mtime):
+    columns = Loader.load_columns(path)
+    if len(columns) == 0:
+        return np.empty(0), np.empty(0)
+    x, y = geo.web_mercator(np.asarray(columns["longitude"], dtype="f8"),
+                            np.asarray(columns["latitude"], dtype="f8"))
+    return np.asarray(x), np.asarray(y)
+
+
+@lru_cache(maxsize=256)
+def _aggregate(path, mtime, grid):
+    x, y = _projected(path, mtime)
+    columns = Loader.load_columns(path)[:len(x)]
+    return aggregate(columns, x, y, grid)
+
+
+@lru_cache(maxsize=256)
+def _load_columns(path, mtime):
+    cache_path = _cache_path(path, mtime)
+    if (cache_path is not None) and os.path.exists(cache_path):
+        try:
+            return np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+    columns = read_columns(path)
+    if cache_path is not None:
+        _save_columns(cache_path, columns)
+    return columns
+
+
+def _cache_path(path, mtime):
+    if forest.data.CACHE_DIRECTORY is None:
+        return None
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(forest.data.CACHE_DIRECTORY, "earth_networks",
+                        "{}-{}.npy".format(digest[:16], mtime))
+
+
+def _save_columns(cache_path, columns):
+    directory, name = os.path.split(cache_path)
+    os.makedirs(directory, exist_ok=True)
+    # Entries for previous versions of the same file
+    prefix = name.split("-")[0]
+    for stale in glob.glob(os.path.join(directory, prefix + "-*.npy")):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    tmp = "{}.{}.tmp".format(cache_path, os.getpid())
+    with open(tmp, "wb") as stream:
+        np.save(stream, columns)
+    os.replace(tmp, cache_path)  # Atomic for concurrent server processes
+
+
+class Tail:
+    """Parse rows appended to a growing lightning file
+
+    A byte offset is kept so that each row is parsed once, a trailing
+    partial row is left for the next update
+
+    :param path: file to follow
+    """
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.columns = np.empty(0, dtype=COLUMNS)
+        self._lock = threading.Lock()
+
+    def update(self):
+        """Parse newly appended rows
+
+        :returns: structured array of new rows
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return np.empty(0, dtype=COLUMNS)
+            if stat.st_size < self.offset:
+                # File replaced or truncated
+                self.offset = 0
+                self.columns = np.empty(0, dtype=COLUMNS)
+            if stat.st_size == self.offset:
+                return np.empty(0, dtype=COLUMNS)
+            with open(self.path, "rb") as stream:
+                stream.seek(self.offset)
+                chunk = stream.read(stat.st_size - self.offset)
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                return np.empty(0, dtype=COLUMNS)
+            try:
+                rows = read_columns(io.BytesIO(chunk[:end]))
+            except pd.errors.EmptyDataError:
+                rows = np.empty(0, dtype=COLUMNS)
+            self.offset += end
+            self.columns = np.concatenate([self.columns, rows])
+            return rows
+
+    def retire(self):
+        """Persist parsed rows once the file is no longer followed
+
+        Nothing is written if the file ends in a partial row, later
+        reads then parse the complete file
+        """
+        self.update()
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            if stat.st_size != self.offset:
+                return
+            cache_path = _cache_path(self.path, stat.st_mtime_ns)
+            if cache_path is not None:
+                _save_columns(cache_path, self.columns)
+
+
+_TAILS = {}
+
+
+def follow(path):
+    """Shared :class:`Tail` of a file, later loads only parse new rows"""
+    if path not in _TAILS:
+        _TAILS[path] = Tail(path)
+    return _TAILS[path]
+
+
+def unfollow(path):
+    """Drop the :class:`Tail` of a file that has stopped growing
+
+    Later loads fall back to the shared, disk-cached columns
+    """
+    tail = _TAILS.pop(path, None)
+    if tail is not None:
+        tail.retire()
+
+
+def read_columns(path):
+    """Parse CSV file into a structured array, see :data:`COLUMNS`
+
+    :param path: file name or file-like object
+    """
+    frame = pd.read_csv(
+        path,
+        usecols=[0, 1, 2, 3],
+        names=["flash_type", "date", "latitude", "longitude"],
+        dtype={"date": str},
+        header=None)
+    columns = np.empty(len(frame), dtype=COLUMNS)
+    columns["date"] = parse_dates(frame["date"]).view("i8")
+    columns["latitude"] = frame["latitude"].values
+    columns["longitude"] = frame["longitude"].values
+    codes = pd.to_numeric(frame["flash_type"], errors="coerce")
+    columns["flash_type"] = codes.fillna(-1).values
+    return columns
+
+
+def parse_dates(values):
+    """Vectorised date parsing, formats other than DATE_FORMAT inferred"""
+    try:
+        dates = pd.to_datetime(values, format=DATE_FORMAT)
+    except (TypeError, ValueError):
+        dates = pd.to_datetime(values)
+    return dates.values.astype("datetime64[ns]")
+
+
+def flash_types(codes):
+    """Labels of flash type codes, unknown codes kept as strings"""
+    codes = np.asarray(codes)
+    labels = codes.astype(str).astype(object)
+    for code, label in FLASH_TYPES.items():
+        labels[codes == code] = label
+    return labels
+
+
+def to_frame(columns):
+    """DataFrame used by views from a structured array"""
+    return pd.DataFrame({
+        "flash_type": flash_types(columns["flash_type"]),
+        "date": columns["date"].astype("datetime64[ns]"),
+        "latitude": columns["latitude"],
+        "longitude": columns["longitude"],
+    })
@@ -1,5 +1,6 @@
 import re
 import sqlite3
+import threading
 import os
 import glob
 import datetime as dt
@@ -9,6 +10,7 @@ import numpy as np
 from functools import lru_cache
 from forest.exceptions import FileNotFound, IndexNotFound
 from forest.old_state import old_state, unique
+import forest.data
 import forest.util
 import forest.map_view
 from forest import (
@@ -17,6 +19,7 @@ from forest import (
 
 
 ENGINE = "h5netcdf"
+DATABASE_FILE = "eida50.db"
 MIN_DATETIME64 = np.datetime64('0001-01-01T00:00:00.000000')
 
 
@@ -27,37 +30,90 @@ def _natargmax(arr):
 
 
 class Dataset:
-    def __init__(self, pattern=None, database_path=None, **kwargs):
+    """EIDA50 satellite imagery
+
+    Time axes of files without a date in their name are stored in
+    ``eida50.db`` under ``cache: directory:`` if one is configured so
+    that server processes share them, see :class:`Indexer`. Files are
+    re-indexed whenever their modification time changes
+
+    :param pattern: glob pattern of EIDA50 files
+    :param database_path: meta-data store, overrides cache directory
+    :param lon_range: optional (start, end) longitudes to read
+    :param lat_range: optional (start, end) latitudes to read
+    """
+    def __init__(self, pattern=None, database_path=None,
+                 lon_range=None, lat_range=None, **kwargs):
         self.pattern = pattern
+        self.lon_range = lon_range
+        self.lat_range = lat_range
         if database_path is None:
-            database_path = ":memory:"
+            if forest.data.CACHE_DIRECTORY is None:
+                database_path = ":memory:"
+            else:
+                os.makedirs(forest.data.CACHE_DIRECTORY, exist_ok=True)
+                database_path = os.path.join(forest.data.CACHE_DIRECTORY,
+                                             DATABASE_FILE)
+        if database_path == ":memory:":
+            indexer = None
+        else:
+            indexer = Indexer(database_path)
         self.database = Database(database_path)
-        self.locator = Locator(self.pattern, self.database)
+        self.locator = Locator(self.pattern, self.database, indexer=indexer)
 
     def navigator(self):
         return Navigator(self.locator, self.database)
 
     def map_view(self, color_mapper):
-        loader = Loader(self.locator)
+        loader = Loader(self.locator,
+                        lon_range=self.lon_range,
+                        lat_range=self.lat_range)
         return forest.map_view.map_view(loader, color_mapper, use_hover_tool=False)
 
 
+def _mtime(path):
+    """Modification time of a file, None if it no longer exists"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
 class Database:
-    """Meta-data store for EIDA50 dataset"""
-    def __init__(self, path=":memory:"):
+    """Meta-data store for EIDA50 dataset
+
+    On-disk stores use write-ahead logging so that readers in other
+    server processes are not blocked while an :class:`Indexer` writes
+
+    :param path: SQLite file or ":memory:"
+    :param timeout: seconds to wait for another process's write lock
+    """
+    def __init__(self, path=":memory:", timeout=30.):
         self.fmt = "%Y-%m-%d %H:%M:%S"
         self.path = path
-        self.connection = sqlite3.connect(self.path)
+        self.connection = sqlite3.connect(self.path, timeout=timeout)
         self.cursor = self.connection.cursor()
+        if self.path != ":memory:":
+            self.cursor.execute("PRAGMA journal_mode=WAL")
 
         # Schema
         query = """
             CREATE TABLE IF NOT EXISTS file (
                       id INTEGER PRIMARY KEY,
                     path TEXT,
+                   mtime REAL,
                          UNIQUE(path));
         """
         self.cursor.execute(query)
+        columns = [row[1] for row in
+                   self.cursor.execute("PRAGMA table_info(file)")]
+        if "mtime" not in columns:
+            # Store written before modification times were kept, rows
+            # without mtime are re-indexed on first use
+            try:
+                self.cursor.execute("ALTER TABLE file ADD COLUMN mtime REAL")
+            except sqlite3.OperationalError:
+                pass  # Added by another process
         query = """
             CREATE TABLE IF NOT EXISTS time (
                       id INTEGER PRIMARY KEY,
@@ -97,6 +153,57 @@ class Database:
         self.cursor.executemany(query, args)
         self.connection.commit()
 
+    def insert_file(self, path, times, mtime=None):
+        """Store times of a file unless already stored for mtime
+
+        Times stored for a different modification time are replaced.
+        Check and insert are a single transaction, so concurrent
+        indexers never store a file twice
+
+        :param mtime: modification time of file when times were read
+        :returns: True if times were inserted
+        """
+        self.connection.commit()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            query = """
+                SELECT id, mtime FROM file WHERE path = :path;
+            """
+            row = self.cursor.execute(query, {"path": path}).fetchone()
+            inserted = (row is None) or (row[1] != mtime)
+            if row is None:
+                query = """
+                    INSERT INTO file (path, mtime) VALUES (:path, :mtime);
+                """
+                self.cursor.execute(query, {"path": path, "mtime": mtime})
+            elif inserted:
+                # File modified since times were stored
+                query = """
+                    DELETE FROM time WHERE file_id = :id;
+                """
+                self.cursor.execute(query, {"id": row[0]})
+                query = """
+                    UPDATE file SET mtime = :mtime WHERE id = :id;
+                """
+                self.cursor.execute(query, {"id": row[0], "mtime": mtime})
+            if inserted:
+                query = """
+                    INSERT INTO time (time, file_id)
+                         VALUES (:time, (SELECT id FROM file WHERE path = :path));
+                """
+                args = [{"path": path, "time": time.strftime(self.fmt)}
+                        for time in times]
+                self.cursor.executemany(query, args)
+        except Exception:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        return inserted
+
+    def version(self):
+        """Changes whenever another connection commits to the store"""
+        return self.cursor.execute("PRAGMA data_version").fetchone()[0]
+
     def fetch_times(self, path=None):
         """Retrieve times"""
         if path is None:
@@ -119,6 +226,22 @@ class Database:
         times = [dt.datetime.strptime(text, self.fmt) for text in texts]
         return list(sorted(times))
 
+    def has_path(self, path, mtime=None):
+        """True if times of path are stored
+
+        :param mtime: only count times stored for this modification time
+        """
+        if mtime is None:
+            query = """
+                SELECT 1 FROM file WHERE path = :path;
+            """
+        else:
+            query = """
+                SELECT 1 FROM file WHERE path = :path AND mtime = :mtime;
+            """
+        args = {"path": path, "mtime": mtime}
+        return self.cursor.execute(query, args).fetchone() is not None
+
     def fetch_paths(self):
         """Retrieve paths"""
         query = """
@@ -129,32 +252,172 @@ class Database:
         return list(sorted(texts))
 
 
+class TimeIndex:
+    """Sorted file start times parsed from file names
+
+    Answers file lookups with a binary search, file names are only
+    parsed the first time they are seen and the index is only rebuilt
+    when the list of paths changes
+    """
+    def __init__(self):
+        self.paths = []
+        self.starts = np.array([], dtype="datetime64[s]")
+        self.sorted_paths = []
+        self.unparsed = []
+        self.version = 0
+        self._dates = {}
+
+    def update(self, paths):
+        """Rebuild index if paths differ from previous call
+
+        :returns: True if index changed
+        """
+        if (paths is self.paths) or (paths == self.paths):
+            return False
+        self.paths = paths
+        parsed, self.unparsed = [], []
+        for path in paths:
+            if path not in self._dates:
+                self._dates[path] = Locator.parse_date(path)
+            date = self._dates[path]
+            if date is None:
+                self.unparsed.append(path)
+            else:
+                parsed.append((date, path))
+        parsed.sort()
+        self.starts = np.array([date for date, _ in parsed],
+                               dtype="datetime64[s]")
+        self.sorted_paths = [path for _, path in parsed]
+        self.version += 1
+        return True
+
+    def find_file(self, date):
+        """Most recent file starting at or before date"""
+        date = np.datetime64(date, "s")
+        i = np.searchsorted(self.starts, date, side="right") - 1
+        if i < 0:
+            msg = "No file for {}".format(date)
+            raise FileNotFound(msg)
+        return self.sorted_paths[i]
+
+
+class Indexer:
+    """Store time axes of files in a background thread
+
+    Each thread opens its own connection to the on-disk store, readers
+    notice new rows through :meth:`Database.version`
+
+    :param database_path: SQLite file shared between processes
+    """
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self._lock = threading.Lock()
+        self._queue = []
+        self._queued = set()
+        self._thread = None
+
+    def update(self, paths):
+        """Queue paths that are not yet indexed or have been modified"""
+        with self._lock:
+            pending = [path for path in paths if path not in self._queued]
+            if len(pending) == 0:
+                return
+            self._queued.update(pending)
+            self._queue += pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work,
+                                                daemon=True)
+                self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until queued files have been indexed"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _work(self):
+        try:
+            self._index()
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    # Stopped by an unexpected error, queued paths are
+                    # forgotten so that the next update starts again
+                    self._thread = None
+                    self._queue = []
+                    self._queued.clear()
+
+    def _index(self):
+        with Database(self.database_path) as database:
+            while True:
+                with self._lock:
+                    paths, self._queue = self._queue, []
+                    if len(paths) == 0:
+                        # Next update starts a new thread
+                        self._thread = None
+                        return
+                for path in paths:
+                    try:
+                        mtime = os.path.getmtime(path)
+                        if not database.has_path(path, mtime):
+                            times = Locator._load_time_axis(path, mtime)
+                            database.insert_file(
+                                path, times.astype(dt.datetime), mtime)
+                    except (OSError, KeyError, ValueError,
+                            sqlite3.Error) as error:
+                        print("WARNING: EIDA50 index {}: {}".format(path, error))
+                    finally:
+                        with self._lock:
+                            # Modified files may be queued again
+                            self._queued.discard(path)
+
+
 class Locator:
-    """Locate EIDA50 satellite images"""
-    def __init__(self, pattern, database):
+    """Locate EIDA50 satellite images
+
+    :param indexer: :class:`Indexer` to read time axes in the
+                    background, by default files are read on demand
+    """
+    def __init__(self, pattern, database, indexer=None):
         self.pattern = pattern
         self._glob = forest.util.cached_glob(dt.timedelta(minutes=15))
         self.database = database
+        self.indexer = indexer
+        self.index = TimeIndex()
+        self._axes = {}
+        self._recorded = 0
+        self._all_times_key = None
+        self._all_times = None
 
     def all_times(self, paths):
-        """All available times"""
+        """All available times
+
+        Result is reused until paths change or new files are recorded
+        by this or any other process
+        """
+        self.index.update(paths)
+        mtimes = [_mtime(path) for path in self.index.unparsed]
+        key = (self.index.version, self._recorded, self.database.version(),
+               tuple(mtimes))
+        if key == self._all_times_key:
+            return self._all_times
+
+        # Store unparsed files in database, re-index modified files
+        pending = [path for path, mtime in zip(self.index.unparsed, mtimes)
+                   if (mtime is not None) and
+                   not self.database.has_path(path, mtime)]
+        if self.indexer is None:
+            for path in pending:
+                self.record(path)
+        else:
+            self.indexer.update(pending)
+
         # Parse times from file names not in database
-        unparsed_paths = []
-        filename_times = []
         database_paths = set(self.database.fetch_paths())
-        for path in paths:
-            if path in database_paths:
-                continue
-            time = self.parse_date(path)
-            if time is None:
-                unparsed_paths.append(path)
-                continue
-            filename_times.append(time)
-
-        # Store unparsed files in database
-        for path in unparsed_paths:
-            times = self.load_time_axis(path)  # datetime64[s]
-            self.database.insert_times(times.astype(dt.datetime), path)
+        filename_times = [start for start, path in zip(self.index.starts,
+                                                       self.index.sorted_paths)
+                          if path not in database_paths]
 
         # All recorded times
         database_times = self.database.fetch_times()
@@ -163,7 +426,31 @@ class Locator:
         arrays = [
             np.array(database_times, dtype='datetime64[s]'),
             np.array(filename_times, dtype='datetime64[s]')]
-        return np.unique(np.concatenate(arrays))
+        self._all_times = np.unique(np.concatenate(arrays))
+        self._all_times_key = (self.index.version, self._recorded,
+                               self.database.version(), tuple(mtimes))
+        return self._all_times
+
+    def record(self, path):
+        """Store time axis of path unless stored since last modified"""
+        mtime = os.path.getmtime(path)
+        if self.database.has_path(path, mtime):
+            return
+        times = self._load_time_axis(path, mtime)  # datetime64[s]
+        if self.database.insert_file(path, times.astype(dt.datetime), mtime):
+            self._recorded += 1
+
+    def time_axis(self, path):
+        """Times of a file, reused until the file is modified"""
+        mtime = os.path.getmtime(path)
+        if (path not in self._axes) or (self._axes[path][0] != mtime):
+            if self.database.has_path(path, mtime):
+                times = self.database.fetch_times(path)
+                times = np.array(times, dtype='datetime64[s]')
+            else:
+                times = self._load_time_axis(path, mtime)  # datetime64[s]
+            self._axes[path] = (mtime, times)
+        return self._axes[path][1]
 
     def find(self, paths, date):
         """Find file and index related to date
@@ -174,11 +461,7 @@ class Locator:
         path = self.find_file(paths, date)
 
         # Load times from database
-        if path in self.database.fetch_paths():
-            times = self.database.fetch_times(path)
-            times = np.array(times, dtype='datetime64[s]')
-        else:
-            times = self.load_time_axis(path)  # datetime64[s]
+        times = self.time_axis(path)
 
         index = self.find_index(times, date, dt.timedelta(minutes=15))
         return path, index
@@ -187,8 +470,12 @@ class Locator:
         return self._glob(self.pattern)
 
     @staticmethod
-    @lru_cache()
     def load_time_axis(path):
+        return Locator._load_time_axis(path, os.path.getmtime(path))
+
+    @staticmethod
+    @lru_cache()
+    def _load_time_axis(path, mtime):
         with xarray.open_dataset(path, engine=ENGINE) as nc:
             values = nc["time"]
         return np.array(values, dtype='datetime64[s]')
@@ -202,17 +489,8 @@ class Locator:
         """
         if isinstance(user_date, (dt.datetime, str)):
             user_date = np.datetime64(user_date, 's')
-        dates = np.array([
-            self.parse_date(path) for path in paths],
-            dtype='datetime64[s]')
-        mask = ~(dates <= user_date)
-        if mask.all():
-            msg = "No file for {}".format(user_date)
-            raise FileNotFound(msg)
-        before_dates = np.ma.array(
-                dates, mask=mask, dtype='datetime64[s]')
-        i =  _natargmax(before_dates.filled())
-        return paths[i]
+        self.index.update(paths)
+        return self.index.find_file(user_date)
 
     @staticmethod
     def find_index(times, time, length):
@@ -244,8 +522,23 @@ class Locator:
 
 
 class Loader:
-    def __init__(self, locator):
+    """Images of EIDA50 brightness temperature
+
+    Every file shares a fixed grid, so Web Mercator extents and
+    resampling indices are computed once by
+    :func:`forest.geo.reprojection_plan`,
+    after which each frame is a single read and a gather
+
+    :param locator: :class:`Locator`
+    :param lon_range: optional (start, end) longitudes to read
+    :param lat_range: optional (start, end) latitudes to read
+    :param scale: coarsening factor, e.g. 4.4km to 8.8km
+    """
+    def __init__(self, locator, lon_range=None, lat_range=None, scale=2):
         self.locator = locator
+        self.lon_range = _bounds(lon_range)
+        self.lat_range = _bounds(lat_range)
+        self.scale = scale
         self.empty_image = {
             "x": [],
             "y": [],
@@ -259,6 +552,8 @@ class Loader:
             with xarray.open_dataset(paths[-1], engine=ENGINE) as nc:
                 self.cache["longitude"] = nc["longitude"].values
                 self.cache["latitude"] = nc["latitude"].values
+            self.cache["signature"] = geo.grid_signature(
+                self.cache["longitude"], self.cache["latitude"])
 
     @property
     def longitudes(self):
@@ -283,18 +578,41 @@ class Loader:
         path, itime = self.locator.find(paths, valid_time)
         return self.load_image(path, itime)
 
+    def plan(self):
+        """Shared :class:`forest.geo.Plan` of the dataset grid"""
+        return geo.shared_plan(self.longitudes, self.latitudes,
+                               scale=self.scale,
+                               lon_range=self.lon_range,
+                               lat_range=self.lat_range,
+                               signature=self.cache["signature"])
+
     def load_image(self, path, itime):
-        lons = self.longitudes
-        lats = self.latitudes
+        plan = self.plan()
+        if plan is None:
+            return self.empty_image
         with xarray.open_dataset(path, engine=ENGINE) as nc:
-            values = nc["data"][itime].values
+            block = nc["data"][(itime,) + plan.window].values
+        return self.resample(block, plan)
+
+    @staticmethod
+    def resample(block, plan):
+        """Gather block read with plan.window into a bokeh image"""
+        image = block[plan.rows[:, np.newaxis], plan.cols[np.newaxis, :]]
+        return {
+            "x": [plan.x],
+            "y": [plan.y],
+            "dw": [plan.dw],
+            "dh": [plan.dh],
+            "image": [np.ma.masked_invalid(image)]
+        }
+
 
-        # Use datashader to coarsify images from 4.4km to 8.8km grid
-        scale = 2
-        return geo.stretch_image(
-                lons, lats, values,
-                plot_width=int(values.shape[1] / scale),
-                plot_height=int(values.shape[0] / scale))
+def _bounds(values):
+    """Hashable (start, end) pair or None"""
+    if values is None:
+        return None
+    start, end = values
+    return (float(start), float(end))
 
 
 class Navigator:
@@ -314,9 +632,7 @@ class Navigator:
                 # Detect missing file
                 paths = self.locator.glob()
                 path = self.locator.find_file(paths, time)
-                if path not in self.database.fetch_paths():
-                    times = self.locator.load_time_axis(path)  # datetime64[s]
-                    self.database.insert_times(times.astype(dt.datetime), path)
+                self.locator.record(path)
 
                 # Update stale state
                 store_times = store.state.get("valid_times", [])
@@ -0,0 +1,512 @@
+"""
+Fast store
+----------
+
+Unified model NetCDF files are chunked for writing rather than for
+the access patterns used by FOREST. ``forest fast-store`` copies
+selected variables into a directory of memory-mappable arrays with
+two layouts per variable and model run:
+
+* ``<variable>.map.npy`` shape ``(time, pressure, y, x)``, each map
+  is contiguous on disk for the map view
+* ``<variable>.series.npy`` shape ``(y, x, pressure, time)``, each
+  column is contiguous on disk for time series and profiles
+
+An ``index.json`` file records initial times, valid times,
+pressures and units so that navigation never opens a data file.
+
+.. code-block:: sh
+
+    forest fast-store --directory /data/store --variable air_temperature \\
+        /data/um/*.nc
+
+.. code-block:: yaml
+
+    files:
+      - label: UM
+        pattern: /data/store
+        file_type: fast_store
+
+.. autofunction:: convert
+
+.. autoclass:: Store
+    :members:
+
+"""
+import os
+import json
+import datetime as dt
+from functools import lru_cache
+import numpy as np
+import netCDF4
+import bokeh.models
+import forest.map_view
+import forest.util
+from forest import geo
+from forest.bases import Reusable
+from forest.drivers import gridded_forecast
+from forest.drivers.unified_model import Loader as _UMLoader
+from forest.exceptions import SearchFail
+
+
+INDEX_FILE = "index.json"
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def convert(paths, directory, variables, block_bytes=64 * 1024**2):
+    """Copy variables from unified model files into store
+
+    A model run is usually split across several files, paths are
+    grouped by initial time and the time axes of each run's files are
+    merged so that every variable is written once per run
+
+    :param paths: NetCDF files to read
+    :param directory: location of store, created if needed
+    :param variables: names of variables to copy
+    :param block_bytes: memory used to transpose map layout into
+                        series layout
+    """
+    os.makedirs(directory, exist_ok=True)
+    index = _read_index(directory)
+    for initial_time, run_paths in sorted(_runs(paths).items()):
+        run = initial_time.strftime("%Y%m%dT%H%MZ")
+        run_directory = os.path.join(directory, run)
+        os.makedirs(run_directory, exist_ok=True)
+        entries = index.setdefault(initial_time.strftime(TIME_FORMAT), {})
+        for variable in variables:
+            print(f"fast-store: {run} {variable} {len(run_paths)} file(s)")
+            entry = _convert_variable(run_paths, variable,
+                                      os.path.join(run_directory, variable),
+                                      block_bytes)
+            if entry is None:
+                print(f"fast-store: skip '{variable}' missing or "
+                      "unsupported axes")
+                continue
+            entry["run"] = run
+            entries[variable] = entry
+        _write_index(directory, index)
+
+
+def _runs(paths):
+    """Group paths by initial time"""
+    runs = {}
+    for path in paths:
+        with netCDF4.Dataset(path) as dataset:
+            initial_time = _initial_time(path, dataset)
+        if initial_time is None:
+            print(f"fast-store: skip '{path}' no initial time")
+            continue
+        runs.setdefault(initial_time, []).append(path)
+    return runs
+
+
+def _convert_variable(paths, variable, prefix, block_bytes):
+    # Coordinates related to each leading index of every file
+    positions = []
+    grid = None
+    units = ""
+    for path in paths:
+        with netCDF4.Dataset(path) as dataset:
+            if variable not in dataset.variables:
+                continue
+            var = dataset.variables[variable]
+            located = _positions(dataset, var)
+            if located is None:
+                return None
+            if grid is None:
+                grid = _grid(dataset, var)
+                units = getattr(var, "units", "")
+            positions += [(path,) + position for position in located]
+    if grid is None:
+        return None
+    lons, lats, shift_by = grid
+    ny, nx = len(lats), len(lons)
+    valid_times = sorted(set(t for _, _, t, _ in positions))
+    if all(p is None for _, _, _, p in positions):
+        levels = [None]
+    else:
+        levels = sorted(set(float(p) for _, _, _, p in positions))
+    time_index = {t: i for i, t in enumerate(valid_times)}
+    level_index = {p: j for j, p in enumerate(levels)}
+    _save(prefix + ".lon.npy", lons)
+    _save(prefix + ".lat.npy", lats)
+
+    # Map-contiguous layout, one read per map
+    shape = (len(valid_times), len(levels), ny, nx)
+    maps = np.lib.format.open_memmap(prefix + ".map.npy.tmp", mode="w+",
+                                     dtype="f4", shape=shape)
+    maps[:] = np.nan
+    for path in sorted(set(path for path, _, _, _ in positions),
+                       key=paths.index):
+        with netCDF4.Dataset(path) as dataset:
+            var = dataset.variables[variable]
+            for source, index, time, pressure in positions:
+                if source != path:
+                    continue
+                i = time_index[time]
+                j = level_index[None if pressure is None else float(pressure)]
+                values = np.ma.filled(np.ma.asarray(var[index], dtype="f4"),
+                                      np.nan)
+                maps[i, j] = np.roll(values, shift_by, axis=1)
+    maps.flush()
+
+    # Column-contiguous layout, transposed in blocks of rows
+    series = np.lib.format.open_memmap(prefix + ".series.npy.tmp",
+                                       mode="w+",
+                                       dtype="f4",
+                                       shape=(ny, nx) + shape[:2])
+    rows = max(1, block_bytes // max(1, maps[:, :, 0, :].nbytes))
+    for start in range(0, ny, rows):
+        end = min(start + rows, ny)
+        series[start:end] = np.transpose(maps[:, :, start:end, :],
+                                         (2, 3, 1, 0))
+    series.flush()
+    del maps, series
+
+    # Replace files atomically since servers may have them memory-mapped
+    for suffix in (".map.npy", ".series.npy"):
+        os.replace(prefix + suffix + ".tmp", prefix + suffix)
+
+    return {
+        "units": units,
+        "valid_times": [str(t) for t in valid_times],
+        "pressures": [] if levels == [None] else levels
+    }
+
+
+def _positions(dataset, var):
+    """Leading index, valid time and pressure of each map in a file
+
+    :returns: list or None if variable has unsupported axes
+    """
+    lead = var.shape[:-2]
+    time_var = _coordinate("time", dataset, var)
+    if (len(lead) > 2) or (time_var is None):
+        return None
+    times = np.array(netCDF4.num2date(np.atleast_1d(time_var[:]),
+                                      units=time_var.units),
+                     dtype="datetime64[s]")
+    pressures = _coordinate("pressure", dataset, var)
+    if pressures is not None:
+        pressures = np.atleast_1d(pressures[:])
+    if (len(lead) == 2) and var.dimensions[0].startswith("pressure"):
+        time_axis, pressure_axis = 1, 0
+    elif len(lead) == 2:
+        time_axis, pressure_axis = 0, 1
+    else:
+        time_axis, pressure_axis = 0, 0
+    positions = []
+    for index in np.ndindex(*lead):
+        positions.append((index,
+                          _pick(times, index, time_axis),
+                          _pick(pressures, index, pressure_axis)))
+    return positions
+
+
+def _grid(dataset, var):
+    """Longitudes normalised to [-180, 180), latitudes and roll"""
+    lons = np.array(_coordinate("longitude", dataset, var)[:], dtype="f8")
+    lats = np.array(_coordinate("latitude", dataset, var)[:], dtype="f8")
+    shift_by = int(np.sum(lons > 180.))
+    if shift_by > 0:
+        lons[lons > 180.] -= 360.
+        lons = np.roll(lons, shift_by)
+    return lons, lats, shift_by
+
+
+def _pick(values, index, axis):
+    """Coordinate value related to a leading index"""
+    if values is None:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return values[index[axis]]
+
+
+def _save(path, values):
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "wb") as stream:
+        np.save(stream, values)
+    os.replace(tmp, path)
+
+
+def _coordinate(prefix, dataset, var):
+    """Search dimensions and coordinates for a coordinate variable"""
+    names = list(var.dimensions)
+    names += getattr(var, "coordinates", "").split()
+    for name in names:
+        if name.startswith(prefix) and (name in dataset.variables):
+            return dataset.variables[name]
+
+
+def _initial_time(path, dataset):
+    time = forest.util.initial_time(path)
+    if time is not None:
+        return time
+    try:
+        var = dataset.variables["forecast_reference_time"]
+    except KeyError:
+        return None
+    return forest.util.to_datetime(
+        netCDF4.num2date(var[:], units=var.units))
+
+
+def _read_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_index(directory, index):
+    path = os.path.join(directory, INDEX_FILE)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "w") as stream:
+        json.dump(index, stream, indent=2, sort_keys=True)
+    os.replace(tmp, path)  # Readers never see a partial index
+
+
+class Store:
+    """Read-only access to a directory created by :func:`convert`
+
+    The index is re-read whenever ``index.json`` changes so that
+    runs converted while the server is running become available.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = {}
+        self._mtime = None
+
+    @property
+    def index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return {}
+        if mtime != self._mtime:
+            self._index = _read_index(self.directory)
+            self._mtime = mtime
+            # Arrays may have been replaced by a conversion
+            self._array.cache_clear()
+            self._grid.cache_clear()
+        return self._index
+
+    def variables(self):
+        names = set()
+        for entries in self.index.values():
+            names.update(entries.keys())
+        return sorted(names)
+
+    def initial_times(self, variable):
+        return sorted(np.datetime64(key, "s")
+                      for key, entries in self.index.items()
+                      if variable in entries)
+
+    def valid_times(self, variable, initial_time):
+        return np.array(self.entry(variable, initial_time)["valid_times"],
+                        dtype="datetime64[s]")
+
+    def pressures(self, variable, initial_time):
+        return np.array(self.entry(variable, initial_time)["pressures"])
+
+    def entry(self, variable, initial_time):
+        """Index entry related to variable and initial time
+
+        :raises SearchFail: if not in store
+        """
+        key = _to_datetime(initial_time).strftime(TIME_FORMAT)
+        try:
+            return self.index[key][variable]
+        except KeyError:
+            raise SearchFail(f"{variable} {key} not in {self.directory}")
+
+    def image(self, variable, initial_time, valid_time, pressure):
+        """Longitudes, latitudes, map and units
+
+        :raises SearchFail: if map not in store
+        """
+        entry = self.entry(variable, initial_time)
+        i = _time_index(entry["valid_times"], valid_time)
+        j = _pressure_index(entry["pressures"], pressure)
+        prefix = self._prefix(variable, entry)
+        values = self._array(prefix + ".map.npy")[i, j]
+        lons, lats = self._grid(prefix)
+        return lons, lats, np.ma.masked_invalid(values), entry["units"]
+
+    def column(self, variable, initial_time, lon, lat):
+        """Valid times, pressures, values shaped (pressure, time) and units
+
+        :raises SearchFail: if variable not in store
+        """
+        entry = self.entry(variable, initial_time)
+        prefix = self._prefix(variable, entry)
+        lons, lats = self._grid(prefix)
+        i, j = geo.nearest_index(lons, lats)(lon, lat)
+        values = np.array(self._array(prefix + ".series.npy")[j, i])
+        return (np.array(entry["valid_times"], dtype="datetime64[s]"),
+                np.array(entry["pressures"]),
+                np.ma.masked_invalid(values),
+                entry["units"])
+
+    def _prefix(self, variable, entry):
+        return os.path.join(self.directory, entry["run"], variable)
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _array(path):
+        return np.load(path, mmap_mode="r")
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _grid(prefix):
+        return np.load(prefix + ".lon.npy"), np.load(prefix + ".lat.npy")
+
+
+def _time_index(valid_times, valid_time):
+    times = np.array(valid_times, dtype="datetime64[s]")
+    time = np.datetime64(_to_datetime(valid_time), "s")
+    i = np.searchsorted(times, time)
+    if (i == len(times)) or (times[i] != time):
+        raise SearchFail(f"{valid_time} not in store")
+    return i
+
+
+def _pressure_index(pressures, pressure, rtol=0.01):
+    if len(pressures) == 0:
+        return 0
+    if pressure is None:
+        raise SearchFail("Please specify: 'pressure'")
+    pressures = np.asarray(pressures)
+    mask = np.abs(pressures - pressure) < (rtol * pressure)
+    if not mask.any():
+        raise SearchFail(f"{pressure} not in store")
+    return np.where(mask)[0][0]
+
+
+def _to_datetime(value):
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[s]").astype(dt.datetime)
+    return forest.util.to_datetime(value)
+
+
+class Dataset:
+    def __init__(self, label=None, pattern=None, **kwargs):
+        self.label = label
+        self.store = Store(os.path.expanduser(pattern))
+
+    def navigator(self):
+        return Navigator(self.store)
+
+    def map_view(self, color_mapper=None):
+        loader = ImageLoader(self.label, self.store)
+        return forest.map_view.map_view(loader, color_mapper)
+
+    def series_view(self, figure):
+        return SeriesView(figure, self.store)
+
+
+class Navigator:
+    """Navigate store using index file"""
+    def __init__(self, store):
+        self.store = store
+
+    def variables(self, pattern):
+        return self.store.variables()
+
+    def initial_times(self, pattern, variable):
+        return self.store.initial_times(variable)
+
+    def valid_times(self, pattern, variable, initial_time):
+        try:
+            return self.store.valid_times(variable, initial_time)
+        except SearchFail:
+            return []
+
+    def pressures(self, pattern, variable, initial_time):
+        try:
+            return self.store.pressures(variable, initial_time)
+        except SearchFail:
+            return []
+
+
+class ImageLoader:
+    """Load map slices from store"""
+    def __init__(self, name, store):
+        self.name = name
+        self.store = store
+
+    def image(self, state):
+        if not self.valid(state):
+            return gridded_forecast.empty_image()
+        try:
+            lons, lats, values, units = self.store.image(state.variable,
+                                                         state.initial_time,
+                                                         state.valid_time,
+                                                         state.pressure)
+        except SearchFail:
+            return gridded_forecast.empty_image()
+        values, units = _UMLoader.convert_units(state.variable, values,
+                                                units)
+        data = _UMLoader.stretch(lons, lats, values, units)
+        data["name"] = [self.name]
+        data.update(gridded_forecast.coordinates(state.valid_time,
+                                                 state.initial_time,
+                                                 state.pressures,
+                                                 state.pressure))
+        return data
+
+    @staticmethod
+    def valid(state):
+        return all(value is not None for value in (
+            state.variable,
+            state.initial_time,
+            state.valid_time,
+            state.pressures))
+
+
+class SeriesView(Reusable):
+    """Time series at the selected position read from series layout"""
+    def __init__(self, figure, store):
+        self.figure = figure
+        self.store = store
+        self.source = bokeh.models.ColumnDataSource({
+            "x": [],
+            "y": []
+        })
+        self.renderers = [
+            self.figure.line(x="x", y="y", source=self.source),
+            self.figure.circle(x="x", y="y", source=self.source),
+        ]
+
+    def prepare(self):
+        for renderer in self.renderers:
+            renderer.visible = True
+
+    def reset(self):
+        for renderer in self.renderers:
+            renderer.visible = False
+        self.source.data = {
+            "x": [],
+            "y": []
+        }
+
+    def render_id(self, state, layer_id):
+        variable = state.layers.index[layer_id]["variable"]
+        if state.initial_time is None:
+            return
+        lons, lats = geo.plate_carree(state.position.x,
+                                      state.position.y)
+        try:
+            times, pressures, values, units = self.store.column(
+                variable, state.initial_time, lons[0], lats[0])
+            j = _pressure_index(pressures, state.pressure)
+        except SearchFail:
+            self.source.data = {"x": [], "y": []}
+            return
+        values, _ = _UMLoader.convert_units(variable, values[j], units)
+        self.source.data = {
+            "x": times,
+            "y": values
+        }
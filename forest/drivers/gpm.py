@@ -1,15 +1,25 @@
-"""GPM driver"""
+"""GPM driver
+
+Day files are indexed once by the date in their name, each file's
+time axis is mapped to indices once per modification time so that
+files that are still being written are refreshed. Files share a grid,
+so the reprojection plan, see :func:`forest.geo.shared_plan`, is
+computed once per grid and each frame reads a single slice.
+"""
 from functools import partial, lru_cache
-import glob
+import bisect
+import os
 import datetime as dt
 import netCDF4
 import numpy as np
 import forest.map_view
-import forest.geo
 import forest.util
+from forest import geo
+
+
+NPIXELS = 512
 
 
-@lru_cache(maxsize=16)
 def read_times(path):
     """Read time axis from a file"""
     with netCDF4.Dataset(path) as dataset:
@@ -18,10 +28,38 @@ def read_times(path):
     return np.array([forest.util.to_datetime(t) for t in times], dtype=object)
 
 
+@lru_cache(maxsize=64)
+def time_index(path, mtime):
+    """Sorted times and matching indices of a file's time axis"""
+    times = read_times(path).astype("datetime64[s]")
+    order = np.argsort(times, kind="stable")
+    return times[order], order
+
+
+@lru_cache(maxsize=64)
+def read_grid(path, mtime):
+    """Longitudes, latitudes and grid signature of a file"""
+    with netCDF4.Dataset(path) as dataset:
+        lons = dataset.variables["longitude"][:]
+        lats = dataset.variables["latitude"][:]
+    return lons, lats, geo.grid_signature(lons, lats)
+
+
+def read_plan(path, mtime, npixels=NPIXELS):
+    """Reprojection plan of a file's grid, at most npixels along an axis
+
+    Plans are shared by files with the same grid
+    """
+    lons, lats, signature = read_grid(path, mtime)
+    scale = max(len(lons), len(lats)) / npixels
+    return geo.shared_plan(lons, lats, scale=max(scale, 1),
+                           signature=signature)
+
+
 class Dataset:
     def __init__(self, pattern=None, **kwargs):
         self.pattern = pattern
-        self.locator = Locator()
+        self.locator = Locator(pattern)
 
     def navigator(self):
         return Navigator(self.pattern, self.locator)
@@ -35,9 +73,40 @@ class Dataset:
 
 class Locator:
     """Search files to find paths"""
-    def __init__(self):
+    def __init__(self, pattern=None):
+        self.pattern = pattern
         self.parse_date = partial(forest.util.parse_date,
                                   "[0-9]{8}", "%Y%m%d")
+        self._glob = forest.util.cached_glob(dt.timedelta(minutes=1))
+        self._parsed = {}
+        self._paths = None
+        self.dates = []
+        self.sorted_paths = []
+
+    def glob(self):
+        """List file system at most once a minute"""
+        if self.pattern is None:
+            return []
+        return self._glob(self.pattern)
+
+    def index(self, paths):
+        """Sort paths by date, only new paths are parsed
+
+        :returns: sorted dates and matching paths
+        """
+        if (paths is not self._paths) and (paths != self._paths):
+            pairs = []
+            for path in paths:
+                if path not in self._parsed:
+                    self._parsed[path] = self.parse_date(path)
+                date = self._parsed[path]
+                if date is not None:
+                    pairs.append((date, path))
+            pairs.sort()
+            self.dates = [date for date, _ in pairs]
+            self.sorted_paths = [path for _, path in pairs]
+            self._paths = paths
+        return self.dates, self.sorted_paths
 
     def find_paths_and_index(self, paths, date):
         """Flatten paths and index generators"""
@@ -47,15 +116,23 @@ class Locator:
                 yield path, index
 
     def find_paths(self, paths, search_date, window_size):
-        for path in paths:
-            if abs(self.parse_date(path) - search_date) < window_size:
-                yield path
+        dates, paths = self.index(paths)
+        lower = bisect.bisect_right(dates, search_date - window_size)
+        upper = bisect.bisect_left(dates, search_date + window_size)
+        yield from paths[lower:upper]
+
+    def times(self, path):
+        """Time axis of a file, re-read only if the file changed"""
+        times, _ = time_index(path, os.path.getmtime(path))
+        return times.astype(dt.datetime)
 
     def find_index(self, path, date):
-        times = read_times(path)
-        tolerance = dt.timedelta(minutes=1)
-        pts = np.where(np.abs(times - date) < tolerance)
-        for index in pts[0]:
+        times, order = time_index(path, os.path.getmtime(path))
+        tolerance = np.timedelta64(1, "m")
+        date = np.datetime64(forest.util.to_datetime(date), "s")
+        lower = np.searchsorted(times, date - tolerance, side="right")
+        upper = np.searchsorted(times, date + tolerance, side="left")
+        for index in order[lower:upper]:
             yield index
 
 
@@ -73,21 +150,23 @@ class Navigator:
 
     def valid_times(self, *args, valid_times=None, valid_time=None, **kwargs):
         """Times from time stamps and contents of file(s)"""
-        paths = list(sorted(glob.glob(self.pattern)))
-        timestamps = {self.locator.parse_date(path): path for path in paths}
+        paths = self.locator.glob()
+        dates, sorted_paths = self.locator.index(paths)
 
         # Guard clause uninitialised state
         if (valid_times is None) or (valid_time is None):
-            return list(timestamps.keys())
+            return list(dates)
 
         # Cache path time axis
-        if valid_time in timestamps:
-            path = timestamps[valid_time]
-            self._time_arrays[valid_time] = read_times(path)
+        date = forest.util.to_datetime(valid_time)
+        i = bisect.bisect_left(dates, date)
+        if (i < len(dates)) and (dates[i] == date):
+            self._time_arrays[valid_time] = self.locator.times(
+                sorted_paths[i])
 
         # Compute dataset time axis
         arrays = [
-            np.asarray(list(timestamps.keys()))
+            np.asarray(dates)
         ]
         for array in self._time_arrays.values():
             arrays.append(array)
@@ -120,16 +199,29 @@ class _Loader:
         data = self.empty_image
 
         # Search file system
-        paths = sorted(glob.glob(self.pattern))
-        date = old_state.valid_time
+        paths = self.locator.glob()
+        date = forest.util.to_datetime(old_state.valid_time)
         for path, index in self.locator.find_paths_and_index(paths, date):
+            plan = read_plan(path, os.path.getmtime(path))
+            if plan is None:
+                continue
             with netCDF4.Dataset(path) as dataset:
-                lons = dataset.variables["longitude"][:]
-                lats = dataset.variables["latitude"][:]
-                data = dataset.variables["precipitation_flux"][index]
-            npixels = 512
-            data = forest.geo.stretch_image(lons, lats, data,
-                                    plot_height=npixels,
-                                    plot_width=npixels)
+                block = dataset.variables["precipitation_flux"][
+                    (index,) + plan.window]
+            data = self.resample(block, plan)
             break
         return data
+
+    @staticmethod
+    def resample(block, plan):
+        """Gather block read with plan.window into a bokeh image"""
+        image = block[plan.rows[:, np.newaxis], plan.cols[np.newaxis, :]]
+        image = np.ma.masked_invalid(np.ma.filled(
+            np.ma.asarray(image, dtype="f8"), np.nan))
+        return {
+            "x": [plan.x],
+            "y": [plan.y],
+            "dw": [plan.dw],
+            "dh": [plan.dh],
+            "image": [image],
+        }
@@ -3,6 +3,7 @@ Rapidly Developing Thunderstorms (RDT)
 --------------------------------------
 """
 import os
+import copy
 import glob
 import re
 import datetime as dt
@@ -11,17 +12,17 @@ import json
 import netCDF4 as nc
 import numpy as np
 import numpy.ma as ma
-import cf_units
-from geojson import Point, Polygon, Feature, FeatureCollection
 from forest import (
         geo,
         locate)
 from forest.old_state import old_state, unique
 import forest.util
 from forest.exceptions import FileNotFound
+from forest.spatial_index import CulledSource, on_viewport
 from bokeh.palettes import GnBu3, OrRd3
 import itertools
-import math
+from functools import lru_cache
+from collections import namedtuple
 
 
 class Dataset:
@@ -74,44 +75,7 @@ class View:
     """Rapidly Developing Thunderstorms (RDT) visualisation"""
     def __init__(self, loader):
         self.loader = loader
-        empty = {
-            "type": "FeatureCollection",
-            "features": [
-                {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Polygon",
-                        "coordinates": [[[0, 0]]]
-                    },
-                    "properties": {
-                        'CType': 0,
-                        'CRainRate': 0,
-                        'ConvTypeMethod': 0,
-                        'ConvType': 0,
-                        'ConvTypeQuality': 0,
-                        'SeverityIntensity': 0,
-                        'MvtSpeed': 0,
-                        'MvtDirection': 0,
-                        'NumIdCell': 0,
-                        'CTPressure': 0,
-                        'CTPhase': '',
-                        'CTReff': '',
-                        'ExpansionRate': '-',
-                        'BTmin': 0,
-                        'BTmoy': 0,
-                        'CTCot': '-',
-                        'CTCwp': '-',
-                        'NbPosLightning': 0,
-                        'SeverityType': '',
-                        'Surface': '',
-                        'Duration': 0,
-                        'CoolingRate': 0,
-                        'PhaseLife': "Triggering"
-                    }
-                }
-            ]
-        }
-        self.empty_geojson = json.dumps(empty)
+        self.empty_polygons = get_empty_feature_dict('Polygon')
         self.empty_tail_line = dict(
                 xs=[], ys=[],
                 LonTrajCellCG=[],
@@ -156,10 +120,17 @@ class View:
         self.color_mapper = bokeh.models.CategoricalColorMapper(
                 palette=['#fee8c8', '#fdbb84', '#e34a33', '#43a2ca', '#a8ddb5'],
                 factors=["Triggering", "Triggering from split", "Growing", "Mature", "Decaying"])
-        self.source = bokeh.models.GeoJSONDataSource(geojson=self.empty_geojson)
-        self.tail_line_source = bokeh.models.ColumnDataSource(self.empty_tail_line)
-        self.tail_point_source = bokeh.models.ColumnDataSource(self.empty_tail_point)
-        self.centre_point_source = bokeh.models.ColumnDataSource(self.empty_centre_point)
+        # Only features inside the viewport are sent to the browser
+        self.culled = [
+            CulledSource(self.empty_polygons),
+            CulledSource(self.empty_tail_line),
+            CulledSource(self.empty_tail_point),
+            CulledSource(self.empty_centre_point)]
+        (self.source,
+         self.tail_line_source,
+         self.tail_point_source,
+         self.centre_point_source) = [c.source for c in self.culled]
+        self.figures = []
 
     @old_state
     @unique
@@ -168,19 +139,21 @@ class View:
         if state.valid_time is not None:
             date = forest.util.to_datetime(state.valid_time)
             try:
-                (self.source.geojson,
-                 self.tail_line_source.data,
-                 self.tail_point_source.data,
-                 self.centre_point_source.data) = self.loader.load_date(date)
+                columns = self.loader.load_date(date)
             except FileNotFound:
                 print("rdt.View.render caught FileNotFound", date)
-                self.source.geojson = self.empty_geojson
-                self.tail_line_source.data = self.empty_tail_line
-                self.tail_point_source.data = self.empty_tail_point
-                self.centre_point_source.data = self.empty_centre_point
+                columns = (self.empty_polygons,
+                           self.empty_tail_line,
+                           self.empty_tail_point,
+                           self.empty_centre_point)
+            for culled, data in zip(self.culled, columns):
+                culled.update(data)
 
     def add_figure(self, figure):
         """This is where all the plotting happens (e.g. when the applciation is loaded)"""
+        if len(self.figures) == 0:
+            on_viewport(figure, self.culled)
+        self.figures.append(figure)
         circles = figure.circle(x="x", y="y", size=3, source=self.tail_point_source)
         cntr_circles = figure.circle_cross(x="x1", y="y1", size=10, line_color='black', fill_color=None, source=self.centre_point_source)
         future_lines = figure.multi_line(xs="xs", ys="ys", line_color='black', source=self.centre_point_source)
@@ -232,12 +205,7 @@ class Loader:
         if os.path.splitext(file_name)[1] == '.nc':
             return self.load_all_netcdf(file_name)
         elif os.path.splitext(file_name)[1] == '.json':
-            return (
-                self.load_polygon_json(file_name),
-                self.load_tail_lines_json(file_name),
-                self.load_tail_points_json(file_name),
-                self.load_centre_points_json(file_name)
-            )
+            return self.load_all_json(file_name)
         else:
             return 'File extension not recognised: ' + file_name
 
@@ -246,16 +214,36 @@ class Loader:
         """
         Loads polygons from netcdf
         :param path: absolute path and filename
-        :return: geojson object for plotting in bokeh
+        :return: dicts of columns for plotting in bokeh
         """
 
         return getRDT(path, 0, 'All')
 
+    @classmethod
+    def load_all_json(cls, path):
+        """
+        Loads polygons, tail lines, tail points and centre points from
+        a GeoJSON file, results are cached per file
+        :param path: absolute path and filename
+        :return: dicts of columns for plotting in bokeh
+        """
+        result = cls._load_all_json(path, os.path.getmtime(path))
+        return tuple(_copy(item) for item in result)
+
+    @classmethod
+    @lru_cache(maxsize=32)
+    def _load_all_json(cls, path, mtime):
+        return (
+            cls.load_polygon_json(path),
+            cls.load_tail_lines_json(path),
+            cls.load_tail_points_json(path),
+            cls.load_centre_points_json(path))
+
     @staticmethod
     def load_polygon_json(path):
-        """Load GeoJSON string representation of Polygons from file
+        """Load Polygons from GeoJSON file
 
-        :returns: GeoJSON str
+        :returns: dict of xs, ys and property columns
         """
 
         with open(path) as stream:
@@ -263,43 +251,39 @@ class Loader:
 
         # Convert units from the netcdf / geojson data file units into something more readable (e.g. could be Kelvin to degrees C or Pa to hPa)
         unitsToRescale = {'Pa' : {'scale':100, 'offset':0, 'Units': 'hPa'} }
-        # Get text labels instead of numbers for certain fields
-        fieldsToLookup = ['PhaseLife', 'SeverityType', 'SeverityIntensity', 'ConvType', 'CType']
 
-        copy = dict(rdt)
-        for i, feature in enumerate(rdt["features"]):
+        lons, lats, rows = [], [], []
+        for feature in rdt["features"]:
             coordinates = feature['geometry']['coordinates'][0]
-            lons, lats = np.asarray(coordinates).T
-            x, y = geo.web_mercator(lons, lats)
-            c = np.array([x, y]).T.tolist()
-            copy["features"][i]['geometry']['coordinates'][0] = c
+            lon, lat = np.asarray(coordinates, dtype=float).reshape(-1, 2).T
+            lons.append(lon)
+            lats.append(lat)
 
-            for k in feature['properties'].keys():
+            properties = dict(feature['properties'])
+            for k, value in feature['properties'].items():
 
                 # Might be easier to have a units lookup instead of this ...
-                deldata, myunits = descale_rdt(k, feature['properties'][k])
+                deldata, myunits = descale_rdt(k, value)
                 if myunits in unitsToRescale.keys():
                     try:
                         mydict = unitsToRescale.get(myunits)
                         scale, offset, units = mydict.values()
-                        conv_data = (feature['properties'][k] / scale) + offset
-                        copy['features'][i]['properties'][k] = conv_data
-                    except:
-                        continue
+                        properties[k] = (value / scale) + offset
+                    except TypeError:
+                        pass
 
-                if k in fieldsToLookup:
-                    try:
-                        copy['features'][i]['properties'][k] = fieldValueLUT(k, feature['properties'][k])
-                    except:
-                        continue
-        return json.dumps(copy)
+                if k in FIELDS_TO_LOOKUP:
+                    properties[k] = fieldValueLUT(k, value)
+            rows.append(properties)
+
+        return polygon_columns(_project(lons, lats), property_columns(rows))
 
     @staticmethod
     def load_polygon_netcdf(path):
         """
         Loads polygons from netcdf
         :param path: absolute path and filename
-        :return: geojson object for plotting in bokeh
+        :return: dictionary of data for plotting as a ColumnDataSource in bokeh
         """
 
         return getRDT(path, 0, 'Polygon')
@@ -469,6 +453,26 @@ def make_arrow(mydict, lon, lat, speed, direction):
 
 def get_empty_feature_dict(type):
 
+    if type == 'Polygon':
+        return dict(
+                xs=[], ys=[],
+                CType=[],
+                CRainRate=[],
+                ConvType=[],
+                SeverityType=[],
+                SeverityIntensity=[],
+                NumIdCell=[],
+                CTPhase=[],
+                CTPressure=[],
+                ExpansionRate=[],
+                BTmin=[],
+                BTmoy=[],
+                CTCot=[],
+                NbPosLightning=[],
+                Duration=[],
+                CoolingRate=[],
+                PhaseLife=[])
+
     if type == 'Tail_Lines':
         return dict(
                 xs=[], ys=[],
@@ -518,216 +522,320 @@ def get_empty_feature_dict(type):
         return type + ': Not a valid feature type'
 
 
-def getRDT(path, lev, type):
-
-    '''
-    Gets RDT data from the netcdf output of the NWCSAF software
-    :param path: Full path and filename of the netcdf file
-    :param lev: [0,1] Level number. 0 = bottom of the cloud, 1 = top of the cloud (heights vary between clouds)
-    :param type: ['All', 'Centre_Point', 'Polygon', 'Tail_Points', 'Tail_Lines', 'Gridded']
-    :return: geojson feature collection object for plotting
-    '''
+FIELDS_TO_LOOKUP = ['PhaseLife', 'SeverityType', 'SeverityIntensity',
+                    'ConvType', 'CType']
 
-    # Load the netcdf data
-    ncds = nc.Dataset(path)
-
-    # Get variable names that have either 'nlevel' or 'recNUM' dimensions
-    varlev = [] # 'nlevel' dimension
-    varrec = [] # 'recNUM' dimension
-    vartraj = [] # 'nbpttraj' Trajectory points for each object
-    for ncv in ncds.variables.keys():
-        var_dim = ncds.variables[ncv].dimensions
-        if 'nlevel' in var_dim:
-            varlev.append(ncv)
-        if ('recNUM' in var_dim) and (ncds.dimensions['recNUM'].size == ncds.variables[ncv].size):
-            varrec.append(ncv)
-        if 'nbpttraj' in var_dim:
-            vartraj.append(ncv)
-    allvars = varlev.copy()
-    allvars.extend(varrec)
+# Specific conversions for storage efficiency, name: (scale, offset, decimals)
+CONVERSIONS = {
+    'ExpansionRate': (360000, 0, 0),  # to %/hr
+    'CoolingRate': (3600, 0, 0),  # to K/hr
+    'Surface': (1e-6, 0, 0),  # to km2
+    'CTPressure': (0.01, 0, 0),  # Pa to hPa
+    'CRainRate': (1, 0, 0),
+    'CTPressRate': (36, 0, 0),  # Pa/s to hPa/hour
+    'BTemp': (1, -273.15, 1),  # K to degC
+    'BTmin': (1, -273.15, 1),
+    'BTmoy': (1, -273.15, 1),
+}
 
-    # How many cloud levels have we got? It should only be 2 (cloud top and bottom)
-    dimsize = len(ma.getdata(ncds.variables[varlev[0]][0,:]))
 
-    # Convert units from the netcdf
-    unitsToRescale = {'Pa': 'hPa'} #, 'K': 'degC'}
-    # Get text labels instead of numbers for certain fields
-    fieldsToLookup = ['PhaseLife', 'SeverityType', 'SeverityIntensity', 'ConvType', 'CType']
-
-    # Check the lev is within the dimsize
-    if not lev in np.arange(dimsize):
-        return 'Please enter a valid level number (0 or 1)'
-    else:
-        list_to_return = []
-
-    if type in ['Polygon', 'All']:
+Records = namedtuple("Records", ("values", "datatypes", "varlev", "varrec"))
 
-        # Create list of features to populate
-        features = []
-        fieldsToLookup = ['PhaseLife', 'SeverityType', 'SeverityIntensity', 'ConvType', 'CType']
-        for i in np.arange(ncds.dimensions['recNUM'].size):
 
-            # do something
-            ypolcoords_ll = getDataOnly(ncds.variables['LatContour'][i, lev, :])
-            xpolcoords_ll = getDataOnly(ncds.variables['LonContour'][i, lev, :])
+def getRDT(path, lev, type):
 
-            xpolcoords, ypolcoords = geo.web_mercator(xpolcoords_ll, ypolcoords_ll)
+    '''
+    Gets RDT data from the netcdf output of the NWCSAF software
 
-            this_poly = Polygon([[(float(coord[0]), float(coord[1])) for coord in zip(xpolcoords, ypolcoords)]])
+    Variables are read once as whole arrays and the parsed result is
+    cached per file, see :func:`read_records`
 
-            # Get the properties for this polygon
-            pol_props = {}
-            for var in allvars:
+    :param path: Full path and filename of the netcdf file
+    :param lev: [0,1] Level number. 0 = bottom of the cloud, 1 = top of the cloud (heights vary between clouds)
+    :param type: ['All', 'Centre_Point', 'Polygon', 'Tail_Points', 'Tail_Lines']
+    :return: dicts of columns for plotting as ColumnDataSources
+    '''
+    result = _getRDT(path, os.path.getmtime(path), lev, type)
+    if isinstance(result, tuple):
+        return tuple(_copy(item) for item in result)
+    return _copy(result)
 
-                if var in varlev:
-                    thisdata = ncds.variables[var][i, lev]
-                else:
-                    thisdata = ncds.variables[var][i]
 
-                thisdata_scaled = convert_values(thisdata, ncds.variables[var])
-                datatype = ncds.variables[var].datatype
+def _copy(item):
+    """Callers may modify returned dicts, cached values must not change
 
-                if var in fieldsToLookup:
-                    try:
-                        thisdata_scaled = fieldValueLUT(var, int(thisdata))
-                        datatype = 'string'
-                    except:
-                        continue
+    Columns hold nested lists and arrays, e.g. polygon vertices, so the
+    copy must be deep
+    """
+    if isinstance(item, dict):
+        return copy.deepcopy(item)
+    return item
 
-                update_json(pol_props, var, thisdata_scaled, datatype)
 
-            features.append(Feature(geometry=this_poly, properties=pol_props))
+@lru_cache(maxsize=32)
+def _getRDT(path, mtime, lev, type):
+    records = read_records(path)
 
-        feature_collection = FeatureCollection(features)
-        
-        list_to_return.append(json.dumps(feature_collection))
+    # How many cloud levels have we got? It should only be 2 (cloud top and bottom)
+    dimsize = records.values[records.varlev[0]].shape[1]
 
+    # Check the lev is within the dimsize
+    if not lev in np.arange(dimsize):
+        return 'Please enter a valid level number (0 or 1)'
 
+    list_to_return = []
+    if type in ['Polygon', 'All']:
+        list_to_return.append(rdt_polygons(records, lev))
     if type in ['Tail_Lines', 'All']:
-
-        # Create an empty dictionary
-        mydict_tl = get_empty_feature_dict('Tail_Lines')
-
-        # Loop through features
-        for i in np.arange(ncds.dimensions['recNUM'].size):
-
-            # Loop through all items in mydict_tl
-            for k in mydict_tl.keys():
-                try:
-                    thisdata, units = descale_rdt(k, getDataOnly(ncds.variables[k][:]))
-                    mydict_tl[k].append(thisdata)
-                except:
-                    # Do nothing at the moment with the xs and ys
-                    if not k in ['xs', 'ys']:
-                        mydict_tl[k].append(None)
-                    else:
-                        continue
-
-            lats = getDataOnly(ncds.variables['LatTrajCellCG'][i, :])
-            lons = getDataOnly(ncds.variables['LonTrajCellCG'][i, :])
-
-            xs, ys = geo.web_mercator(lons, lats)
-            mydict_tl['xs'].append(xs)
-            mydict_tl['ys'].append(ys)
-
-        list_to_return.append(mydict_tl)
-
-
+        list_to_return.append(rdt_tail_lines(records))
     if type in ['Tail_Points', 'All']:
+        list_to_return.append(rdt_tail_points(records))
+    if type in ['Centre_Point', 'All']:
+        list_to_return.append(rdt_centre_points(records, lev))
 
-        # Create an empty dictionary
-        mydict_tp = get_empty_feature_dict('Tail_Points')
+    if len(list_to_return) == 1:
+        return list_to_return[0]
+    elif len(list_to_return) > 1:
+        return tuple(list_to_return)
+    else:
+        return 'Nothing to return'
 
-        for i in np.arange(ncds.dimensions['recNUM'].size):
 
-            # do something
-            npts = len(getDataOnly(ncds.variables['LonTrajCellCG'][i]))
-            mykeys = [k for k in mydict_tp.keys() if k not in ['x', 'y']]
-            for k in mykeys:
+def read_records(path):
+    """Read every per-record variable of an RDT NetCDF file at once
 
-                thisdata = getDataOnly(ncds.variables[k][i]).tolist()
+    :returns: :class:`Records` holding masked arrays by variable name
+              and the names of variables with 'nlevel' or single
+              value 'recNUM' dimensions
+    """
+    values, datatypes, varlev, varrec = {}, {}, [], []
+    with nc.Dataset(path) as ncds:
+        nrec = ncds.dimensions['recNUM'].size
+        for name, var in ncds.variables.items():
+            dims = var.dimensions
+            if 'nlevel' in dims:
+                varlev.append(name)
+            if ('recNUM' in dims) and (var.size == nrec):
+                varrec.append(name)
+            if ('recNUM' in dims) or ('nlevel' in dims):
+                values[name] = ma.asarray(var[:])
+                datatypes[name] = var.datatype
+    return Records(values, datatypes, varlev, varrec)
+
+
+def _level(records, name, lev):
+    """Values of a variable at a cloud level, one row per record"""
+    values = records.values[name]
+    if name in records.varlev:
+        return values[:, lev]
+    return values
+
+
+def _ragged(values):
+    """Unmasked values of each row of a 2D masked array"""
+    values = ma.asarray(values)
+    valid = ~ma.getmaskarray(values)
+    counts = valid.sum(axis=1)
+    if len(counts) == 0:
+        return []
+    data = ma.getdata(values)[valid]
+    return np.split(data, np.cumsum(counts)[:-1])
 
-                try:
-                    if len(thisdata) == 1:
-                        thisdata = thisdata[0]
-                except:
-                    pass
-
-                if isinstance(thisdata, list) and (npts == len(thisdata)):
-                    datalist, units = descale_rdt(k, thisdata)
-                    mydict_tp[k].extend(datalist)
-                else:
-                    # Repeat the data value npts times
-                    datalist = [i for i in itertools.repeat(thisdata, npts)]
-                    thisdata, units = descale_rdt(k, datalist)
-                    mydict_tp[k].extend(datalist)
-
-                # Some records don't have any data. Mostly happens for ExpanRateTraj
-                if len(thisdata) == 0:
-                    datalist = [i for i in itertools.repeat('-', npts)]
-                    mydict_tp[k].extend(datalist)
-
-                # Some records seem to have missing values
-                if len(datalist) != npts:
-                    pdb.set_trace()
-
-            lats = getDataOnly(ncds.variables['LatTrajCellCG'][i, :])
-            lons = getDataOnly(ncds.variables['LonTrajCellCG'][i, :])
-            x, y = geo.web_mercator(lons, lats)
-            mydict_tp['x'].extend(x)
-            mydict_tp['y'].extend(y)
 
-        list_to_return.append(mydict_tp)
+def _project(lons, lats):
+    """Web Mercator projection of ragged rows in a single call"""
+    if len(lons) == 0:
+        return [], []
+    counts = np.cumsum([len(row) for row in lons])[:-1]
+    x, y = _web_mercator(np.concatenate(lons), np.concatenate(lats))
+    return np.split(x, counts), np.split(y, counts)
 
-    # Do specific things for each feature type
-    if type in ['Centre_Point', 'All']:
 
-        # Create an empty dictionary
-        mydict_cp = get_empty_feature_dict('Centre_Point')
+def _web_mercator(lons, lats):
+    if np.size(lons) == 0:
+        return np.array([]), np.array([])
+    return geo.web_mercator(lons, lats)
 
-        for i in np.arange(ncds.dimensions['recNUM'].size):
 
-            # Get the Point features
-            lat = ncds.variables['LatG'][i, lev]
-            lon = ncds.variables['LonG'][i, lev]
-            x1, y1 = geo.web_mercator(lon, lat)
-            mydict_cp['x1'].extend(x1)
-            mydict_cp['y1'].extend(y1)
+def _to_list(values):
+    """Python values, masked values become None"""
+    return ma.asarray(values).tolist()
 
-            mykeys = [k for k in mydict_cp.keys() if not (('x' in k) or ('y' in k))]
-            for k in mykeys:
-                try:
-                    if k in varlev:
-                        thisdata = ncds.variables[k][i, lev]
-                    else:
-                        thisdata = ncds.variables[k][i]
 
-                    thisdata, units = descale_rdt(k, thisdata) # May not need to do this
-                    mydict_cp[k].append(thisdata)
-                except:
-                    mydict_cp[k].append(None)
+def convert_array(name, values, datatype):
+    """Convert values into readable units for a property column
 
-            # Now calculate future point and line
-            try:
-                speed = float(ncds.variables['MvtSpeed'][i])
-            except ValueError:
-                speed = 0
-            try:
-                direction = float(ncds.variables['MvtDirection'][i])
-            except ValueError:
-                direction = 0
+    Specific conversions are listed in CONVERSIONS, other values keep
+    their type. Masked values are None.
 
-            mydict_cp = make_arrow(mydict_cp, lon, lat, speed, direction)
+    :returns: list or None if datatype is not supported
+    """
+    values = ma.asarray(values)
+    if name in CONVERSIONS:
+        scale, offset, decimals = CONVERSIONS[name]
+        converted = ma.round(values * scale + offset, decimals)
+        if decimals == 0:
+            converted = converted.astype(int)
+        return _to_list(converted)
+    if 'int' in str(datatype):
+        return _to_list(values.astype(int))
+    if 'float' in str(datatype):
+        return _to_list(values.astype(float))
+
+
+def lookup_array(name, values):
+    """Text labels of numeric fields, see :func:`fieldValueLUT`"""
+    labels = []
+    for value in _to_list(values):
+        if value is None:
+            labels.append(None)
+        else:
+            labels.append(fieldValueLUT(name, int(value)))
+    return labels
+
+
+def rdt_properties(records, lev):
+    """Scalar properties of each record as columns"""
+    columns = {}
+    for name in records.varlev + records.varrec:
+        values = _level(records, name, lev)
+        if values.ndim != 1:
+            continue
+        if name in FIELDS_TO_LOOKUP:
+            column = lookup_array(name, values)
+        else:
+            column = convert_array(name, values, records.datatypes[name])
+        if column is not None:
+            columns[name] = column
+    return columns
+
+
+def rdt_polygons(records, lev):
+    """Cloud cell contours as xs, ys and property columns"""
+    xs, ys = _project(
+        _ragged(_level(records, 'LonContour', lev)),
+        _ragged(_level(records, 'LatContour', lev)))
+    properties = {name: _column(values)
+                  for name, values in rdt_properties(records, lev).items()}
+    return polygon_columns((xs, ys), properties)
+
+
+def polygon_columns(xs_ys, properties):
+    """ColumnDataSource data of polygons, tooltip fields are always present"""
+    xs, ys = xs_ys
+    columns = get_empty_feature_dict('Polygon')
+    columns.update(properties)
+    for name, values in columns.items():
+        if len(values) != len(xs):
+            # Field not present in file
+            columns[name] = ['-'] * len(xs)
+    columns['xs'], columns['ys'] = xs, ys
+    return columns
+
+
+def property_columns(rows):
+    """Columns of a list of property dicts, missing values are None"""
+    names = set()
+    for row in rows:
+        names.update(row.keys())
+    return {name: _column([row.get(name) for row in rows])
+            for name in sorted(names)}
+
+
+def _column(values):
+    """Numeric columns as arrays so that bokeh sends binary buffers"""
+    numbers = [value for value in values if value is not None]
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool)
+           for value in numbers):
+        if all(isinstance(value, int) for value in numbers) and (
+                len(numbers) == len(values)):
+            return np.array(values, dtype=np.int32)
+        return np.array([np.nan if value is None else value
+                         for value in values], dtype=float)
+    return ['-' if value is None else value for value in values]
+
+
+def rdt_tail_lines(records):
+    """Trajectory of each cloud cell as a line"""
+    mydict = get_empty_feature_dict('Tail_Lines')
+    lons = _ragged(records.values['LonTrajCellCG'])
+    lats = _ragged(records.values['LatTrajCellCG'])
+    for k in mydict.keys():
+        if k in ['xs', 'ys']:
+            continue
+        if k not in records.values:
+            mydict[k] = [None] * len(lons)
+            continue
+        values = records.values[k]
+        if values.ndim == 1:
+            rows = _to_list(values)
+        else:
+            rows = _ragged(values)
+        mydict[k] = [descale_rdt(k, row)[0] for row in rows]
+    mydict['xs'], mydict['ys'] = _project(lons, lats)
+    return mydict
 
-        list_to_return.append(mydict_cp)
 
+def rdt_tail_points(records):
+    """Each point of each cloud cell trajectory"""
+    mydict = get_empty_feature_dict('Tail_Points')
+    lons = records.values['LonTrajCellCG']
+    valid = ~ma.getmaskarray(lons)
+    npts = valid.sum(axis=1)
+    for k in mydict.keys():
+        if k in ['x', 'y']:
+            continue
+        if k not in records.values:
+            mydict[k] = ['-'] * int(npts.sum())
+            continue
+        values = records.values[k]
+        if values.shape == valid.shape:
+            column = values[valid]
+        else:
+            column = np.repeat(values.reshape(len(npts), -1)[:, 0], npts)
+        mydict[k] = ma.filled(ma.asarray(column, dtype=float), np.nan)
+    lats = records.values['LatTrajCellCG']
+    mydict['x'], mydict['y'] = _web_mercator(ma.getdata(lons)[valid],
+                                             ma.getdata(lats)[valid])
+    return mydict
 
-    if len(list_to_return) == 1:
-        return list_to_return[0]
-    elif len(list_to_return) > 1:
-        return tuple(list_to_return)
-    else:
-        return 'Nothing to return'
+
+def rdt_centre_points(records, lev):
+    """Centre point, future point, movement line and arrow of each cell"""
+    mydict = get_empty_feature_dict('Centre_Point')
+    lon = ma.filled(ma.asarray(_level(records, 'LonG', lev), dtype=float),
+                    np.nan)
+    lat = ma.filled(ma.asarray(_level(records, 'LatG', lev), dtype=float),
+                    np.nan)
+    nrec = len(lon)
+    for k in mydict.keys():
+        if ('x' in k) or ('y' in k):
+            continue
+        if k not in records.values:
+            mydict[k] = [None] * nrec
+            continue
+        values, _ = descale_rdt(k, _level(records, k, lev))
+        mydict[k] = _to_list(values)
+
+    # Now calculate future point and line
+    speed = ma.filled(ma.asarray(records.values['MvtSpeed'], dtype=float), 0)
+    direction = ma.filled(
+        ma.asarray(records.values['MvtDirection'], dtype=float), 0)
+    lon2, lat2 = calc_dst_point(lon, lat, speed, direction)
+    lon3, lat3, lon4, lat4 = get_arrow_poly(lon2, lat2, speed, direction)
+
+    # Project all points in one call
+    x, y = _web_mercator(np.concatenate([lon, lon2, lon3, lon4]),
+                         np.concatenate([lat, lat2, lat3, lat4]))
+    x1, x2, x3, x4 = np.reshape(x, (4, nrec))
+    y1, y2, y3, y4 = np.reshape(y, (4, nrec))
+    mydict['x1'], mydict['y1'] = x1, y1
+    mydict['x2'], mydict['y2'] = x2, y2
+    mydict['xs'] = np.stack([x1, x2], axis=-1).tolist()
+    mydict['ys'] = np.stack([y1, y2], axis=-1).tolist()
+    mydict['Arrowxs'] = np.stack([x2, x3, x4], axis=-1).tolist()
+    mydict['Arrowys'] = np.stack([y2, y3, y4], axis=-1).tolist()
+    return mydict
 
 
 def getDataOnly(array1d):
@@ -746,42 +854,14 @@ def getDataOnly(array1d):
 
     return outarray
 
-def update_json(props, varname, data, datatype):
-    """
-    Adds an extra field to the properties of a feature in a geojson file. Provides a consistent way to handle different data types
-    :param props: dictionary of properties
-    :param varname: string variable name
-    :param data: the data to add
-    :param datatype: datatype
-    :return: updated props
-    """
-
-    if isinstance(data, ma.MaskedArray) and (data.shape == ()) and ('int' in str(datatype)):
-        props.update({varname: np.int(ma.getdata(data))})
-
-    elif isinstance(data, ma.MaskedArray) and (data.shape == ()) and ('float' in str(datatype)):
-        props.update({varname: np.float(ma.getdata(data))})
-
-    elif isinstance(data, np.float32) or isinstance(data, np.float):
-        props.update({varname: float(data)})
-
-    elif isinstance(data, np.int) or isinstance(data, np.uint16):
-        props.update({varname: int(data)})
-
-    elif str(datatype) == 'string':
-        props.update({varname: str(data)})
-
-    else:
-        return
-
-
-
 def calc_dst_point(x1d, y1d, speed, angle):
     """Calculate destination point
 
     Estimates positions in longitude/latitude space from speed and
     angle on the surface of a sphere, in this case Earth.
 
+    .. note:: Arguments may be scalars or arrays
+
     :param x1d: longitude
     :param y1d: latitude
     """
@@ -794,20 +874,20 @@ def calc_dst_point(x1d, y1d, speed, angle):
     # Radius of the earth (m)
     R = 6378137
 
-    x1 = math.radians(x1d)
-    y1 = math.radians(y1d)
+    x1 = np.radians(x1d)
+    y1 = np.radians(y1d)
 
     # Convert degrees to radians
-    direction = math.radians(angle)
+    direction = np.radians(angle)
 
-    y2 = math.asin(math.sin(y1) * math.cos(d / R) +
-                   math.cos(y1) * math.sin(d / R) * math.cos(direction))
+    y2 = np.arcsin(np.sin(y1) * np.cos(d / R) +
+                   np.cos(y1) * np.sin(d / R) * np.cos(direction))
 
-    x2 = x1 + math.atan2(math.sin(direction) * math.sin(d / R) * math.cos(y1),
-                         math.cos(d / R) - math.sin(y1) * math.sin(y2))
+    x2 = x1 + np.arctan2(np.sin(direction) * np.sin(d / R) * np.cos(y1),
+                         np.cos(d / R) - np.sin(y1) * np.sin(y2))
 
-    x2d = math.degrees(x2)
-    y2d = math.degrees(y2)
+    x2d = np.degrees(x2)
+    y2d = np.degrees(y2)
     return x2d, y2d
 
 
@@ -830,7 +910,7 @@ def get_arrow_poly(x2,y2, speed, direction):
 
     # First point
     pt1_dir = (mvt_line_dir - 180) % 360 - arrow_angl
-    pt1_len = math.sqrt(3. * math.pow( mvt_line_len * arrow_linefrac, 2 ) / 2) # Metres
+    pt1_len = np.sqrt(3. * (mvt_line_len * arrow_linefrac)**2 / 2) # Metres
     # Convert len back to speed for the function
     pt1_speed = pt1_len / (timestep * 60)
     # Calculate x3, y3
@@ -838,7 +918,7 @@ def get_arrow_poly(x2,y2, speed, direction):
 
     # Second point
     pt2_dir = (mvt_line_dir - 180) % 360 + arrow_angl
-    pt2_len = math.sqrt(3.* math.pow( mvt_line_len * arrow_linefrac, 2 ) / 2) # Metres
+    pt2_len = np.sqrt(3. * (mvt_line_len * arrow_linefrac)**2 / 2) # Metres
     # Convert len back to speed for the function
     pt2_speed = pt2_len / (timestep * 60)
     # Calculate x3, y3
@@ -846,60 +926,6 @@ def get_arrow_poly(x2,y2, speed, direction):
     return x3, y3, x4, y4
 
 
-def convert_values(conv_value, conv_var):
-    """ Specific conversions for GeoJSON storage efficiency """
-
-    DP_ACCURACY = 0
-
-    if conv_var.name == 'ExpansionRate':
-        try:
-            return int(round(conv_value * 360000, DP_ACCURACY))  # to %/hr
-        except TypeError:
-            return conv_value
-
-    elif conv_var.name == 'CoolingRate':
-        try:
-            return int(round(conv_value * 3600, DP_ACCURACY))  # to K/hr
-        except TypeError:
-            return conv_value
-
-    elif conv_var.name == 'Surface':
-        try:
-            return int(round(conv_value / 1e6, DP_ACCURACY))  # to km2
-        except TypeError:
-            return conv_value
-
-    elif conv_var.name == 'CTPressure':
-        myu = cf_units.Unit('Pa')
-        try:
-            return int(round(myu.convert(conv_value, 'hPa'), DP_ACCURACY))
-        except TypeError:
-            return conv_value
-
-    elif conv_var.name == 'CRainRate':
-        try:
-            return int(round(conv_value, DP_ACCURACY)) # Round and make it an integer
-        except TypeError:
-            return conv_value
-
-    elif conv_var.name == 'CTPressRate':
-        myu = cf_units.Unit('Pa s-1')
-        try:
-            return int(round(myu.convert(conv_value, 'hPa h-1'), DP_ACCURACY)) # Pa/s to hPa/hour
-        except TypeError:
-            return conv_value
-
-    elif conv_var.name in ['BTemp', 'BTmin', 'BTmoy']:
-        myu = cf_units.Unit('K')
-        try:
-            return round(myu.convert(conv_value, 'degC'), 1)
-        except TypeError:
-            return conv_value
-
-    else:
-        return conv_value
-
-
 def descale_rdt(fn, data):
     # Converts units according to netcdf files definition
     rdtUnitsLUT = {
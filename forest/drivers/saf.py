@@ -4,6 +4,11 @@ SAF Driver
 
 Loads data from NWCSAF satellite NetCDF files.
 
+File dates are parsed once and kept in a sorted index so that the
+files related to a valid time are found by binary search. Longitudes
+and latitudes are read once per file and projected once per grid, and
+only the requested variable is read from each file.
+
 .. autoclass:: Loader
     :members:
 
@@ -15,10 +20,13 @@ Loads data from NWCSAF satellite NetCDF files.
 
 """
 from functools import partial
+from collections import namedtuple
+import bisect
 import datetime as dt
 import glob
 import re
 import os
+import netCDF4
 import xarray
 import numpy as np
 from forest.drivers.gridded_forecast import empty_image, coordinates
@@ -27,6 +35,9 @@ from forest import geo, map_view
 from functools import lru_cache
 
 
+Geometry = namedtuple("Geometry", ("signature", "gx", "gy"))
+
+
 class Dataset:
     """High-level NWC/SAF dataset"""
     def __init__(self,
@@ -55,7 +66,6 @@ class Loader:
         self.locator = locator
         self.label = label
 
-    @lru_cache(maxsize=16)
     def image(self, state):
         '''Gets actual data.
 
@@ -73,22 +83,41 @@ class Loader:
         data = empty_image()
         paths = self.locator.glob()
         long_name_to_variable = self.locator.long_name_to_variable(paths)
+        if long_name not in long_name_to_variable:
+            return data
+        variable = long_name_to_variable[long_name]
         frequency = dt.timedelta(minutes=15)  # TODO: Support arbitrary frequencies
         for path in self.locator.find_paths(paths, valid_time, frequency):
-            with xarray.open_dataset(path) as nc:
-                if long_name not in long_name_to_variable:
-                    continue
-                x = np.ma.masked_invalid(nc['lon'])[:]
-                y = np.ma.masked_invalid(nc['lat'])[:]
-                var = nc[long_name_to_variable[long_name]]
-                z = np.ma.masked_invalid(var)[:]
-                data = geo.stretch_image(x, y, z)
-                data.update(coordinates(valid_time, initial_time, pressures, pressure))
-                data['name'] = [str(var.long_name)]
-                if 'units' in var.attrs:
-                    data['units'] = [str(var.units)]
+            data = dict(self.load_image(path, os.path.getmtime(path),
+                                        variable))
+            data.update(coordinates(valid_time, initial_time, pressures, pressure))
+        return data
+
+    @lru_cache(maxsize=16)
+    def load_image(self, path, mtime, variable):
+        """Stretched image of a single variable, cached per file"""
+        geometry = self.geometry(path, mtime)
+        with netCDF4.Dataset(path) as dataset:
+            var = dataset.variables[variable]
+            z = np.ma.masked_invalid(var[:])
+            attrs = {key: var.getncattr(key) for key in var.ncattrs()}
+        data = geo.stretch_projected(geometry.gx, geometry.gy, z)
+        data['name'] = [str(attrs.get('long_name', variable))]
+        if 'units' in attrs:
+            data['units'] = [str(attrs['units'])]
         return data
 
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def geometry(path, mtime):
+        """Projected coordinates of a file, shared by files on one grid"""
+        with netCDF4.Dataset(path) as dataset:
+            lons = np.ma.masked_invalid(dataset.variables['lon'][:])
+            lats = np.ma.masked_invalid(dataset.variables['lat'][:])
+        signature = geo.grid_signature(lons, lats)
+        gx, gy = geo.shared_projection(lons, lats, signature=signature)
+        return Geometry(signature, gx, gy)
+
 
 class Locator:
     """Locate SAF files"""
@@ -98,17 +127,43 @@ class Locator:
         fmt = "%Y%m%dT%H%M%S%Z"
         self.parse_date = partial(forest.util.parse_date, regex, fmt)
         self._glob = forest.util.cached_glob(dt.timedelta(minutes=10))
+        self._parsed = {}
+        self._paths = None
+        self.dates = []
+        self.sorted_paths = []
 
     def glob(self):
         """List file system"""
         return self._glob(self.pattern)
 
+    def index(self, paths):
+        """Sort paths by date, only new paths are parsed
+
+        :returns: sorted dates and matching paths
+        """
+        if (paths is not self._paths) and (paths != self._paths):
+            pairs = []
+            for path in paths:
+                if path not in self._parsed:
+                    self._parsed[path] = self.parse_date(path)
+                date = self._parsed[path]
+                if date is not None:
+                    pairs.append((date, path))
+            pairs.sort()
+            self.dates = [date for date, _ in pairs]
+            self.sorted_paths = [path for _, path in pairs]
+            self._paths = paths
+        return self.dates, self.sorted_paths
+
     def find_paths(self, paths, date, frequency):
         """Find a file(s) containing information related to date"""
-        for path in paths:
-            file_date = self.parse_date(path)
-            if (file_date <= date) and (date < (file_date + frequency)):
-                yield path
+        dates, paths = self.index(paths)
+        if date is None:
+            return
+        date = forest.util.to_datetime(date)
+        lower = bisect.bisect_right(dates, date - frequency)
+        upper = bisect.bisect_right(dates, date)
+        yield from paths[lower:upper]
 
     def variables(self, paths):
         """Available variables"""
@@ -116,8 +171,8 @@ class Locator:
 
     def valid_times(self, paths):
         """Available validity times"""
-        for path in paths:
-            yield self.parse_date(path)
+        dates, _ = self.index(paths)
+        return iter(dates)
 
     def long_name_to_variable(self, paths):
         """Map long_name attrs to variables"""
@@ -8,10 +8,16 @@ import datetime as dt
 import numpy as np
 import netCDF4
 import sqlite3
+import forest.catalogue
+import forest.data
 import forest.db
 import forest.db.health
 import forest.util
+import forest.image_cache
 import forest.map_view
+import forest.tile_pyramid
+import forest.region
+import forest.cross_section
 import forest._profile
 from forest.bases import Reusable
 from forest import (
@@ -94,14 +100,33 @@ class Dataset:
         self.pattern = pattern
         self.use_database = locator == "database"
         if self.use_database:
-            self.sync = Sync(database_path,
-                             pattern,
-                             directory)
+            self._sync = Sync(database_path,
+                              pattern,
+                              directory)
             self.database = db.get_database(database_path)
             self.locator = db.Locator(self.database.connection,
                                       directory=directory)
         else:
             self.locator = Locator.pattern(self.pattern)
+        if forest.data.CACHE_DIRECTORY is None:
+            tile_directory = None
+            self.image_cache = None
+        else:
+            tile_directory = os.path.join(forest.data.CACHE_DIRECTORY,
+                                          "tiles")
+            self.image_cache = forest.image_cache.ImageCache(
+                os.path.join(forest.data.CACHE_DIRECTORY, "images"),
+                max_bytes=forest.data.CACHE_MAX_BYTES)
+        self.pyramid = forest.tile_pyramid.TilePyramid(
+            tile_directory, max_bytes=forest.data.CACHE_MAX_BYTES)
+
+    def sync(self):
+        """Update database and catalogue files added since start up"""
+        if self.use_database:
+            self._sync()
+        if self.pattern is not None:
+            forest.catalogue.get_catalogue().glob(
+                os.path.expanduser(self.pattern))
 
     def navigator(self):
         if self.use_database:
@@ -109,8 +134,16 @@ class Dataset:
         else:
             return Navigator(self.pattern)
 
+    def image_loader(self):
+        return Loader(self.label, self.pattern, self.locator,
+                      image_cache=self.image_cache)
+
     def map_view(self, color_mapper=None):
-        loader = Loader(self.label, self.pattern, self.locator)
+        loader = self.image_loader()
+        if forest.data.FEATURE_FLAGS["tile_pyramid"]:
+            return forest.tile_pyramid.TiledImageView(loader,
+                                                      self.pyramid,
+                                                      color_mapper)
         return forest.map_view.map_view(loader, color_mapper)
 
     def profile_view(self, figure):
@@ -120,6 +153,13 @@ class Dataset:
     def series_view(self, figure):
         return SeriesView(figure)
 
+    def region_loader(self):
+        return forest.region.RegionLoader.from_pattern(self.pattern)
+
+    def cross_section_loader(self):
+        return forest.cross_section.CrossSectionLoader.from_pattern(
+            self.pattern)
+
 
 class ProfileView(Reusable):
     def __init__(self, figure, loader):
@@ -229,11 +269,16 @@ class Navigator:
 
 
 class Loader:
-    """Unified model formatted loader"""
-    def __init__(self, name, pattern, locator):
+    """Unified model formatted loader
+
+    :param image_cache: optional :class:`forest.image_cache.ImageCache`
+                        shared with other processes, e.g. ``forest prerender``
+    """
+    def __init__(self, name, pattern, locator, image_cache=None):
         self.name = name
         self.pattern = pattern
         self.locator = locator
+        self.image_cache = image_cache
 
     def image(self, state):
         if not self.valid(state):
@@ -275,10 +320,9 @@ class Loader:
         with xarray.open_dataset(path, engine="h5netcdf") as nc:
             data_array = nc[variable]
             print(data_array.shape)
-            lons = np.ma.masked_invalid(data_array.longitude)
-            lats = np.ma.masked_invalid(data_array.latitude)
-            i = np.argmin(np.abs(lons - lon_0))
-            j = np.argmin(np.abs(lats - lat_0))
+            index = geo.nearest_index(data_array.longitude,
+                                      data_array.latitude)
+            i, j = index(lon_0, lat_0)
 
             # Generalised profile slice needed
             y = np.ma.masked_invalid(data_array.dim0)
@@ -297,6 +341,44 @@ class Loader:
     def _input_output(self, pattern, variable, initial_time, valid_time,
                       pressure):
         """I/O needed to load an image and its metadata"""
+        if self.image_cache is None:
+            data = self._decode(pattern, variable, initial_time,
+                                valid_time, pressure)
+        else:
+            data = self._decode_shared(pattern, variable, initial_time,
+                                       valid_time, pressure)
+        if data is None:
+            return gridded_forecast.empty_image()
+        data["name"] = [self.name]
+        return data
+
+    def _decode_shared(self, pattern, variable, initial_time, valid_time,
+                       pressure):
+        """Decode image once across processes sharing an image cache"""
+        key = forest.image_cache.image_key(pattern, variable, initial_time,
+                                           valid_time, pressure)
+        data = self.image_cache.get(key)
+        if data is not None:
+            return data
+        with self.image_cache.lock(key):
+            data = self.image_cache.get(key)
+            if data is not None:
+                # Decoded by another process while waiting
+                return data
+            try:
+                path, pts = self.locator.locate(
+                    pattern,
+                    variable,
+                    initial_time,
+                    valid_time,
+                    pressure)
+            except SearchFail:
+                return None
+            data = self.load_image(path, variable, pts)
+            self.image_cache.put(key, data, source=path)
+        return data
+
+    def _decode(self, pattern, variable, initial_time, valid_time, pressure):
         try:
             path, pts = self.locator.locate(
                 pattern,
@@ -305,11 +387,8 @@ class Loader:
                 valid_time,
                 pressure)
         except SearchFail:
-            return gridded_forecast.empty_image()
-
-        data = self.load_image(path, variable, pts)
-        data["name"] = [self.name]
-        return data
+            return None
+        return self.load_image(path, variable, pts)
 
     def valid(self, state):
         if state.variable is None:
@@ -332,25 +411,35 @@ class Loader:
             pressures = np.array(pressures)
         return any(np.abs(pressures - pressure) < tolerance)
 
+    def locate(self, state):
+        """Path and slices related to state
+
+        :raises SearchFail: if state is not related to a file
+        """
+        return self.locator.locate(
+            self.pattern,
+            state.variable,
+            state.initial_time,
+            state.valid_time,
+            state.pressure)
+
+    def field(self, state):
+        """Longitudes, latitudes, values and units related to state
+
+        :raises SearchFail: if state is not related to a file
+        """
+        path, pts = self.locate(state)
+        return self.load_field(path, state.variable, pts)
+
     @classmethod
     def load_image(cls, path, variable, pts):
         """Load bokeh image glyph data from file using slices"""
-        try:
-            lons, lats, values, units = cls._load_xarray(path, variable, pts)
-        except:
-            lons, lats, values, units = cls._load_cube(path, variable, pts)
-
-        # Units
-        if variable in ["precipitation_flux", "stratiform_rainfall_rate"]:
-            if units == "mm h-1":
-                values = values
-            else:
-                values = forest.util.convert_units(values, units, "kg m-2 hour-1")
-                units = "kg m-2 hour-1"
-        elif units == "K":
-            values = forest.util.convert_units(values, "K", "Celsius")
-            units = "C"
+        lons, lats, values, units = cls.load_field(path, variable, pts)
+        return cls.stretch(lons, lats, values, units)
 
+    @staticmethod
+    def stretch(lons, lats, values, units):
+        """Bokeh image glyph data from full resolution field"""
         # Coarsify images
         threshold = 200 * 200  # Chosen since TMA WRF is 199 x 199
         if values.size > threshold:
@@ -360,16 +449,42 @@ class Loader:
         lons, lats, values = forest.util.coarsify(
             lons, lats, values, fraction)
 
+        data = geo.stretch_image(lons, lats, values)
+        data["units"] = [units]
+        return data
+
+    @classmethod
+    def load_field(cls, path, variable, pts):
+        """Load full resolution 2D field from file using slices"""
+        try:
+            lons, lats, values, units = cls._load_xarray(path, variable, pts)
+        except:
+            lons, lats, values, units = cls._load_cube(path, variable, pts)
+
+        values, units = cls.convert_units(variable, values, units)
+
         # Roll input data into [-180, 180] range
         if np.any(lons > 180.0):
+            lons = np.array(lons)
             shift_by = np.sum(lons > 180.0)
             lons[lons > 180.0] -= 360.
             lons = np.roll(lons, shift_by)
             values = np.roll(values, shift_by, axis=1)
+        return lons, lats, values, units
 
-        data = geo.stretch_image(lons, lats, values)
-        data["units"] = [units]
-        return data
+    @staticmethod
+    def convert_units(variable, values, units):
+        """Convert to units preferred by forecasters"""
+        if variable in ["precipitation_flux", "stratiform_rainfall_rate"]:
+            if units == "mm h-1":
+                values = values
+            else:
+                values = forest.util.convert_units(values, units, "kg m-2 hour-1")
+                units = "kg m-2 hour-1"
+        elif units == "K":
+            values = forest.util.convert_units(values, "K", "Celsius")
+            units = "C"
+        return values, units
 
     @staticmethod
     def _load_xarray(path, variable, pts):
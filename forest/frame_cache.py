@@ -0,0 +1,182 @@
+"""
+Client-side frame cache
+-----------------------
+
+Stepping through time replaces the data held by an image
+:class:`bokeh.models.ColumnDataSource`, revisiting a frame
+re-sends the same array over the websocket. A
+:class:`FrameCacheSource` remembers the last few frames in the browser
+so that the server only needs to send a key to show a frame it has
+already sent.
+
+The server mirrors the order of the client-side least recently used
+cache, both sides evict frames in the same order so the server
+always knows which frames are available in the browser. Only the
+browser holds frame data, the server keeps keys and the callables
+that load them, so a frame the browser unexpectedly drops can be
+loaded again. The cache grows to hold every frame in the animation,
+limited by ``max_bytes``, so that a full run can be looped in the
+browser.
+
+.. autoclass:: FrameCacheSource
+    :members:
+
+.. autofunction:: frame_key
+
+.. autofunction:: frame_keys
+
+"""
+from collections import OrderedDict
+import bokeh.models
+from bokeh.core.properties import Int, List, String
+from forest.util import to_datetime as _to_datetime
+
+
+MIN_FRAMES = 16
+MAX_BYTES = 256 * 1024**2
+
+
+def frame_key(state, valid_time=None):
+    """Identify a frame by variable, initial_time, valid_time and pressure
+
+    :param state: namedtuple representation of application state
+    :param valid_time: override ``state.valid_time``
+    :returns: str suitable for use as a key in JS
+    """
+    if valid_time is None:
+        valid_time = state.valid_time
+    return "|".join([
+        str(state.variable),
+        _key_time(state.initial_time),
+        _key_time(valid_time),
+        str(state.pressure)])
+
+
+def frame_keys(state):
+    """Frame keys in the same order as :class:`forest.components.TimeUI`"""
+    if state.valid_times is None:
+        return []
+    return [frame_key(state, valid_time=t)
+            for t in sorted(state.valid_times)]
+
+
+def _key_time(time):
+    if time is None:
+        return str(time)
+    try:
+        return str(_to_datetime(time))
+    except Exception:
+        return str(time)
+
+
+class FrameCacheSource(bokeh.models.ColumnDataSource):
+    """ColumnDataSource that caches recent frames in the browser
+
+    Frames are sent with an extra ``frame`` column holding their key,
+    the browser stores each frame it receives and swaps
+    previously seen frames back in when :attr:`key` changes.
+
+    .. code-block:: python
+
+        source = FrameCacheSource()
+        source.show(frame_key(state), lambda: loader.image(state))
+
+    .. note:: If the browser unexpectedly misses a frame it reports
+              the key via :attr:`miss` and the server re-sends it
+    """
+    __implementation__ = "frame_cache.ts"
+
+    key = String(default="", help="""
+    Key of the frame currently on display
+    """)
+
+    keys = List(String, help="""
+    Frame keys in animation order, used to play cached frames in the browser
+    """)
+
+    max_frames = Int(default=MIN_FRAMES, help="""
+    Number of frames to keep in the browser, grown to fit :attr:`keys`
+    """)
+
+    miss = String(default="", help="""
+    Key requested by the server that the browser no longer holds
+    """)
+
+    def __init__(self, *args, max_bytes=MAX_BYTES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()  # Key to load callable, LRU order
+        self.on_change("miss", self._on_miss)
+
+    @property
+    def current(self):
+        """Data currently displayed in the browser
+
+        Frames swapped in by the browser are loaded again on demand
+        """
+        frame = self.data.get("frame", [])
+        if (self.key == "") or (list(frame) == [self.key]):
+            return self.data
+        return dict(self._frames[self.key](), frame=[self.key])
+
+    def show(self, key, load):
+        """Display frame, only calling load if the frame is not cached
+
+        :param key: str returned by :func:`frame_key`
+        :param load: callable returning data if frame is not cached
+        """
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            self.key = key
+        else:
+            self._send(key, load(), load)
+
+    def _send(self, key, data, load):
+        if _length(data) == 0:
+            # Empty frames are cheap to send and not worth caching
+            self.data = dict(data, frame=[])
+            self.key = ""
+            return
+        data = dict(data, frame=[key])
+        self.resize(_nbytes(data))
+        self._frames[key] = load
+        self._frames.move_to_end(key)
+        while len(self._frames) > self.max_frames:
+            self._frames.popitem(last=False)
+        self.data = data
+        self.key = key
+
+    def resize(self, frame_bytes):
+        """Hold every frame in :attr:`keys` within max_bytes
+
+        :param frame_bytes: approximate size of a single frame
+        """
+        limit = max(1, self.max_bytes // max(frame_bytes, 1))
+        size = min(max(len(self.keys), MIN_FRAMES), limit)
+        if size != self.max_frames:
+            # Sent before data so browser evicts with the same limit
+            self.max_frames = size
+
+    def _on_miss(self, attr, old, new):
+        """Re-send frame the browser does not hold"""
+        if new == "":
+            return
+        load = self._frames.pop(new, None)
+        if load is not None:
+            self._send(new, load(), load)
+        self.miss = ""
+
+
+def _length(data):
+    for values in data.values():
+        return len(values)
+    return 0
+
+
+def _nbytes(data):
+    """Approximate size of the arrays held in a frame"""
+    total = 0
+    for values in data.values():
+        for value in values:
+            total += getattr(value, "nbytes", 8)
+    return total
@@ -0,0 +1,117 @@
+import {ColumnDataSource} from "models/sources/column_data_source"
+import * as p from "core/properties"
+
+
+export namespace FrameCacheSource {
+  export type Attrs = p.AttrsOf<Props>
+
+  export type Props = ColumnDataSource.Props & {
+    key: p.Property<string>
+    keys: p.Property<string[]>
+    max_frames: p.Property<number>
+    miss: p.Property<string>
+  }
+}
+
+export interface FrameCacheSource extends FrameCacheSource.Attrs {}
+
+export class FrameCacheSource extends ColumnDataSource {
+  properties: FrameCacheSource.Props
+  private _frames: Map<string, any>
+
+  constructor(attrs?: Partial<FrameCacheSource.Attrs>) {
+    super(attrs)
+  }
+
+  static init_FrameCacheSource(): void {
+    this.define<FrameCacheSource.Props>({
+      key:        [ p.String, "" ],
+      keys:       [ p.Array,  [] ],
+      max_frames: [ p.Number, 16 ],
+      miss:       [ p.String, "" ],
+    })
+  }
+
+  initialize(): void {
+    super.initialize()
+    this._frames = new Map()
+
+    // Allow time controls to animate cached frames
+    const w = window as any
+    if (typeof w.forestFrameCaches === "undefined") {
+      w.forestFrameCaches = {}
+    }
+    w.forestFrameCaches[this.id] = this
+  }
+
+  // Layers removed from the document no longer take part in animation
+  detach_document(): void {
+    super.detach_document()
+    const caches = (window as any).forestFrameCaches
+    if (typeof caches !== "undefined") {
+      delete caches[this.id]
+    }
+  }
+
+  connect_signals(): void {
+    super.connect_signals()
+    this.connect(this.properties.data.change, () => this.store())
+    this.connect(this.properties.key.change, () => this.show(this.key, true))
+  }
+
+  // Remember frame sent by the server
+  store(): void {
+    const frame = (this.data as any).frame
+    if ((typeof frame === "undefined") || (frame.length === 0)) {
+      return
+    }
+    this.insert(frame[0], this.data)
+  }
+
+  // Least recently used insert, mirrored by the server
+  insert(key: string, data: any): void {
+    this._frames.delete(key)
+    this._frames.set(key, data)
+    while (this._frames.size > this.max_frames) {
+      const oldest = this._frames.keys().next().value
+      this._frames.delete(oldest)
+    }
+  }
+
+  // Swap cached frame into data without echoing it to the server
+  show(key: string, touch: boolean = true): void {
+    if (key === "") {
+      return
+    }
+    const data = this._frames.get(key)
+    if (typeof data === "undefined") {
+      if (touch) {
+        this.miss = key
+      }
+      return
+    }
+    if (touch) {
+      this.insert(key, data)
+    }
+    const frame = (this.data as any).frame
+    if ((typeof frame !== "undefined") && (frame[0] === key)) {
+      return
+    }
+    this.setv({data: data}, {silent: true})
+    this.change.emit()
+  }
+
+  show_index(i: number): void {
+    if (i < this.keys.length) {
+      this.show(this.keys[i], false)
+    }
+  }
+
+  // True if every frame in the animation is held in the browser
+  has_all(): boolean {
+    if (this.keys.length === 0) {
+      return false
+    }
+    return this.keys.every((key) => this._frames.has(key))
+  }
+}
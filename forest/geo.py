@@ -6,10 +6,46 @@ Module to handle projection and sampling iof points for imaging.
 
 .. autofunction:: stretch_image
 
+.. autofunction:: stretch_projected
+
 .. autofunction:: web_mercator
 
+.. autofunction:: web_mercator_grid
+
 .. autofunction:: plate_carree
 
+Nearest grid point
+~~~~~~~~~~~~~~~~~~
+
+Time series, profiles and other point lookups share a
+:class:`NearestIndex` per grid, built once by :func:`nearest_index`.
+
+.. autoclass:: NearestIndex
+    :members:
+
+.. autofunction:: nearest_index
+
+.. autofunction:: grid_signature
+
+Reprojection plan
+~~~~~~~~~~~~~~~~~
+
+Images on a 1D longitude/latitude grid are resampled to Web Mercator
+by a nearest neighbour gather. Indices are computed once per grid by
+:func:`reprojection_plan` and shared by :func:`shared_plan`.
+
+.. autoclass:: Plan
+
+.. autofunction:: reprojection_plan
+
+.. autofunction:: shared_plan
+
+Curvilinear grids, e.g. satellite swaths, are projected point by
+point instead, the Web Mercator coordinates of each grid are shared by
+:func:`shared_projection`.
+
+.. autofunction:: shared_projection
+
 """
 try:
     import cartopy
@@ -17,10 +53,14 @@ except ImportError:
     # ReadTheDocs unable to pip install cartopy
     pass
 
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
 import numpy as np
 
 import scipy.interpolate
 import scipy.ndimage
+import scipy.spatial
 
 try:
     import datashader
@@ -41,22 +81,22 @@ def stretch_image(lons, lats, values,
                    size of latitude and longitude arrays.
     :return: A dictionary that can be used with the bokeh image glyph.
     """
-    if (lons.ndim == 1):
-        gx, _ = web_mercator(
-            lons,
-            np.zeros(len(lons), dtype="d"))
-        _, gy = web_mercator(
-            np.zeros(len(lats), dtype="d"),
-            lats)
-    elif (lons.ndim == 2) and (lats.ndim == 2):
-        gx, gy = web_mercator(lons, lats)
-        gx = gx.reshape(lons.shape)
-        gx = np.ma.masked_invalid(gx)
-        gy = gy.reshape(lats.shape)
-        gy = np.ma.masked_invalid(gy)
-    else:
-        raise Exception("Either 1D or 2D lons/lats")
+    gx, gy = web_mercator_grid(lons, lats)
+    return stretch_projected(gx, gy, values,
+                             plot_height=plot_height,
+                             plot_width=plot_width)
 
+
+def stretch_projected(gx, gy, values,
+                      plot_height=None,
+                      plot_width=None):
+    """
+    Same as :func:`stretch_image` given coordinates already projected
+    by :func:`web_mercator_grid`, so that files sharing a grid can
+    share the projection.
+
+    :return: A dictionary that can be used with the bokeh image glyph.
+    """
     if datashader:
         x_range = (gx.min(), gx.max())
         y_range = (gy.min(), gy.max())
@@ -87,6 +127,31 @@ def stretch_image(lons, lats, values,
     }
 
 
+def web_mercator_grid(lons, lats):
+    """Project 1D axes or 2D coordinate arrays to Web Mercator
+
+    :param lons: 1D or 2D array of longitudes
+    :param lats: 1D or 2D array of latitudes
+    :returns: gx, gy arrays with the same dimensionality as the input
+    """
+    if (lons.ndim == 1):
+        gx, _ = web_mercator(
+            lons,
+            np.zeros(len(lons), dtype="d"))
+        _, gy = web_mercator(
+            np.zeros(len(lats), dtype="d"),
+            lats)
+    elif (lons.ndim == 2) and (lats.ndim == 2):
+        gx, gy = web_mercator(lons, lats)
+        gx = gx.reshape(lons.shape)
+        gx = np.ma.masked_invalid(gx)
+        gy = gy.reshape(lats.shape)
+        gy = np.ma.masked_invalid(gy)
+    else:
+        raise Exception("Either 1D or 2D lons/lats")
+    return gx, gy
+
+
 def datashader_stretch(values, gx, gy, x_range, y_range,
                        plot_height=None,
                        plot_width=None):
@@ -205,3 +270,257 @@ def transform(x, y, src_crs, dst_crs):
     x, y = np.asarray(x), np.asarray(y)
     xt, yt, _ = dst_crs.transform_points(src_crs, x.flatten(), y.flatten()).T
     return xt, yt
+
+
+class NearestIndex:
+    """Find nearest grid points to longitude/latitude pairs
+
+    Regular 1D axes are searched arithmetically, other monotonic
+    1D axes with :func:`numpy.searchsorted` and 2D curvilinear grids
+    with a KD-tree of points on the unit sphere. Longitudes in either
+    [-180, 180] or [0, 360] conventions are supported.
+
+    .. code-block:: python
+
+        index = nearest_index(lons, lats)
+        i, j = index(lon, lat)  # values[..., j, i]
+
+    :param lons: 1D or 2D longitudes
+    :param lats: 1D or 2D latitudes, same dimensionality as lons
+    """
+    def __init__(self, lons, lats):
+        lons = _as_float(lons)
+        lats = _as_float(lats)
+        self.ndim = lons.ndim
+        if self.ndim == 1:
+            self._x = _Axis(lons, period=360.)
+            self._y = _Axis(lats)
+        else:
+            self.shape = lons.shape
+            self._tree = scipy.spatial.cKDTree(_unit_sphere(lons.ravel(),
+                                                            lats.ravel()))
+
+    def __call__(self, lons, lats):
+        """Indices i, j of nearest points, vectorised over inputs"""
+        scalar = np.ndim(lons) == 0
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        if self.ndim == 1:
+            i, j = self._x(lons), self._y(lats)
+        else:
+            _, k = self._tree.query(_unit_sphere(lons.ravel(), lats.ravel()))
+            j, i = np.unravel_index(k, self.shape)
+            i, j = i.reshape(lons.shape), j.reshape(lats.shape)
+        if scalar:
+            return int(i), int(j)
+        return i, j
+
+
+class _Axis:
+    """Nearest index along a 1D axis"""
+    def __init__(self, values, period=None):
+        self.values = values
+        self.period = period
+        self.n = len(values)
+        steps = np.diff(values)
+        self.regular = (self.n > 1) and np.allclose(steps, steps[0])
+        if self.regular:
+            self.start, self.step = values[0], steps[0]
+            self.cyclic = ((period is not None) and
+                           np.isclose(abs(self.step) * self.n, period))
+        elif (self.n > 1) and (np.all(steps > 0) or np.all(steps < 0)):
+            self.order = np.argsort(values)
+            self.sorted = values[self.order]
+        else:
+            self.order = None
+
+    def __call__(self, points):
+        points = self._wrap(points)
+        if self.n == 1:
+            return np.zeros(np.shape(points), dtype=int)
+        if self.regular:
+            k = np.round((points - self.start) / self.step).astype(int)
+            if self.cyclic:
+                return k % self.n
+            return np.clip(k, 0, self.n - 1)
+        if self.order is not None:
+            k = np.clip(np.searchsorted(self.sorted, points), 1, self.n - 1)
+            left, right = self.sorted[k - 1], self.sorted[k]
+            k = k - ((points - left) < (right - points))
+            return self.order[k]
+        flat = np.ravel(points)
+        k = np.argmin(np.abs(self.values[None, :] - flat[:, None]), axis=1)
+        return k.reshape(np.shape(points))
+
+    def _wrap(self, points):
+        """Map points into the same longitude convention as the axis"""
+        if self.period is None:
+            return points
+        start = np.nanmean([self.values[0], self.values[-1]]) - self.period / 2
+        return (points - start) % self.period + start
+
+
+def _as_float(values):
+    return np.asarray(np.ma.filled(np.ma.asarray(values, dtype=float), np.nan))
+
+
+def _unit_sphere(lons, lats):
+    lons, lats = np.radians(lons), np.radians(lats)
+    return np.stack([np.cos(lats) * np.cos(lons),
+                     np.cos(lats) * np.sin(lons),
+                     np.sin(lats)], axis=-1)
+
+
+def grid_signature(lons, lats):
+    """Hashable summary of coordinates used to share grid-specific caches"""
+    lons, lats = _as_float(lons), _as_float(lats)
+    return (lons.shape, lats.shape,
+            hashlib.md5(lons.tobytes()).hexdigest(),
+            hashlib.md5(lats.tobytes()).hexdigest())
+
+
+_INDEXES = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def nearest_index(lons, lats, max_size=32):
+    """Shared :class:`NearestIndex` for a grid
+
+    Indexes are cached by grid signature so that files sharing a
+    grid share an index, the cache may be used from several threads
+    """
+    lons, lats = _as_float(lons), _as_float(lats)
+    signature = grid_signature(lons, lats)
+    with _INDEXES_LOCK:
+        if signature in _INDEXES:
+            _INDEXES.move_to_end(signature)
+            return _INDEXES[signature]
+    index = NearestIndex(lons, lats)
+    with _INDEXES_LOCK:
+        # Another thread may have built the same index meanwhile
+        index = _INDEXES.setdefault(signature, index)
+        _INDEXES.move_to_end(signature)
+        while len(_INDEXES) > max_size:
+            _INDEXES.popitem(last=False)
+    return index
+
+
+Plan = namedtuple("Plan", (
+    "window",
+    "rows",
+    "cols",
+    "x",
+    "y",
+    "dw",
+    "dh"))
+
+
+def reprojection_plan(lons, lats, scale=2, lon_range=None, lat_range=None):
+    """Nearest neighbour resampling of a 1D lon/lat grid to Web Mercator
+
+    Output pixels are equally spaced in Web Mercator and ``scale``
+    times coarser than the grid
+
+    :param lons: 1D longitudes
+    :param lats: 1D latitudes
+    :param scale: coarsening factor
+    :param lon_range: optional (start, end) longitudes to read
+    :param lat_range: optional (start, end) latitudes to read
+    :returns: :class:`Plan` or None if the ranges miss the grid,
+              rows and cols index the block read with ``window``
+    """
+    lons = _as_float(lons)
+    lats = _as_float(lats)
+    i = _within(lons, lon_range)
+    j = _within(lats, lat_range)
+    if (len(i) == 0) or (len(j) == 0):
+        return None
+    window = (slice(j[0], j[-1] + 1), slice(i[0], i[-1] + 1))
+    gx, gy = web_mercator_grid(lons[window[1]], lats[window[0]])
+    x, dw, cols = _resample(gx, max(int(len(gx) / scale), 1))
+    y, dh, rows = _resample(gy, max(int(len(gy) / scale), 1))
+    return Plan(window, rows, cols, x, y, dw, dh)
+
+
+def _within(axis, bounds):
+    """Indices of axis inside (start, end), all indices if None"""
+    if bounds is None:
+        return np.arange(len(axis))
+    start, end = sorted(bounds)
+    index, = np.nonzero((axis >= start) & (axis <= end))
+    return index
+
+
+def _resample(axis, n):
+    """Start, width and nearest indices of n equally spaced pixels"""
+    start, end = np.nanmin(axis), np.nanmax(axis)
+    width = end - start
+    centres = start + (np.arange(n) + 0.5) * width / n
+    return start, width, _nearest(axis, centres)
+
+
+def _nearest(axis, points):
+    """Index of nearest value along a monotonic axis"""
+    if len(axis) == 1:
+        return np.zeros(len(points), dtype=int)
+    order = np.argsort(axis)
+    values = axis[order]
+    k = np.clip(np.searchsorted(values, points), 1, len(values) - 1)
+    k -= (points - values[k - 1]) < (values[k] - points)
+    return order[k]
+
+
+_PLANS = OrderedDict()
+_PLANS_LOCK = threading.Lock()
+
+
+def shared_plan(lons, lats, scale=2, lon_range=None, lat_range=None,
+                signature=None, max_size=32):
+    """Shared :class:`Plan`, computed once per grid, scale and region
+
+    :param lon_range: optional hashable (start, end) longitudes
+    :param lat_range: optional hashable (start, end) latitudes
+    :param signature: :func:`grid_signature` if already known
+    """
+    if signature is None:
+        signature = grid_signature(lons, lats)
+    key = (signature, scale, lon_range, lat_range)
+    with _PLANS_LOCK:
+        if key in _PLANS:
+            _PLANS.move_to_end(key)
+            return _PLANS[key]
+    plan = reprojection_plan(lons, lats, scale=scale,
+                             lon_range=lon_range, lat_range=lat_range)
+    with _PLANS_LOCK:
+        _PLANS[key] = plan
+        while len(_PLANS) > max_size:
+            _PLANS.popitem(last=False)
+    return plan
+
+
+_PROJECTIONS = OrderedDict()
+_PROJECTIONS_LOCK = threading.Lock()
+
+
+def shared_projection(lons, lats, signature=None, max_size=8):
+    """Shared Web Mercator coordinates, computed once per grid
+
+    :param lons: 2D longitudes
+    :param lats: 2D latitudes
+    :param signature: :func:`grid_signature` if already known
+    :returns: x, y arrays, see :func:`web_mercator_grid`
+    """
+    if signature is None:
+        signature = grid_signature(lons, lats)
+    with _PROJECTIONS_LOCK:
+        if signature in _PROJECTIONS:
+            _PROJECTIONS.move_to_end(signature)
+            return _PROJECTIONS[signature]
+    projection = web_mercator_grid(lons, lats)
+    with _PROJECTIONS_LOCK:
+        # Another thread may have projected the same grid meanwhile
+        projection = _PROJECTIONS.setdefault(signature, projection)
+        _PROJECTIONS.move_to_end(signature)
+        while len(_PROJECTIONS) > max_size:
+            _PROJECTIONS.popitem(last=False)
+    return projection
@@ -0,0 +1,236 @@
+"""
+Image cache
+-----------
+
+Decoding and stretching a gridded field is the most expensive step
+in displaying a layer. :class:`ImageCache` stores the result of
+:meth:`forest.drivers.unified_model.Loader.load_image` on disk so that
+it can be shared between server restarts, between the processes
+started by ``bokeh serve --num-procs N`` and populated ahead of time
+by ``forest prerender``.
+
+Each entry is a directory containing the image array in ``.npy``
+format, which is memory-mapped when read, and the remaining bokeh
+image glyph columns as JSON. Entries remember the modification time
+of the file they were decoded from, an entry is ignored if its source
+file has since changed.
+
+.. note:: Writers hold an exclusive lock so that a frame requested
+          by several processes at once is decoded once. Keys share one
+          lock file per sub-directory, lock files are never removed so
+          that every process locks the same file
+
+.. autoclass:: ImageCache
+    :members:
+
+.. autofunction:: image_key
+
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import contextlib
+import numpy as np
+from forest.util import to_datetime as _to_datetime
+try:
+    import fcntl
+except ImportError:
+    # Windows does not support fcntl
+    fcntl = None
+
+
+def image_key(pattern, variable, initial_time, valid_time, pressure):
+    """Normalise search criteria into a cache key"""
+    return (
+        str(pattern),
+        str(variable),
+        _key_time(initial_time),
+        _key_time(valid_time),
+        str(pressure))
+
+
+def _key_time(time):
+    if time is None:
+        return str(time)
+    return str(_to_datetime(time))
+
+
+LOW_WATER = 0.8  # Fraction of max_bytes kept after eviction
+
+
+class ImageCache:
+    """Directory-based store of bokeh image glyph data
+
+    :param directory: location on disk to store images
+    :param max_bytes: approximate size limit, least recently used
+                      entries are removed first, None means unlimited
+    """
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes = None
+
+    def path(self, key):
+        """Directory related to key"""
+        name = hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def __contains__(self, key):
+        return self._read_meta(self.path(key)) is not None
+
+    def get(self, key):
+        """Image data or None if key not present or out of date"""
+        path = self.path(key)
+        meta = self._read_meta(path)
+        if meta is None:
+            return None
+        try:
+            image = np.load(os.path.join(path, "image.npy"), mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(path)  # Mark as recently used
+        data = meta["columns"]
+        data["image"] = [np.ma.masked_invalid(image, copy=False)]
+        return data
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Exclusive access to key across processes
+
+        .. code-block:: python
+
+            with cache.lock(key):
+                data = cache.get(key)
+                if data is None:
+                    data = load()
+                    cache.put(key, data, source=path)
+        """
+        path = os.path.join(os.path.dirname(self.path(key)), ".lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as stream:
+            if fcntl is not None:
+                fcntl.flock(stream, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(stream, fcntl.LOCK_UN)
+
+    def put(self, key, data, source=None):
+        """Store image data
+
+        :param source: file data was decoded from, used to detect stale data
+        """
+        path = self.path(key)
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        meta = {
+            "columns": {k: _jsonify(v) for k, v in data.items()
+                        if k != "image"},
+            "source": source,
+            "mtime": _mtime(source)
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as stream:
+            json.dump(meta, stream)
+        image = np.ma.filled(
+            np.ma.asarray(data["image"][0], dtype="f"), np.nan)
+        np.save(os.path.join(tmp, "image.npy"), image)
+        nbytes = _size(tmp)
+        if os.path.exists(path):
+            # Replace stale entry
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process finished first
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        if self.max_bytes is not None:
+            if self._bytes is None:
+                self._bytes = self.nbytes()
+            else:
+                self._bytes += nbytes
+            if self._bytes > self.max_bytes:
+                self.evict()
+
+    def nbytes(self):
+        """Total size of entries on disk"""
+        return sum(nbytes for _, _, nbytes in self._entries())
+
+    def evict(self):
+        """Remove least recently used entries until below max_bytes
+
+        Entries are removed down to a low-water mark so that the cache
+        is only scanned again once it has grown past max_bytes
+        """
+        entries = sorted(self._entries())
+        total = sum(nbytes for _, _, nbytes in entries)
+        if total <= self.max_bytes:
+            self._bytes = total
+            return
+        target = LOW_WATER * self.max_bytes
+        for _, path, nbytes in entries:
+            if total <= target:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= nbytes
+        self._bytes = total
+
+    def _entries(self):
+        """Last use, path and size of each entry"""
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if (not entry.is_dir()) or entry.name.startswith("tmp"):
+                    # Skip partially written entries
+                    continue
+                try:
+                    used = entry.stat().st_mtime
+                    yield used, entry.path, _size(entry.path)
+                except FileNotFoundError:
+                    # Removed by another process
+                    continue
+
+    @staticmethod
+    def _read_meta(path):
+        try:
+            with open(os.path.join(path, "meta.json")) as stream:
+                meta = json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (not isinstance(meta, dict)) or ("columns" not in meta):
+            # Written by an older version, replaced by next put
+            return None
+        if meta.get("source") is not None:
+            if _mtime(meta["source"]) != meta.get("mtime"):
+                return None
+        return meta
+
+
+def _mtime(path):
+    if path is None:
+        return None
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path))
+
+
+def _jsonify(values):
+    result = []
+    for value in values:
+        if isinstance(value, np.generic):
+            value = value.item()
+        result.append(value)
+    return result
@@ -35,6 +35,8 @@ from forest.components import tiles, html_ready
 import forest.config as cfg
 import forest.middlewares as mws
 import forest.gallery
+import forest.region
+import forest.cross_section
 from forest.db.util import autolabel
 
 
@@ -67,6 +69,8 @@ def configure(argv=None):
                 variables=cfg.combine_variables(
                     os.environ,
                     args.variables))
+    data.CACHE_DIRECTORY = config.cache_directory
+    data.CACHE_MAX_BYTES = config.cache_max_bytes
     return config
 
 
@@ -226,11 +230,15 @@ def main(argv=None):
     display_names = {
             "time_series": "Display Time Series",
             "profile": "Display Profile",
+            "cross_section": "Display Cross Section",
             }
 
     display_names2 = {"barc": "BARC Toolkit"}
     available_features = {k: display_names[k]
                           for k in display_names.keys() if data.FEATURE_FLAGS[k]}
+    if not data.FEATURE_FLAGS["BARC"]:
+        # Cross sections are drawn along BARC freehand lines
+        available_features.pop("cross_section", None)
     available_features2 = {k: display_names2[k]
                           for k in display_names2.keys() if data.FEATURE_FLAGS[k]}
     tools_panel = tools.ToolsPanel(available_features)
@@ -315,6 +323,9 @@ def main(argv=None):
     # Set default profile visibility
     store.dispatch(tools.on_toggle_tool("profile", False))
 
+    # Set default cross section visibility
+    store.dispatch(tools.on_toggle_tool("cross_section", False))
+
     # Set top-level navigation
     store.dispatch(db.set_value("patterns", config.patterns))
 
@@ -390,6 +401,14 @@ def main(argv=None):
                                                      series_figure)
         gallery.connect(store)
 
+        if data.FEATURE_FLAGS["BARC"]:
+            # Area statistics of drawn boxes and polygons
+            region_view = forest.region.RegionView.from_datasets(
+                series_figure, datasets)
+            region_view.add_source(barc.source["box_edit"])
+            region_view.add_source(barc.source["poly_draw"])
+            region_view.connect(store)
+
         tool_figures["series_figure"] = series_figure
 
     if data.FEATURE_FLAGS["profile"]:
@@ -408,6 +427,24 @@ def main(argv=None):
 
         tool_figures["profile_figure"] = profile_figure
 
+    if "cross_section" in available_features:
+        # Cross section along BARC freehand line
+        cross_section_figure = bokeh.plotting.figure(
+                    plot_width=400,
+                    plot_height=300,
+                    x_axis_label="Distance (km)",
+                    toolbar_location=None,
+                    border_fill_alpha=0)
+        cross_section_figure.toolbar.logo = None
+        cross_section_figure.y_range.flipped = True
+
+        cross_section_view = forest.cross_section.CrossSectionView.from_datasets(
+            cross_section_figure, datasets)
+        cross_section_view.add_source(barc.source["polyline"])
+        cross_section_view.connect(store)
+
+        tool_figures["cross_section_figure"] = cross_section_figure
+
     tool_layout = tools.ToolLayout(**tool_figures)
     tool_layout.connect(store)
     # Set up barc tabs
@@ -5,6 +5,7 @@ import bokeh.models
 import forest.data
 from forest import geo, colors
 from forest.old_state import old_state, unique
+from forest.frame_cache import FrameCacheSource, frame_key, frame_keys
 from forest.exceptions import FileNotFound, IndexNotFound
 
 
@@ -74,7 +75,7 @@ class ImageView(AbstractMapView):
         self.color_mapper = color_mapper
         self.color_mapper.nan_color = bokeh.colors.RGB(0, 0, 0, a=0)
         self.use_hover_tool = use_hover_tool
-        self.source = bokeh.models.ColumnDataSource({
+        self.source = FrameCacheSource({
                 "x": [],
                 "y": [],
                 "dw": [],
@@ -98,7 +99,9 @@ class ImageView(AbstractMapView):
     @old_state
     @unique
     def render(self, state):
-        self.source.data = self.loader.image(state)
+        self.source.keys = frame_keys(state)
+        self.source.show(frame_key(state),
+                         lambda: self.loader.image(state))
 
     def set_hover_properties(self, tooltips, formatters):
         self.tooltips = tooltips
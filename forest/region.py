@@ -0,0 +1,397 @@
+"""
+Region statistics
+-----------------
+
+Time series of area statistics inside shapes drawn with the BARC box
+and polygon tools, see :class:`forest.barc.toolbar.BARC`.
+
+The grid cells inside a shape are found once per grid and shape by
+:func:`polygon_mask`. Each file only reads the hyperslab bounding the
+shape, a limited number of time steps at a time, so that memory use
+does not grow with the number of files or the size of the model
+domain. Reductions over the selected cells are vectorised, the mean
+weights each cell by the cosine of its latitude so that it is an area
+mean rather than a mean over grid points.
+
+Statistics are cached per file, variable, pressure level and shape so
+that redrawing or switching back to a previous shape is instant.
+
+.. autoclass:: RegionView
+    :members:
+
+.. autoclass:: RegionLoader
+    :members:
+
+.. autofunction:: polygon_mask
+
+.. autofunction:: region
+
+"""
+import os
+import glob
+import warnings
+from functools import lru_cache
+from collections import OrderedDict, namedtuple
+import numpy as np
+import netCDF4
+import bokeh.models
+import forest.catalogue
+import forest.state
+from forest import geo, rx
+from forest.series import SeriesLoader, SeriesLocator
+from forest.util import to_datetime as _to_datetime
+
+
+STATISTICS = ("mean", "max", "p10", "p50", "p90")
+PERCENTILES = (10, 50, 90)
+
+
+Grid = namedtuple("Grid", (
+    "lons",
+    "lats",
+    "signature",
+    "dimensions",
+    "times",
+    "pressures"))
+
+
+def region(xs, ys):
+    """Hashable longitude/latitude vertices of a shape drawn in Web Mercator
+
+    :returns: tuple of (lon, lat) pairs
+    """
+    lons, lats = geo.plate_carree(np.asarray(xs, dtype=float),
+                                  np.asarray(ys, dtype=float))
+    return tuple((round(float(lon), 6), round(float(lat), 6))
+                 for lon, lat in zip(lons, lats))
+
+
+def polygon_mask(lons, lats, vertices):
+    """Grid cells with centres inside a polygon
+
+    :param lons: 1D or 2D longitudes
+    :param lats: 1D or 2D latitudes
+    :param vertices: sequence of (lon, lat) pairs
+    :returns: boolean array shaped (len(lats), len(lons)) for 1D axes
+              or the shape of the 2D coordinates
+    """
+    lons = geo._as_float(lons)
+    lats = geo._as_float(lats)
+    if lons.ndim == 1:
+        lons, lats = np.meshgrid(lons, lats)
+    px, py = np.asarray(vertices, dtype=float).T
+    # Grid longitudes in the same convention as the polygon
+    centre = 0.5 * (px.min() + px.max())
+    lons = (lons - centre + 180.) % 360. - 180. + centre
+
+    mask = np.zeros(lons.shape, dtype=bool)
+    candidates = ((lons >= px.min()) & (lons <= px.max()) &
+                  (lats >= py.min()) & (lats <= py.max()))
+    x, y = lons[candidates], lats[candidates]
+
+    # Even-odd rule, vectorised over candidate cells
+    inside = np.zeros(x.shape, dtype=bool)
+    for x0, y0, x1, y1 in zip(px, py, np.roll(px, -1), np.roll(py, -1)):
+        if y0 == y1:
+            continue
+        crosses = (y0 > y) != (y1 > y)
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (x < x_cross)
+    mask[candidates] = inside
+    return mask
+
+
+_MASKS = OrderedDict()
+
+
+def _mask(grid, vertices, max_size=64):
+    """Shared mask, area weights and bounding slices
+
+    Computed once per grid and shape. Cell areas are proportional to
+    the cosine of latitude on regular longitude/latitude grids, the
+    same approximation is used for 2D coordinates
+    """
+    key = (grid.signature, vertices)
+    if key in _MASKS:
+        _MASKS.move_to_end(key)
+        return _MASKS[key]
+    mask = polygon_mask(grid.lons, grid.lats, vertices)
+    rows, = np.nonzero(mask.any(axis=1))
+    cols, = np.nonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        value = None
+    else:
+        j = slice(rows[0], rows[-1] + 1)
+        i = slice(cols[0], cols[-1] + 1)
+        lats = grid.lats
+        if lats.ndim == 1:
+            lats = lats[:, np.newaxis]
+        weights = np.broadcast_to(np.cos(np.radians(lats)), mask.shape)
+        value = (j, i, mask[j, i], weights[j, i])
+    _MASKS[key] = value
+    while len(_MASKS) > max_size:
+        _MASKS.popitem(last=False)
+    return value
+
+
+class RegionLoader:
+    """Area statistics of a variable inside a polygon
+
+    :param paths: files to search
+    :param max_cells: number of values read from disk at once
+    """
+    def __init__(self, paths, max_cells=2**24):
+        self.locator = SeriesLocator(paths)
+        self.max_cells = max_cells
+
+    @classmethod
+    def from_pattern(cls, pattern):
+        loader = cls(sorted(glob.glob(os.path.expanduser(pattern))))
+        loader.locator.pattern = os.path.expanduser(pattern)
+        return loader
+
+    def statistics(self, initial_time, variable, vertices, pressure=None):
+        """Statistics of each valid time related to an initial time
+
+        :param vertices: (lon, lat) pairs, see :func:`region`
+        :returns: dict with "x" and one key per statistic
+        """
+        data = {key: [] for key in ("x",) + STATISTICS}
+        for path in self.locator.locate(initial_time):
+            segment = self.statistics_file(path, variable, vertices,
+                                           pressure=pressure)
+            for key, values in segment.items():
+                data[key] += list(values)
+        return data
+
+    def statistics_file(self, path, variable, vertices, pressure=None):
+        """Statistics of a single file"""
+        return self._statistics(path, os.path.getmtime(path), variable,
+                                tuple(vertices), pressure)
+
+    @lru_cache(maxsize=1024)
+    def _statistics(self, path, mtime, variable, vertices, pressure):
+        empty = {key: [] for key in ("x",) + STATISTICS}
+        grid = self._grid(path, mtime, variable)
+        if grid is None:
+            return empty
+        selected = _mask(grid, vertices)
+        if selected is None:
+            return empty
+        j, i, mask, weights = selected
+
+        if (grid.times is None) or (len(grid.dimensions) < 3):
+            return empty
+
+        # Indices along leading dimension, only one level is read
+        times = np.asarray(grid.times).reshape(-1)
+        if grid.pressures is None:
+            steps, level = np.arange(len(times)), ()
+        else:
+            pts, = np.nonzero(SeriesLoader.search(grid.pressures, pressure))
+            if len(pts) == 0:
+                return empty
+            if len(grid.dimensions) == 3:
+                # Time and pressure share leading dimension
+                if len(times) == len(grid.pressures):
+                    times = times[pts]
+                else:
+                    times = np.repeat(times, len(pts))
+                steps, level = pts, ()
+            else:
+                steps, level = np.arange(len(times)), (pts[0],)
+
+        size = max(1, self.max_cells // mask.size)
+        result = {key: [] for key in STATISTICS}
+        with netCDF4.Dataset(path) as dataset:
+            var = dataset.variables[variable]
+            for start in range(0, len(steps), size):
+                chunk = steps[start:start + size]
+                first = slice(chunk[0], chunk[-1] + 1)
+                block = var[(first,) + level + (j, i)]
+                block = block[chunk - chunk[0]]
+                for key, values in self.reduce(block, mask,
+                                                   weights).items():
+                    result[key].append(values)
+        result = {key: np.concatenate(values)
+                  for key, values in result.items()}
+        result["x"] = times
+        return result
+
+    @staticmethod
+    def reduce(block, mask, weights=None):
+        """Vectorised statistics over masked cells of (time, y, x) block
+
+        :param weights: optional (y, x) cell areas used by the mean
+        """
+        values = np.ma.filled(np.ma.asarray(block, dtype="f8"), np.nan)
+        cells = values[:, mask]
+        if weights is None:
+            weights = np.ones(cells.shape[1])
+        else:
+            weights = np.asarray(weights, dtype="f8")[mask]
+        valid = ~np.isnan(cells)
+        with warnings.catch_warnings():
+            # All-NaN time steps give NaN statistics
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            percentiles = np.nanpercentile(cells, PERCENTILES, axis=1)
+            total = np.where(valid, cells, 0.) @ weights
+            area = valid @ weights
+            return {
+                "mean": total / area,
+                "max": np.nanmax(cells, axis=1),
+                "p10": percentiles[0],
+                "p50": percentiles[1],
+                "p90": percentiles[2]}
+
+    @lru_cache(maxsize=1024)
+    def _grid(self, path, mtime, variable):
+        """Coordinates related to variable, None if variable not in file"""
+        with netCDF4.Dataset(path) as dataset:
+            try:
+                var = dataset.variables[variable]
+            except KeyError:
+                return None
+            lons = geo._as_float(SeriesLoader._dimension(
+                "longitude", dataset, var))
+            lats = geo._as_float(SeriesLoader._dimension(
+                "latitude", dataset, var))
+            times = SeriesLoader._times(dataset, var)
+            coordinates = getattr(var, "coordinates", "")
+            if ("pressure" in coordinates) or ("pressure" in var.dimensions):
+                pressures = SeriesLoader._dimension("pressure", dataset, var)
+            else:
+                pressures = None
+            dimensions = var.dimensions
+        return Grid(lons, lats, geo.grid_signature(lons, lats), dimensions,
+                    times, pressures)
+
+
+class RegionView:
+    """Area statistics of drawn shapes in the time series figure
+
+    Each shape is drawn in the colour used on the map, a solid line
+    shows the mean, a dashed line the maximum and a shaded band the
+    10th to 90th percentiles
+
+    :param figure: time series figure
+    :param loaders: dict of dataset label to :class:`RegionLoader`
+    """
+    def __init__(self, figure, loaders):
+        self.figure = figure
+        self.loaders = loaders
+        self.shapes = []
+        self.props = None
+        self.empty = {
+            "xs": [],
+            "mean": [],
+            "max": [],
+            "band_xs": [],
+            "band_ys": [],
+            "colour": [],
+            "label": []}
+        self.source = bokeh.models.ColumnDataSource(self.empty)
+        self.renderers = [
+            self.figure.patches(xs="band_xs", ys="band_ys",
+                                color="colour", alpha=0.2,
+                                source=self.source),
+            self.figure.multi_line(xs="xs", ys="mean", color="colour",
+                                   line_width=1.5, source=self.source),
+            self.figure.multi_line(xs="xs", ys="max", color="colour",
+                                   line_dash="dashed", source=self.source)]
+
+    @classmethod
+    def from_datasets(cls, figure, datasets):
+        """Use datasets that provide ``region_loader()``"""
+        loaders = {}
+        for label, dataset in datasets.items():
+            if hasattr(dataset, "region_loader"):
+                loaders[label] = dataset.region_loader()
+        return cls(figure, loaders)
+
+    def add_source(self, source):
+        """Follow shapes drawn into a BARC ColumnDataSource"""
+        self.shapes.append(source)
+        source.on_change("data", self.on_shapes)
+
+    def connect(self, store):
+        """Render only when the properties used by the view change"""
+        stream = (rx.Stream()
+                    .listen_to(store)
+                    .map(self.to_props)
+                    .filter(lambda x: x is not None)
+                    .distinct())
+        stream.map(lambda props: self.render(*props))
+        forest.catalogue.get_catalogue().subscribe(self)
+        return self
+
+    def to_props(self, state):
+        """Visibility, initial time, pressure and dataset variables"""
+        if isinstance(state, dict):
+            state = forest.state.State.from_dict(state)
+        if not state.tools.time_series:
+            return (False, None, None, ())
+        return (True, state.initial_time, state.pressure,
+                tuple(self.variables(state)))
+
+    def on_catalogue(self):
+        """Redraw once files found during the session have been read"""
+        document = self.figure.document
+        if (document is None) or (not self.visible):
+            return
+        document.add_next_tick_callback(lambda: self.render(*self.props))
+
+    def on_shapes(self, attr, old, new):
+        """Shapes edited while hidden are drawn once the tool is shown"""
+        if self.visible:
+            self.render(*self.props)
+
+    @property
+    def visible(self):
+        return (self.props is not None) and self.props[0]
+
+    def render(self, visible, initial_time, pressure, variables):
+        """Draw statistics of each shape and (label, variable) pair"""
+        self.props = (visible, initial_time, pressure, variables)
+        if not visible:
+            return
+        data = {key: [] for key in self.empty}
+        for label, variable in variables:
+            loader = self.loaders[label]
+            for vertices, colour in self.regions():
+                stats = loader.statistics(initial_time, variable,
+                                          vertices, pressure=pressure)
+                if len(stats["x"]) == 0:
+                    continue
+                x = np.array([_to_datetime(t) for t in stats["x"]],
+                             dtype="datetime64[ms]")
+                order = np.argsort(x)
+                x = x[order]
+                lower = np.asarray(stats["p10"])[order]
+                upper = np.asarray(stats["p90"])[order]
+                data["xs"].append(x)
+                data["mean"].append(np.asarray(stats["mean"])[order])
+                data["max"].append(np.asarray(stats["max"])[order])
+                data["band_xs"].append(np.concatenate([x, x[::-1]]))
+                data["band_ys"].append(np.concatenate([upper, lower[::-1]]))
+                data["colour"].append(colour)
+                data["label"].append(label)
+        self.source.data = data
+
+    def variables(self, state):
+        """Dataset label and variable of each layer with a loader"""
+        for _, settings in sorted(state.layers.index.items()):
+            label = settings.get("dataset")
+            if (label in self.loaders) and settings.get("variable"):
+                yield label, settings["variable"]
+
+    def regions(self):
+        """Vertices and colour of every drawn shape"""
+        for source in self.shapes:
+            colours = source.data.get("colour", [])
+            for k, (xs, ys) in enumerate(zip(source.data["xs"],
+                                             source.data["ys"])):
+                if len(xs) < 3:
+                    continue
+                colour = colours[k] if k < len(colours) else None
+                yield region(xs, ys), colour or "black"
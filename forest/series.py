@@ -29,16 +29,17 @@ into values, selectors can do that job on behalf of the view.
 import datetime as dt
 import glob
 import os
+from functools import lru_cache
 from itertools import cycle
-from collections import defaultdict
+from collections import namedtuple
 import bokeh.palettes
 import bokeh.models
 import numpy as np
 import netCDF4
+import forest.catalogue
 from forest import geo
 from forest.observe import Observable
 from forest.redux import Action
-from forest.util import initial_time as _initial_time
 from forest.util import to_datetime as _to_datetime
 from forest.screen import SET_POSITION
 
@@ -49,6 +50,9 @@ except ModuleNotFoundError:
     # ReadTheDocs can't import iris
 
 
+Metadata = namedtuple("Metadata", ("index", "dimensions", "times", "pressures"))
+
+
 def select_args(state):
     """Select args needed by :func:`SeriesView.render`
 
@@ -136,6 +140,9 @@ class SeriesView(Observable):
                 renderers=circles)
         self.figure.add_tools(tool)
 
+        self.args = None
+        forest.catalogue.get_catalogue().subscribe(self)
+
         super().__init__()
 
     @classmethod
@@ -148,8 +155,16 @@ class SeriesView(Observable):
                 loaders[group.label] = SeriesLoader.from_pattern(pattern)
         return cls(figure, loaders)
 
+    def on_catalogue(self):
+        """Redraw once files found during the session have been read"""
+        document = self.figure.document
+        if (document is None) or (self.args is None):
+            return
+        document.add_next_tick_callback(lambda: self.render(*self.args))
+
     def render(self, initial_time, variable, x, y, visible, pressure=None):
         """Update data for a particular application setting"""
+        self.args = (initial_time, variable, x, y, visible, pressure)
         if visible:
             assert isinstance(initial_time, dt.datetime), "only support datetime"
             self.figure.title.text = variable
@@ -166,13 +181,24 @@ class SeriesView(Observable):
 
 
 class SeriesLoader(object):
-    """Time series loader"""
+    """Time series loader
+
+    Grid geometry, nearest grid point searches and point values are
+    cached so that repeated taps only read the ``[..., j, i]``
+    hyperslab of files not visited before.
+
+    .. note:: Files are read serially, netCDF4/HDF5 is not thread-safe
+
+    :param paths: files to search
+    """
     def __init__(self, paths):
         self.locator = SeriesLocator(paths)
 
     @classmethod
     def from_pattern(cls, pattern):
-        return cls(sorted(glob.glob(os.path.expanduser(pattern))))
+        loader = cls(sorted(glob.glob(os.path.expanduser(pattern))))
+        loader.locator.pattern = os.path.expanduser(pattern)
+        return loader
 
     def series(self,
             initial_time,
@@ -230,34 +256,53 @@ class SeriesLoader(object):
             "y": values}
 
     def _load_netcdf4(self, path, variable, lon0, lat0, pressure=None):
+        mtime = os.path.getmtime(path)
+        meta = self._metadata(path, mtime, variable)
+        if meta is None:
+            return {"x": [], "y": []}
+        i, j = meta.index(lon0, lat0)
+        values = self._column(path, mtime, variable, i, j)
+        times = meta.times
+        if meta.pressures is not None:
+            if len(meta.dimensions) == 3:
+                pts = self.search(meta.pressures, pressure)
+                values = values[pts]
+                try:
+                    times = times[pts]
+                except TypeError:
+                    times = [times]
+            else:
+                mask = self.search(meta.pressures, pressure)
+                values = values[:, mask][:, 0]
+        return {
+            "x": times,
+            "y": values}
+
+    @lru_cache(maxsize=1024)
+    def _metadata(self, path, mtime, variable):
+        """Axes related to variable, grid indexes are shared between files"""
         with netCDF4.Dataset(path) as dataset:
             try:
                 var = dataset.variables[variable]
             except KeyError:
-                return {"x": [], "y": []}
-            lons = geo.to_180(self._longitudes(dataset, var))
-            lats = self._latitudes(dataset, var)
-            i = np.argmin(np.abs(lons - lon0))
-            j = np.argmin(np.abs(lats - lat0))
+                return None
+            index = geo.nearest_index(self._longitudes(dataset, var),
+                                      self._latitudes(dataset, var))
             times = self._times(dataset, var)
-            values = var[..., j, i]
             if (
                     ("pressure" in var.coordinates) or
                     ("pressure" in var.dimensions)):
                 pressures = self._pressures(dataset, var)
-                if len(var.dimensions) == 3:
-                    pts = self.search(pressures, pressure)
-                    values = values[pts]
-                    try:
-                        times = times[pts]
-                    except TypeError:
-                        times = [times]
-                else:
-                    mask = self.search(pressures, pressure)
-                    values = values[:, mask][:, 0]
-        return {
-            "x": times,
-            "y": values}
+            else:
+                pressures = None
+            dimensions = var.dimensions
+        return Metadata(index, dimensions, times, pressures)
+
+    @lru_cache(maxsize=4096)
+    def _column(self, path, mtime, variable, i, j):
+        """Read values at a single grid point, all times and levels"""
+        with netCDF4.Dataset(path) as dataset:
+            return dataset.variables[variable][..., j, i]
 
     @staticmethod
     def _times(dataset, variable):
@@ -307,20 +352,35 @@ class SeriesLoader(object):
 
 
 class SeriesLocator(object):
-    """Helper to find files related to Series"""
-    def __init__(self, paths):
-        self.paths = paths
-        self.table = defaultdict(list)
-        for path in paths:
-            time = _initial_time(path)
-            if time is None:
-                try:
-                    with netCDF4.Dataset(path) as dataset:
-                        var = dataset.variables["forecast_reference_time"]
-                        time = netCDF4.num2date(var[:], units=var.units)
-                except KeyError:
-                    continue
-            self.table[self.key(time)].append(path)
+    """Helper to find files related to Series
+
+    Initial times are provided by :func:`forest.catalogue.get_catalogue`,
+    files without a time stamp in their name become available once
+    they have been read in the background
+
+    :param paths: files to search
+    :param catalogue: optional :class:`forest.catalogue.InitialTimeCatalogue`
+    :param pattern: optional glob pattern to find files added later
+    """
+    def __init__(self, paths, catalogue=None, pattern=None):
+        self._paths = paths
+        self.pattern = pattern
+        if catalogue is None:
+            catalogue = forest.catalogue.get_catalogue()
+        self.catalogue = catalogue
+        self.catalogue.update(paths)
+
+    @property
+    def paths(self):
+        """Files to search, pattern is re-globbed if one is set"""
+        if self.pattern is None:
+            return self._paths
+        return self.catalogue.glob(self.pattern)
+
+    @property
+    def table(self):
+        """Map initial time keys to paths"""
+        return self.catalogue.table(self.paths)
 
     def initial_times(self):
         return np.array(list(self.table.keys()),
@@ -337,7 +397,4 @@ class SeriesLocator(object):
 
     @staticmethod
     def key(time):
-        try:
-            return "{:%Y-%m-%d %H:%M:%S}".format(time)
-        except TypeError:
-            return time.strftime("%Y-%m-%d %H:%M:%S")
+        return forest.catalogue.key(time)
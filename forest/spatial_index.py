@@ -0,0 +1,289 @@
+"""
+Spatial index
+-------------
+
+Vector overlays, e.g. Natural Earth borders, RDT polygons and
+lightning flashes, are usually far larger than the part of the map a
+user is looking at. A :class:`SpatialIndex` buckets feature bounding
+boxes into a regular grid so that the features intersecting the
+viewport can be found without testing every feature.
+
+A :class:`CulledSource` wraps a ``ColumnDataSource`` so that only
+visible features are sent to the browser. Features already in the
+browser are kept while panning, newly visible features are appended
+with ``ColumnDataSource.stream`` and the data is only replaced once
+most of it has left the viewport.
+
+.. code-block:: python
+
+    culled = CulledSource(data)
+    figure.multi_line(xs="xs", ys="ys", source=culled.source)
+    on_viewport(figure, [culled])
+
+.. autoclass:: SpatialIndex
+    :members:
+
+.. autoclass:: CulledSource
+    :members:
+
+.. autofunction:: on_viewport
+
+.. autofunction:: line_boxes
+
+.. autofunction:: point_boxes
+
+.. autofunction:: select
+
+.. autofunction:: viewport
+
+.. autofunction:: screen_size
+
+"""
+import numpy as np
+import bokeh.events
+import bokeh.models
+
+
+def line_boxes(xs, ys):
+    """Bounding boxes of multi_line or patches features
+
+    :param xs: sequence of x coordinate arrays
+    :param ys: sequence of y coordinate arrays
+    :returns: array shaped (N, 4) of x_start, y_start, x_end, y_end,
+              features without finite coordinates are NaN
+    """
+    boxes = np.full((len(xs), 4), np.nan)
+    for k, (x, y) in enumerate(zip(xs, ys)):
+        x = _finite(x)
+        y = _finite(y)
+        if (x.size == 0) or (y.size == 0):
+            continue
+        boxes[k] = (x.min(), y.min(), x.max(), y.max())
+    return boxes
+
+
+def point_boxes(x, y):
+    """Degenerate bounding boxes of scatter features
+
+    :returns: array shaped (N, 4) of x_start, y_start, x_end, y_end
+    """
+    x = np.ma.filled(np.ma.asarray(x, dtype=float), np.nan).reshape(-1)
+    y = np.ma.filled(np.ma.asarray(y, dtype=float), np.nan).reshape(-1)
+    return np.stack([x, y, x, y], axis=-1)
+
+
+def _finite(values):
+    values = np.ma.filled(np.ma.asarray(values, dtype=float), np.nan)
+    values = values.reshape(-1)
+    return values[np.isfinite(values)]
+
+
+class SpatialIndex:
+    """Grid bucket index of bounding boxes
+
+    Each box is stored in every grid cell it overlaps, boxes that span
+    more than ``max_span`` cells, e.g. long coastlines, are kept in a
+    separate list that is tested on every query
+
+    :param boxes: array shaped (N, 4) of x_start, y_start, x_end, y_end
+    :param cells: number of grid cells along each axis
+    :param max_span: largest number of cells a bucketed box may span
+    """
+    def __init__(self, boxes, cells=64, max_span=64):
+        self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.cells = cells
+        valid = np.isfinite(self.boxes).all(axis=1)
+        if valid.any():
+            self.extent = (self.boxes[valid, 0].min(),
+                           self.boxes[valid, 1].min(),
+                           self.boxes[valid, 2].max(),
+                           self.boxes[valid, 3].max())
+        else:
+            self.extent = (0., 0., 1., 1.)
+        x_start, y_start, x_end, y_end = self.extent
+        self.dx = max(x_end - x_start, 1e-9) / cells
+        self.dy = max(y_end - y_start, 1e-9) / cells
+
+        ids, = np.nonzero(valid)
+        i0, j0 = self._cell(self.boxes[ids, 0], self.boxes[ids, 1])
+        i1, j1 = self._cell(self.boxes[ids, 2], self.boxes[ids, 3])
+        width = i1 - i0 + 1
+        span = width * (j1 - j0 + 1)
+        large = span > max_span
+        self.large = ids[large]
+
+        # Enumerate (feature, cell) pairs in bulk
+        ids, i0, j0, width, span = (
+            a[~large] for a in (ids, i0, j0, width, span))
+        repeated = np.repeat(np.arange(len(ids)), span)
+        offset = np.arange(len(repeated)) - np.repeat(
+            np.cumsum(span) - span, span)
+        i = i0[repeated] + offset % width[repeated]
+        j = j0[repeated] + offset // width[repeated]
+        keys = j * cells + i
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.ids = ids[repeated][order]
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cell(self, x, y):
+        i = np.floor((x - self.extent[0]) / self.dx).astype(int)
+        j = np.floor((y - self.extent[1]) / self.dy).astype(int)
+        return (np.clip(i, 0, self.cells - 1),
+                np.clip(j, 0, self.cells - 1))
+
+    def query(self, x_range, y_range):
+        """Indices of boxes that intersect a rectangle
+
+        :param x_range: tuple of x start and end
+        :param y_range: tuple of y start and end
+        :returns: sorted integer array
+        """
+        x_start, x_end = sorted(x_range)
+        y_start, y_end = sorted(y_range)
+        e_x_start, e_y_start, e_x_end, e_y_end = self.extent
+        if ((x_end < e_x_start) or (x_start > e_x_end) or
+                (y_end < e_y_start) or (y_start > e_y_end)):
+            return np.array([], dtype=int)
+        (i0, i1), (j0, j1) = self._cell(np.array([x_start, x_end]),
+                                        np.array([y_start, y_end]))
+        rows = np.arange(j0, j1 + 1) * self.cells
+        lower = np.searchsorted(self.keys, rows + i0, side="left")
+        upper = np.searchsorted(self.keys, rows + i1, side="right")
+        candidates = [self.ids[a:b] for a, b in zip(lower, upper)]
+        candidates = np.unique(np.concatenate(candidates + [self.large]))
+        boxes = self.boxes[candidates]
+        hit = ((boxes[:, 0] <= x_end) & (boxes[:, 2] >= x_start) &
+               (boxes[:, 1] <= y_end) & (boxes[:, 3] >= y_start))
+        return candidates[hit].astype(int)
+
+
+def select(data, indices):
+    """Subset of each column of a ColumnDataSource dict"""
+    result = {}
+    for key, column in data.items():
+        if isinstance(column, np.ndarray):
+            result[key] = column[indices]
+        else:
+            result[key] = [column[i] for i in indices]
+    return result
+
+
+def viewport(figure, margin=0.):
+    """Figure x and y ranges, widened by a fraction of their size
+
+    :returns: x_range, y_range or None if ranges are not known yet
+    """
+    values = (figure.x_range.start, figure.x_range.end,
+              figure.y_range.start, figure.y_range.end)
+    if any(value is None for value in values):
+        return None
+    x_start, x_end, y_start, y_end = values
+    dx = margin * abs(x_end - x_start)
+    dy = margin * abs(y_end - y_start)
+    return ((min(x_start, x_end) - dx, max(x_start, x_end) + dx),
+            (min(y_start, y_end) - dy, max(y_start, y_end) + dy))
+
+
+def screen_size(figure, default=600):
+    """Width and height of a figure's canvas in screen pixels
+
+    Map figures stretch to fill the page, so the size measured by the
+    browser is preferred to the nominal plot_width and plot_height
+    """
+    width = (getattr(figure, "inner_width", None) or
+             getattr(figure, "plot_width", None) or default)
+    height = (getattr(figure, "inner_height", None) or
+              getattr(figure, "plot_height", None) or default)
+    return width, height
+
+
+class CulledSource:
+    """ColumnDataSource holding features inside the viewport
+
+    :param data: dict of columns
+    :param boxes: bounding boxes, by default taken from ``xs``/``ys``
+                  or ``x``/``y`` columns, see :func:`line_boxes`
+                  and :func:`point_boxes`
+    :param slack: replace data once more than ``slack`` times the
+                  number of visible features are held in the browser
+    :param max_features: limit number of features sent to the browser
+    """
+    def __init__(self, data=None, boxes=None, slack=2, max_features=None):
+        self.slack = slack
+        self.max_features = max_features
+        self.source = bokeh.models.ColumnDataSource({})
+        self.data = {}
+        self.index = SpatialIndex(np.empty((0, 4)))
+        self.shown = np.array([], dtype=int)
+        self.ranges = None
+        self.update(data or {"xs": [], "ys": []}, boxes=boxes)
+
+    def update(self, data, boxes=None):
+        """Replace features, keeping the current viewport"""
+        self.data = {key: self._column(column)
+                     for key, column in data.items()}
+        if boxes is None:
+            boxes = self.boxes(self.data)
+        self.index = SpatialIndex(boxes)
+        self.shown = np.array([], dtype=int)
+        if self.ranges is None:
+            self.show(np.arange(len(self.index)))
+        else:
+            self.show(self.index.query(*self.ranges))
+
+    @staticmethod
+    def _column(column):
+        if isinstance(column, (list, np.ndarray)):
+            return column
+        return np.asarray(column)
+
+    @staticmethod
+    def boxes(data):
+        if "xs" in data:
+            return line_boxes(data["xs"], data["ys"])
+        elif "x" in data:
+            return point_boxes(data["x"], data["y"])
+        raise KeyError("expected xs/ys or x/y columns")
+
+    def cull(self, x_range, y_range):
+        """Send features intersecting x_range and y_range"""
+        self.ranges = (x_range, y_range)
+        visible = self.index.query(x_range, y_range)
+        if self.max_features is not None:
+            visible = visible[:self.max_features]
+        extra = np.setdiff1d(visible, self.shown, assume_unique=True)
+        limit = self.slack * max(len(visible), 1)
+        if len(self.shown) + len(extra) > limit:
+            self.show(visible)
+        elif len(extra) > 0:
+            # Browser keeps features it already has
+            self.source.stream(select(self.data, extra))
+            self.shown = np.concatenate([self.shown, extra])
+
+    def show(self, indices):
+        if self.max_features is not None:
+            indices = indices[:self.max_features]
+        self.source.data = select(self.data, indices)
+        self.shown = np.asarray(indices, dtype=int)
+
+
+def on_viewport(figure, sources, margin=0.25):
+    """Cull sources whenever a figure is panned, zoomed or reset
+
+    :param figure: bokeh figure whose ranges define the viewport
+    :param sources: list of :class:`CulledSource`
+    :param margin: fraction of viewport added on each side
+    """
+    def callback(event=None):
+        ranges = viewport(figure, margin=margin)
+        if ranges is None:
+            return
+        for source in sources:
+            source.cull(*ranges)
+    figure.on_event(bokeh.events.LODEnd, callback)
+    figure.on_event(bokeh.events.Reset, callback)
+    callback()
+    return callback
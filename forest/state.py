@@ -219,9 +219,12 @@ class Tools:
     :type time_series: bool
     :param profile: Turn profile widget on/off
     :type time_series: bool
+    :param cross_section: Turn cross section widget on/off
+    :type cross_section: bool
     """
     time_series: bool = False
     profile: bool = False
+    cross_section: bool = False
 
 
 @dataclass
@@ -0,0 +1,470 @@
+"""
+Tile pyramid
+------------
+
+Gridded fields stretched into a single image lose detail when users
+zoom in and waste bandwidth when users look at a small region. A
+:class:`TilePyramid` renders a field lazily into 256 x 256 pixel tiles
+addressed by the same XYZ scheme used by web map tiling services,
+see :mod:`forest.components.tiles`.
+
+Tiles are cached in memory and optionally on disk so that panning and
+zooming reuse previously rendered tiles. Tiles are keyed by the path
+and modification time of the file they were rendered from, so
+rewritten files are rendered again, and least recently used tiles are
+removed from disk once ``max_bytes`` is exceeded. Units are stored
+next to the tiles of a field so that drawing cached tiles never
+decodes the field. Only tiles
+intersecting the viewport at the current zoom level, computed from the
+size of the figure in the browser, are sent to the browser by
+:class:`TiledImageView`.
+
+.. note:: Tiles hold data values rather than colours so that color
+          mapping is still performed in the browser
+
+.. autoclass:: TilePyramid
+    :members:
+
+.. autoclass:: TiledImageView
+    :members:
+
+.. autofunction:: tile_bounds
+
+.. autofunction:: zoom_level
+
+.. autofunction:: visible_tiles
+
+"""
+import os
+import math
+import json
+import hashlib
+from collections import OrderedDict, namedtuple
+import numpy as np
+import bokeh.colors
+import bokeh.events
+import bokeh.models
+from forest import geo
+from forest.drivers.gridded_forecast import coordinates
+from forest.exceptions import SearchFail
+from forest.frame_cache import frame_key
+from forest.map_view import AbstractMapView
+from forest.old_state import old_state, unique
+from forest.spatial_index import screen_size
+
+
+# Half-width of Web Mercator projection in metres
+WORLD = 20037508.342789244
+TILE_SIZE = 256
+MAX_ZOOM = 12
+LOW_WATER = 0.8  # Fraction of max_bytes kept after eviction
+
+
+Field = namedtuple("Field", ("gx", "gy", "values", "units", "extent"))
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator extent of XYZ tile
+
+    :returns: x_start, y_start, x_end, y_end
+    """
+    span = 2 * WORLD / 2**z
+    x_start = -WORLD + x * span
+    y_end = WORLD - y * span
+    return x_start, y_end - span, x_start + span, y_end
+
+
+def zoom_level(x_range, plot_width, max_zoom=MAX_ZOOM):
+    """Zoom level that displays tiles at roughly their native resolution
+
+    :param x_range: tuple of Web Mercator start and end
+    :param plot_width: figure width in screen pixels
+    """
+    start, end = x_range
+    if (start is None) or (end is None) or (end <= start):
+        return 0
+    pixels_per_metre = plot_width / (end - start)
+    z = math.log2(2 * WORLD * pixels_per_metre / TILE_SIZE)
+    return int(min(max(round(z), 0), max_zoom))
+
+
+def visible_tiles(z, x_range, y_range):
+    """XYZ tiles intersecting viewport at zoom level z"""
+    n = 2**z
+    span = 2 * WORLD / n
+
+    def clip(i):
+        return min(max(int(i), 0), n - 1)
+
+    i_start = clip(math.floor((x_range[0] + WORLD) / span))
+    i_end = clip(math.floor((x_range[1] + WORLD) / span))
+    j_start = clip(math.floor((WORLD - y_range[1]) / span))
+    j_end = clip(math.floor((WORLD - y_range[0]) / span))
+    for i in range(i_start, i_end + 1):
+        for j in range(j_start, j_end + 1):
+            yield z, i, j
+
+
+class TilePyramid:
+    """Lazily rendered tiles backed by memory and disk caches
+
+    :param directory: location to store tiles, None keeps tiles in memory
+    :param max_tiles: number of tiles held in memory
+    :param max_fields: number of projected fields held in memory
+    :param max_bytes: approximate size limit of tiles on disk, least
+                      recently used tiles are removed first, None means
+                      unlimited
+    """
+    def __init__(self, directory=None, max_tiles=512, max_fields=8,
+                 max_bytes=None):
+        self.directory = directory
+        self.max_tiles = max_tiles
+        self.max_fields = max_fields
+        self.max_bytes = max_bytes
+        self._bytes = None
+        self._tiles = OrderedDict()
+        self._fields = OrderedDict()
+        self._units = OrderedDict()
+
+    def tile(self, key, z, x, y, load):
+        """Tile data or None if field does not intersect tile
+
+        :param key: hashable identifier of field
+        :param load: callable returning lons, lats, values, units
+        """
+        uid = (key, z, x, y)
+        if uid in self._tiles:
+            self._tiles.move_to_end(uid)
+            return self._tiles[uid]
+        path = self._path(key, z, x, y)
+        values = self._read(path)
+        if values is not None:
+            image = self._from_disk(values)
+        else:
+            image = self.render(self.field(key, load), z, x, y)
+            if path is not None:
+                self._to_disk(path, image)
+                self._account(path)
+        self._tiles[uid] = image
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return image
+
+    def units(self, key, load):
+        """Units of field, the field is only loaded if units are unknown"""
+        if key in self._units:
+            self._units.move_to_end(key)
+            return self._units[key]
+        meta = self._read_meta(key)
+        if meta is None:
+            return self.field(key, load).units
+        self._remember_units(key, meta["units"])
+        return meta["units"]
+
+    def field(self, key, load):
+        """Projected field, projection is computed once per field"""
+        if key in self._fields:
+            self._fields.move_to_end(key)
+            return self._fields[key]
+        lons, lats, values, units = load()
+        gx, gy = geo.web_mercator_grid(np.asarray(lons), np.asarray(lats))
+        extent = (gx.min(), gy.min(), gx.max(), gy.max())
+        field = Field(gx, gy, np.ma.masked_invalid(values), units, extent)
+        self._fields[key] = field
+        while len(self._fields) > self.max_fields:
+            self._fields.popitem(last=False)
+        if key not in self._units:
+            self._write_meta(key, {"units": units})
+        self._remember_units(key, units)
+        return field
+
+    def _remember_units(self, key, units):
+        self._units[key] = units
+        self._units.move_to_end(key)
+        while len(self._units) > self.max_tiles:
+            self._units.popitem(last=False)
+
+    def _meta_path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, self._name(key), "meta.json")
+
+    def _read_meta(self, key):
+        """Meta-data stored with tiles of a field, None if not stored"""
+        path = self._meta_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path) as stream:
+                meta = json.load(stream)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(meta, dict) or ("units" not in meta):
+            return None
+        return meta
+
+    def _write_meta(self, key, meta):
+        path = self._meta_path(key)
+        if path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp, "w") as stream:
+                json.dump(meta, stream)
+            os.replace(tmp, path)
+        except (OSError, TypeError) as error:
+            print("WARNING: tile meta-data not stored {}".format(error))
+
+    @staticmethod
+    def render(field, z, x, y):
+        """Resample field onto tile"""
+        x_start, y_start, x_end, y_end = tile_bounds(z, x, y)
+        gx_start, gy_start, gx_end, gy_end = field.extent
+        if ((x_end <= gx_start) or (gx_end <= x_start) or
+                (y_end <= gy_start) or (gy_end <= y_start)):
+            return None
+        image = geo.datashader_stretch(field.values, field.gx, field.gy,
+                                       (x_start, x_end),
+                                       (y_start, y_end),
+                                       plot_height=TILE_SIZE,
+                                       plot_width=TILE_SIZE)
+        if np.ma.getmaskarray(image).all():
+            return None
+        return image.astype(np.float32)
+
+    @staticmethod
+    def _name(key):
+        return hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+
+    def _path(self, key, z, x, y):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, self._name(key), str(z), str(x),
+                            "{}.npy".format(y))
+
+    @staticmethod
+    def _read(path):
+        if path is None:
+            return None
+        try:
+            values = np.load(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return values
+
+    def _account(self, path):
+        """Keep disk usage below max_bytes
+
+        A running total avoids scanning the cache on every write, the
+        cache is only scanned when it has grown past max_bytes
+        """
+        if self.max_bytes is None:
+            return
+        if self._bytes is None:
+            self._bytes = self.nbytes()
+        else:
+            try:
+                self._bytes += os.path.getsize(path)
+            except OSError:
+                pass
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    def nbytes(self):
+        """Total size of tiles on disk"""
+        return sum(nbytes for _, _, nbytes in self._entries())
+
+    def evict(self):
+        """Remove least recently used tiles until below max_bytes
+
+        Tiles are removed down to a low-water mark so that the next
+        scan only happens after the cache has grown again
+        """
+        entries = sorted(self._entries())
+        total = sum(nbytes for _, _, nbytes in entries)
+        if total <= self.max_bytes:
+            self._bytes = total
+            return
+        target = LOW_WATER * self.max_bytes
+        for _, path, nbytes in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Removed by another process
+            total -= nbytes
+        self._bytes = total
+
+    def _entries(self):
+        """Last use, path and size of each tile on disk"""
+        if (self.directory is None) or not os.path.isdir(self.directory):
+            return
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".npy"):
+                    # Skip partially written tiles
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, path, stat.st_size
+
+    @staticmethod
+    def _to_disk(path, image):
+        if image is None:
+            values = np.empty(0, dtype=np.float32)
+        else:
+            values = np.ma.filled(image, np.nan)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as stream:
+            np.save(stream, values)
+        os.replace(tmp, path)  # Atomic for concurrent server processes
+
+    @staticmethod
+    def _from_disk(values):
+        if values.size == 0:
+            return None
+        return np.ma.masked_invalid(values)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+
+class TiledImageView(AbstractMapView):
+    """Alternative to :class:`forest.map_view.ImageView` that sends tiles
+
+    :param loader: object with ``name``, ``valid(state)``,
+                   ``locate(state)`` and ``field(state)``
+    :param pyramid: :class:`TilePyramid` shared between sessions
+    """
+    def __init__(self, loader, pyramid, color_mapper, use_hover_tool=True):
+        self.loader = loader
+        self.pyramid = pyramid
+        self.color_mapper = color_mapper
+        self.color_mapper.nan_color = bokeh.colors.RGB(0, 0, 0, a=0)
+        self.use_hover_tool = use_hover_tool
+        self.empty = {
+            "x": [],
+            "y": [],
+            "dw": [],
+            "dh": [],
+            "image": [],
+            "name": [],
+            "units": [],
+            "valid": [],
+            "initial": [],
+            "length": [],
+            "level": []}
+        self.source = bokeh.models.ColumnDataSource(self.empty)
+        self.image_sources = [self.source]
+        self.figures = []
+        self.state = None
+        self.tooltips = [
+            ("Name", "@name"),
+            ("Value", "@image @units"),
+            ('Length', '@length'),
+            ('Valid', '@valid{%F %H:%M}'),
+            ('Initial', '@initial{%F %H:%M}'),
+            ("Level", "@level")]
+        self.formatters = {
+            '@valid': 'datetime',
+            '@initial': 'datetime'
+        }
+
+    @old_state
+    @unique
+    def render(self, state):
+        self.state = state
+        self.render_tiles()
+
+    def on_viewport(self, event):
+        """Fetch tiles after user has panned or zoomed"""
+        self.render_tiles()
+
+    def on_resize(self, attr, old, new):
+        """Fetch tiles after the browser has resized the figure"""
+        self.render_tiles()
+
+    def render_tiles(self):
+        if (self.state is None) or (len(self.figures) == 0):
+            return
+        state = self.state
+        if not self.loader.valid(state):
+            self.source.data = self.empty
+            return
+        figure = self.figures[0]
+        x_range = (figure.x_range.start, figure.x_range.end)
+        y_range = (figure.y_range.start, figure.y_range.end)
+        if any(value is None for value in x_range + y_range):
+            return
+        width, _ = screen_size(figure)
+        z = zoom_level(x_range, width)
+
+        def load():
+            return self.loader.field(state)
+
+        columns = {k: [] for k in ("x", "y", "dw", "dh", "image")}
+        try:
+            path, _ = self.loader.locate(state)
+            key = (self.loader.name, frame_key(state), path, _mtime(path))
+            for tile in visible_tiles(z, x_range, y_range):
+                image = self.pyramid.tile(key, *tile, load)
+                if image is None:
+                    continue
+                x_start, y_start, x_end, y_end = tile_bounds(*tile)
+                columns["x"].append(x_start)
+                columns["y"].append(y_start)
+                columns["dw"].append(x_end - x_start)
+                columns["dh"].append(y_end - y_start)
+                columns["image"].append(image)
+            units = self.pyramid.units(key, load)
+        except SearchFail:
+            self.source.data = self.empty
+            return
+        self.source.data = self.tile_data(columns, state, units)
+
+    def tile_data(self, columns, state, units):
+        """Repeat meta-data for each tile to support hover tools"""
+        n = len(columns["image"])
+        meta = coordinates(state.valid_time, state.initial_time,
+                           state.pressures or [], state.pressure)
+        meta["name"] = [self.loader.name]
+        meta["units"] = [units]
+        data = dict(columns)
+        for k, values in meta.items():
+            data[k] = values * n
+        return data
+
+    def add_figure(self, figure):
+        self.figures.append(figure)
+        figure.on_event(bokeh.events.LODEnd, self.on_viewport)
+        figure.on_event(bokeh.events.Reset, self.on_viewport)
+        figure.on_change("inner_width", self.on_resize)
+        renderer = figure.image(
+                x="x",
+                y="y",
+                dw="dw",
+                dh="dh",
+                image="image",
+                source=self.source,
+                color_mapper=self.color_mapper)
+        if self.use_hover_tool:
+            tool = bokeh.models.HoverTool(
+                    renderers=[renderer],
+                    tooltips=self.tooltips,
+                    formatters=self.formatters)
+            figure.add_tools(tool)
+        return renderer
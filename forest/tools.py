@@ -65,10 +65,12 @@ class ToolsPanel(Observable):
 
 class ToolLayout:
     """ Manage the row containing the tool plots """
-    def __init__(self, series_figure=None, profile_figure=None):
+    def __init__(self, series_figure=None, profile_figure=None,
+                 cross_section_figure=None):
         self.layout = bokeh.layouts.column()
         self.series_figure = series_figure
         self.profile_figure = profile_figure
+        self.cross_section_figure = cross_section_figure
 
     def connect(self, store):
         store.add_subscriber(self.render)
@@ -80,4 +82,7 @@ class ToolLayout:
                 children.append(self.series_figure)
             if tool_name == "profile" and value:
                 children.append(self.profile_figure)
+            if tool_name == "cross_section" and value:
+                if self.cross_section_figure is not None:
+                    children.append(self.cross_section_figure)
         self.layout.children = children
@@ -0,0 +1,108 @@
+import datetime as dt
+from unittest.mock import Mock
+import netCDF4
+import forest.series
+from forest import catalogue
+
+
+def forecast_reference_time(path, time):
+    units = "hours since 1970-01-01 00:00:00"
+    with netCDF4.Dataset(path, "w") as dataset:
+        var = dataset.createVariable("forecast_reference_time", "d", ())
+        var.units = units
+        var[:] = netCDF4.date2num(time, units=units)
+
+
+def test_catalogue_file_name_available_immediately():
+    paths = ["/some/file_20190101T0000Z.nc", "/some/file_20190101T1200Z.nc"]
+    cat = catalogue.InitialTimeCatalogue()
+    cat.update(paths)
+    assert cat.table(paths) == {
+        "2019-01-01 00:00:00": [paths[0]],
+        "2019-01-01 12:00:00": [paths[1]]}
+
+
+def test_catalogue_reads_files_in_background(tmpdir):
+    path = str(tmpdir / "file.nc")
+    forecast_reference_time(path, dt.datetime(2019, 1, 1))
+    cat = catalogue.InitialTimeCatalogue()
+    cat.update([path])
+    cat.wait()
+    assert cat.table([path]) == {"2019-01-01 00:00:00": [path]}
+
+
+def test_catalogue_persists_results(tmpdir, monkeypatch):
+    path = str(tmpdir / "file.nc")
+    cache_path = str(tmpdir / "cache" / "catalogue.json")
+    forecast_reference_time(path, dt.datetime(2019, 1, 1))
+    cat = catalogue.InitialTimeCatalogue(cache_path)
+    cat.update([path])
+    cat.wait()
+
+    # Second catalogue should not open file
+    def read(path):
+        raise Exception("file should not be read")
+    monkeypatch.setattr(catalogue.InitialTimeCatalogue, "read",
+                        staticmethod(read))
+    cat = catalogue.InitialTimeCatalogue(cache_path)
+    cat.update([path])
+    assert cat.table([path]) == {"2019-01-01 00:00:00": [path]}
+
+
+def test_catalogue_rereads_modified_files(tmpdir):
+    path = str(tmpdir / "file.nc")
+    with open(path, "w"):
+        pass  # Still being written
+    cat = catalogue.InitialTimeCatalogue()
+    cat.update([path])
+    cat.wait()
+    assert cat.table([path]) == {}
+    forecast_reference_time(path, dt.datetime(2019, 1, 1))
+    cat.update([path])
+    cat.wait()
+    assert cat.table([path]) == {"2019-01-01 00:00:00": [path]}
+
+
+def test_catalogue_merges_results_of_other_processes(tmpdir):
+    paths = [str(tmpdir / "a.nc"), str(tmpdir / "b.nc")]
+    forecast_reference_time(paths[0], dt.datetime(2019, 1, 1))
+    forecast_reference_time(paths[1], dt.datetime(2019, 1, 2))
+    cache_path = str(tmpdir / "cache" / "catalogue.json")
+    first = catalogue.InitialTimeCatalogue(cache_path)
+    second = catalogue.InitialTimeCatalogue(cache_path)
+    first.update(paths[:1])
+    first.wait()
+    second.update(paths[1:])
+    second.wait()
+    cat = catalogue.InitialTimeCatalogue(cache_path)
+    assert sorted(cat._persisted) == sorted(paths)
+
+
+def test_catalogue_glob_adds_new_paths(tmpdir):
+    path = str(tmpdir / "file_20190101T0000Z.nc")
+    with open(path, "w"):
+        pass
+    cat = catalogue.InitialTimeCatalogue()
+    paths = cat.glob(str(tmpdir / "*.nc"))
+    assert cat.table(paths) == {"2019-01-01 00:00:00": [path]}
+
+
+def test_catalogue_notifies_subscribers(tmpdir):
+    path = str(tmpdir / "file.nc")
+    forecast_reference_time(path, dt.datetime(2019, 1, 1))
+    subscriber = Mock()
+    cat = catalogue.InitialTimeCatalogue()
+    cat.subscribe(subscriber)
+    cat.update([path])
+    cat.wait()
+    subscriber.on_catalogue.assert_called_once_with()
+
+
+def test_series_locator_follows_pattern(tmpdir):
+    cat = catalogue.InitialTimeCatalogue()
+    locator = forest.series.SeriesLocator([], catalogue=cat,
+                                          pattern=str(tmpdir / "*.nc"))
+    path = str(tmpdir / "file_20190101T0000Z.nc")
+    with open(path, "w"):
+        pass
+    assert locator.locate("2019-01-01 00:00:00") == [path]
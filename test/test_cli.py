@@ -1,5 +1,8 @@
 import pytest
+from unittest.mock import Mock
 import forest.cli.main
+import forest.cli.prerender
+import forest.config
 
 
 @pytest.mark.parametrize("argv,expect", [
@@ -27,3 +30,24 @@ import forest.cli.main
 def test_bokeh_command(argv, expect):
     result = forest.cli.main.bokeh_command("/app/path", argv)
     assert expect == result
+
+
+def test_main_dispatches_subcommand(monkeypatch):
+    calls = []
+    monkeypatch.setitem(forest.cli.main.COMMANDS, "prerender", calls.append)
+    forest.cli.main.main(["prerender", "--config-file", "file.yaml"])
+    assert calls == [["--config-file", "file.yaml"]]
+
+
+def test_prerender_find_frames():
+    group = forest.config.FileGroup("Label", "*.nc")
+    navigator = Mock()
+    navigator.variables.return_value = ["v"]
+    navigator.initial_times.return_value = ["2020-01-02", "2020-01-01"]
+    navigator.valid_times.return_value = ["2020-01-02 03:00",
+                                          "2020-01-02 00:00"]
+    navigator.pressures.return_value = []
+    frames = list(forest.cli.prerender.find_frames(group, navigator, 1))
+    assert [(f.initial_time, f.valid_time, f.pressure) for f in frames] == [
+        ("2020-01-02", "2020-01-02 00:00", None),
+        ("2020-01-02", "2020-01-02 03:00", None)]
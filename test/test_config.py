@@ -201,6 +201,27 @@ def test_config_parser_presets_file(data, expect):
     assert config.presets_file == expect
 
 
+@pytest.mark.parametrize("data,expect", [
+    ({}, None),
+    ({"cache": {}}, None),
+    ({"cache": {"directory": "/cache"}}, "/cache")
+])
+def test_config_parser_cache_directory(data, expect):
+    config = forest.config.Config(data)
+    assert config.cache_directory == expect
+
+
+@pytest.mark.parametrize("data,expect", [
+    ({}, None),
+    ({"cache": {"max_size": 1000}}, 1000),
+    ({"cache": {"max_size": "2KB"}}, 2048),
+    ({"cache": {"max_size": "1.5 GB"}}, int(1.5 * 1024**3))
+])
+def test_config_parser_cache_max_bytes(data, expect):
+    config = forest.config.Config(data)
+    assert config.cache_max_bytes == expect
+
+
 @pytest.mark.parametrize("data,expect", [
     ({}, True),
     ({"use_web_map_tiles": False}, False),
@@ -0,0 +1,154 @@
+import datetime as dt
+import netCDF4
+import numpy as np
+import numpy.testing as npt
+import forest.cross_section
+from forest import cross_section
+
+
+def variable_4d(dataset, variable, times, pressures, longitudes,
+                latitudes, values):
+    dataset.createDimension("latitude", len(latitudes))
+    dataset.createDimension("longitude", len(longitudes))
+    dataset.createDimension("time", len(times))
+    dataset.createDimension("pressure", len(pressures))
+    var = dataset.createVariable("longitude", "d", ("longitude",))
+    var[:] = longitudes
+    var = dataset.createVariable("latitude", "d", ("latitude",))
+    var[:] = latitudes
+    var = dataset.createVariable("pressure", "d", ("pressure",))
+    var[:] = pressures
+    units = "hours since 1970-01-01 00:00:00"
+    var = dataset.createVariable("time", "d", ("time",))
+    var.units = units
+    var.standard_name = "time"
+    var[:] = netCDF4.date2num(times, units=units)
+    var = dataset.createVariable(
+        variable, "f", ("time", "pressure", "latitude", "longitude"))
+    var.coordinates = "forecast_reference_time"
+    var[:] = values
+
+
+def linear_field(lons, lats, levels):
+    """Field bilinear interpolation reproduces exactly"""
+    x, y = np.meshgrid(lons, lats)
+    return np.array([level * (10 * x + y) for level in levels])
+
+
+def test_resample_equally_spaced():
+    lons, lats, distance = cross_section.resample(((0, 0), (2, 0)), 3)
+    npt.assert_array_almost_equal(lons, [0, 1, 2])
+    npt.assert_array_almost_equal(lats, [0, 0, 0])
+    npt.assert_array_almost_equal(np.diff(distance), [111.195, 111.195],
+                                  decimal=3)
+
+
+def test_path_weights_interpolate_linear_field():
+    lons = np.arange(10.)
+    lats = np.arange(5.)
+    vertices = ((2.5, 1.25), (6.5, 3.75))
+    weights = cross_section.path_weights(lons, lats, vertices, points=5)
+    block = linear_field(lons, lats, [1, 2])[(slice(None),) + weights.window]
+    result = cross_section.interpolate(block, weights)
+    x = np.linspace(2.5, 6.5, 5)
+    y = np.linspace(1.25, 3.75, 5)
+    npt.assert_array_almost_equal(result, [10 * x + y, 2 * (10 * x + y)])
+
+
+def test_path_weights_window_bounds_line():
+    lons = np.arange(10.)
+    lats = np.arange(5.)
+    weights = cross_section.path_weights(lons, lats,
+                                         ((2.5, 1.5), (4.5, 1.5)), points=3)
+    assert weights.window == (slice(1, 3), slice(2, 6))
+
+
+def test_path_weights_outside_grid_are_invalid():
+    lons = np.arange(4.)
+    lats = np.arange(4.)
+    vertices = ((1, 1), (11, 1))
+    weights = cross_section.path_weights(lons, lats, vertices, points=5)
+    npt.assert_array_equal(weights.valid, [True, False, False, False, False])
+    block = linear_field(lons, lats, [1])[(slice(None),) + weights.window]
+    result = cross_section.interpolate(block, weights)
+    assert np.isnan(result[0, 1:]).all()
+
+
+def test_path_weights_descending_latitudes():
+    lons = np.arange(4.)
+    lats = np.arange(4.)[::-1]
+    vertices = ((0.5, 2.5), (2.5, 0.5))
+    weights = cross_section.path_weights(lons, lats, vertices, points=3)
+    block = linear_field(lons, lats, [1])[(slice(None),) + weights.window]
+    result = cross_section.interpolate(block, weights)
+    npt.assert_array_almost_equal(result, [[7.5, 16.5, 25.5]])
+
+
+def test_cross_section_file_reads_all_levels(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "air_temperature"
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 6)]
+    pressures = [1000., 500., 250.]
+    lons, lats = np.arange(6.), np.arange(4.)
+    field = linear_field(lons, lats, pressures)
+    values = np.array([field, 2 * field])
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, variable, times, pressures, lons, lats, values)
+    vertices = ((1.5, 0.5), (3.5, 2.5))
+    loader = cross_section.CrossSectionLoader([path], points=3)
+    result = loader.cross_section_file(path, variable, vertices, times[1])
+    x = np.array([1.5, 2.5, 3.5])
+    y = np.array([0.5, 1.5, 2.5])
+    expect = [2 * p * (10 * x + y) for p in sorted(pressures)]
+    npt.assert_array_equal(result["pressure"], sorted(pressures))
+    npt.assert_allclose(result["values"], expect, rtol=1e-6)
+
+
+def test_weights_shared_between_files(tmpdir):
+    variable = "air_temperature"
+    times = [dt.datetime(2019, 1, 1)]
+    paths = [str(tmpdir / "a.nc"), str(tmpdir / "b.nc")]
+    for path in paths:
+        with netCDF4.Dataset(path, "w") as dataset:
+            variable_4d(dataset, variable, times, [1000.], [0, 1], [0, 1],
+                        np.zeros((1, 1, 2, 2)))
+    forest.cross_section._WEIGHTS.clear()
+    loader = cross_section.CrossSectionLoader(paths)
+    for path in paths:
+        loader.cross_section_file(path, variable, ((0, 0), (1, 1)), times[0])
+    assert len(forest.cross_section._WEIGHTS) == 1
+
+
+def test_cross_section_file_reuses_block_in_same_window(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "air_temperature"
+    times = [dt.datetime(2019, 1, 1)]
+    lons, lats = np.arange(6.), np.arange(4.)
+    values = linear_field(lons, lats, [1000., 500.])[np.newaxis]
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, variable, times, [1000., 500.], lons, lats,
+                    values)
+    cross_section.CrossSectionLoader._block.cache_clear()
+    loader = cross_section.CrossSectionLoader([path], points=3)
+    loader.cross_section_file(path, variable,
+                              ((1.5, 0.5), (3.5, 2.5)), times[0])
+    result = loader.cross_section_file(path, variable,
+                                       ((1.5, 2.5), (3.5, 0.5)), times[0])
+    assert loader._block.cache_info().hits == 1
+    x = np.array([1.5, 2.5, 3.5])
+    y = np.array([2.5, 1.5, 0.5])
+    expect = [p * (10 * x + y) for p in [500., 1000.]]
+    npt.assert_allclose(result["values"], expect, rtol=1e-6)
+
+
+def test_quads_surround_samples():
+    data = {
+        "distance": np.array([0., 10.]),
+        "pressure": np.array([500., 1000.]),
+        "values": np.array([[1., 2.], [3., 4.]])}
+    result = cross_section.CrossSectionView.quads(data)
+    npt.assert_array_equal(result["left"], [-5, 5, -5, 5])
+    npt.assert_array_equal(result["right"], [5, 15, 5, 15])
+    npt.assert_array_equal(result["bottom"], [250, 250, 750, 750])
+    npt.assert_array_equal(result["top"], [750, 750, 1250, 1250])
+    npt.assert_array_equal(result["value"], [1, 2, 3, 4])
@@ -83,3 +83,51 @@ class TestUnifiedModelLoader(unittest.TestCase):
         for key in expect.keys():
             msg = "values not equal for key='{}'".format(key)
             self.assertEqual(expect[key], result[key], msg)
+
+
+def test_simplify_removes_collinear_points():
+    lines = {"xs": [[0, 1, 2, 3]], "ys": [[0, 0, 0, 0]]}
+    result = data.simplify(lines, tolerance=0.5)
+    assert list(result["xs"][0]) == [0, 3]
+    assert list(result["ys"][0]) == [0, 0]
+
+
+def test_simplify_drops_short_lines():
+    lines = {"xs": [[0, float("nan")], [0, 1]], "ys": [[0, 0], [0, 1]]}
+    result = data.simplify(lines, tolerance=0)
+    assert len(result["xs"]) == 1
+
+
+def test_pack_unpack_boxes():
+    lines = {"xs": [[0, 2], [5, 4, 6]], "ys": [[1, 3], [0, 1, 2]]}
+    x, y, offsets = data.pack(lines)
+    assert list(offsets) == [0, 2, 5]
+    result = data.unpack(x, y, offsets)
+    assert [list(xs) for xs in result["xs"]] == lines["xs"]
+    assert data.boxes(x, y, offsets).tolist() == [[0, 1, 2, 3], [4, 0, 6, 2]]
+
+
+def test_cached_levels_saved_to_disk(tmpdir, monkeypatch):
+    monkeypatch.setattr(data, "CACHE_DIRECTORY", str(tmpdir))
+    lines = {"xs": [[0, 1, 2, 3]], "ys": [[0, 0.1, 0, 0]]}
+    calls = []
+
+    def load():
+        calls.append(None)
+        return lines
+
+    tolerances = (1., 0.)
+    data.cached_levels("lines", load, tolerances)
+    result = data.cached_levels("lines", load, tolerances)
+    assert len(calls) == 1
+    assert [level.tolerance for level in result] == [1., 0.]
+    assert list(result[0].data["xs"][0]) == [0, 3]
+    assert list(result[1].data["xs"][0]) == [0, 1, 2, 3]
+
+
+def test_select_level():
+    levels = [data.Level(tolerance, None, None)
+              for tolerance in (1000., 100., 0.)]
+    assert data.select_level(levels, 5000.).tolerance == 1000.
+    assert data.select_level(levels, 500.).tolerance == 100.
+    assert data.select_level(levels, 1.).tolerance == 0.
@@ -1,10 +1,14 @@
 import pytest
-from unittest.mock import Mock
+import os
+import sqlite3
+from unittest.mock import Mock, patch
 import cftime
 import datetime as dt
 import bokeh.models
 import netCDF4
 import numpy as np
+import forest.data
+import forest.geo
 import forest.drivers
 from forest.drivers import eida50
 from forest.exceptions import FileNotFound, IndexNotFound
@@ -301,3 +305,164 @@ def test_database_insert_times_supported_types(value, expect):
     database = forest.drivers.eida50.Database()
     database.insert_times([value], "file.nc")
     assert database.fetch_times() == [expect]
+
+
+def test_time_index_find_file():
+    paths = ["eida50_20200103.nc", "eida50_20200101.nc", "eida50.nc"]
+    index = eida50.TimeIndex()
+    assert index.update(paths)
+    assert index.unparsed == ["eida50.nc"]
+    assert index.find_file(dt.datetime(2020, 1, 2)) == "eida50_20200101.nc"
+    assert index.find_file(dt.datetime(2020, 1, 3)) == "eida50_20200103.nc"
+    with pytest.raises(FileNotFound):
+        index.find_file(dt.datetime(2019, 12, 31))
+
+
+def test_time_index_update_only_when_paths_change():
+    index = eida50.TimeIndex()
+    paths = ["eida50_20200101.nc"]
+    assert index.update(paths)
+    assert not index.update(list(paths))
+    assert index.update(paths + ["eida50_20200102.nc"])
+    assert index.version == 2
+
+
+def test_locator_all_times_reused(tmpdir):
+    path = str(tmpdir / "eida50.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES[:2])
+    database = eida50.Database()
+    locator = eida50.Locator(path, database)
+    first = locator.all_times([path])
+    assert database.fetch_paths() == [path]
+    assert locator.all_times([path]) is first
+    np.testing.assert_array_equal(first, np.array(TIMES[:2],
+                                                  dtype="datetime64[s]"))
+
+
+def test_database_insert_file_only_once(tmpdir):
+    times = [dt.datetime(2020, 1, 1)]
+    with eida50.Database(str(tmpdir / "file.db")) as database:
+        assert database.insert_file("file.nc", times)
+        assert not database.insert_file("file.nc", times)
+        assert database.fetch_times() == times
+
+
+def test_database_insert_file_replaces_times_of_modified_file(tmpdir):
+    with eida50.Database(str(tmpdir / "file.db")) as database:
+        database.insert_file("file.nc", TIMES[:1], mtime=1.)
+        assert database.insert_file("file.nc", TIMES[:2], mtime=2.)
+        assert database.fetch_times("file.nc") == TIMES[:2]
+        assert database.has_path("file.nc", mtime=2.)
+        assert not database.has_path("file.nc", mtime=1.)
+
+
+def test_locator_reindexes_appended_frames(tmpdir):
+    path = str(tmpdir / "eida50.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES[:2])
+    os.utime(path, (0, 0))
+    database = eida50.Database(str(tmpdir / "eida50.db"))
+    locator = eida50.Locator(path, database)
+    assert len(locator.all_times([path])) == 2
+    assert len(locator.time_axis(path)) == 2
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES[:3])
+    locator.record(path)
+    np.testing.assert_array_equal(locator.all_times([path]),
+                                  np.array(TIMES[:3], dtype="datetime64[s]"))
+    np.testing.assert_array_equal(locator.time_axis(path),
+                                  np.array(TIMES[:3], dtype="datetime64[s]"))
+    assert database.fetch_times(path) == TIMES[:3]
+
+
+def test_database_version_changes_after_other_connection_writes(tmpdir):
+    path = str(tmpdir / "file.db")
+    with eida50.Database(path) as reader, eida50.Database(path) as writer:
+        before = reader.version()
+        writer.insert_file("file.nc", [dt.datetime(2020, 1, 1)])
+        assert reader.version() != before
+        assert reader.has_path("file.nc")
+
+
+def test_indexer_stores_time_axis(tmpdir):
+    path = str(tmpdir / "eida50.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES[:2])
+    database_path = str(tmpdir / "eida50.db")
+    indexer = eida50.Indexer(database_path)
+    indexer.update([path])
+    indexer.wait()
+    with eida50.Database(database_path) as database:
+        assert database.fetch_times(path) == TIMES[:2]
+
+
+def test_indexer_restarts_after_unexpected_error(tmpdir):
+    path = str(tmpdir / "eida50.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES[:2])
+    database_path = str(tmpdir / "eida50.db")
+    indexer = eida50.Indexer(database_path)
+    with patch.object(eida50.Database, "insert_file",
+                      side_effect=RuntimeError("unexpected")):
+        indexer.update([path])
+        indexer.wait()
+    assert indexer._thread is None
+    assert len(indexer._queued) == 0
+    indexer.update([path])
+    indexer.wait()
+    with eida50.Database(database_path) as database:
+        assert database.fetch_times(path) == TIMES[:2]
+
+
+def test_indexer_survives_database_errors(tmpdir):
+    path = str(tmpdir / "eida50.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES[:2])
+    indexer = eida50.Indexer(str(tmpdir / "eida50.db"))
+    error = sqlite3.OperationalError("database is locked")
+    with patch.object(eida50.Database, "insert_file", side_effect=error):
+        indexer.update([path])
+        indexer.wait()
+    assert indexer._thread is None
+    assert len(indexer._queued) == 0
+
+
+def test_dataset_database_in_cache_directory(tmpdir, monkeypatch):
+    monkeypatch.setattr(forest.data, "CACHE_DIRECTORY", str(tmpdir))
+    dataset = eida50.Dataset(pattern=str(tmpdir / "*.nc"))
+    assert dataset.database.path == str(tmpdir / eida50.DATABASE_FILE)
+    assert isinstance(dataset.locator.indexer, eida50.Indexer)
+
+
+def test_loader_resample_gathers_block():
+    lons, lats = np.arange(4.), np.arange(4.)
+    plan = forest.geo.reprojection_plan(lons, lats, scale=1)
+    block = np.arange(16.).reshape(4, 4)
+    block[0, 0] = np.nan
+    image = eida50.Loader.resample(block, plan)["image"][0]
+    np.testing.assert_array_equal(image.data[1:, 1:], block[1:, 1:])
+    assert image.mask[0, 0]
+
+
+def test_loader_reads_cropped_region(tmpdir):
+    path = str(tmpdir / "file_20190417.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES, LONS, LATS)
+    locator = eida50.Locator(path, eida50.Database())
+    loader = eida50.Loader(locator, lon_range=(0, 10), lat_range=(0, 5))
+    image = loader._image(dt.datetime(2019, 4, 17, 12))
+    x, _ = forest.geo.web_mercator(0, 0)
+    assert image["x"][0] >= x[0]
+    assert image["image"][0].shape[1] < len(LONS) / 2
+
+
+def test_loader_plan_shared_between_loaders(tmpdir):
+    path = str(tmpdir / "file_20190417.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _eida50(dataset, TIMES, LONS, LATS)
+    forest.geo._PLANS.clear()
+    for _ in range(2):
+        loader = eida50.Loader(eida50.Locator(path, eida50.Database()))
+        loader._image(dt.datetime(2019, 4, 17, 12))
+    assert len(forest.geo._PLANS) == 1
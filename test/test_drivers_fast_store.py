@@ -0,0 +1,101 @@
+import datetime as dt
+import numpy as np
+import netCDF4
+import forest.db
+from forest.drivers import fast_store
+
+
+def make_file(path, times=None, offset=0):
+    if times is None:
+        times = [dt.datetime(2020, 1, 1, 3), dt.datetime(2020, 1, 1, 6)]
+    pressures = [1000., 850.]
+    units = "hours since 1970-01-01 00:00:00"
+    with netCDF4.Dataset(path, "w") as dataset:
+        dataset.createDimension("time", len(times))
+        dataset.createDimension("pressure", len(pressures))
+        dataset.createDimension("latitude", 3)
+        dataset.createDimension("longitude", 4)
+        var = dataset.createVariable("time", "d", ("time",))
+        var.units = units
+        var[:] = netCDF4.date2num(times, units=units)
+        var = dataset.createVariable("pressure", "d", ("pressure",))
+        var[:] = pressures
+        var = dataset.createVariable("latitude", "d", ("latitude",))
+        var[:] = [0, 1, 2]
+        var = dataset.createVariable("longitude", "d", ("longitude",))
+        var[:] = [0, 90, 180, 270]
+        var = dataset.createVariable(
+            "relative_humidity", "f",
+            ("time", "pressure", "latitude", "longitude"))
+        var.units = "%"
+        var[:] = offset + np.arange(2 * 2 * 3 * 4).reshape(2, 2, 3, 4)
+
+
+def test_convert_index(tmpdir):
+    path = str(tmpdir / "um_20200101T0000Z.nc")
+    make_file(path)
+    directory = str(tmpdir / "store")
+    fast_store.convert([path], directory, ["relative_humidity"])
+    store = fast_store.Store(directory)
+    assert store.variables() == ["relative_humidity"]
+    assert store.initial_times("relative_humidity") == [
+        np.datetime64("2020-01-01T00:00:00")]
+    np.testing.assert_array_equal(
+        store.pressures("relative_humidity", dt.datetime(2020, 1, 1)),
+        [850., 1000.])
+
+
+def test_store_image_and_column_layouts_agree(tmpdir):
+    path = str(tmpdir / "um_20200101T0000Z.nc")
+    make_file(path)
+    directory = str(tmpdir / "store")
+    fast_store.convert([path], directory, ["relative_humidity"],
+                       block_bytes=1)
+    store = fast_store.Store(directory)
+    lons, lats, values, units = store.image(
+        "relative_humidity",
+        dt.datetime(2020, 1, 1),
+        dt.datetime(2020, 1, 1, 6),
+        1000.)
+    np.testing.assert_array_equal(lons, [-90, 0, 90, 180])
+    assert units == "%"
+    times, pressures, column, _ = store.column(
+        "relative_humidity", dt.datetime(2020, 1, 1), 0, 2)
+    assert column.shape == (2, 2)
+    assert column[1, 1] == values[2, 1]
+
+
+def test_image_loader(tmpdir):
+    path = str(tmpdir / "um_20200101T0000Z.nc")
+    make_file(path)
+    directory = str(tmpdir / "store")
+    fast_store.convert([path], directory, ["relative_humidity"])
+    loader = fast_store.ImageLoader("UM", fast_store.Store(directory))
+    state = forest.db.State(variable="relative_humidity",
+                            initial_time=dt.datetime(2020, 1, 1),
+                            valid_time=dt.datetime(2020, 1, 1, 3),
+                            pressure=850.,
+                            pressures=[850., 1000.])
+    data = loader.image(state)
+    assert data["name"] == ["UM"]
+    assert data["level"] == ["850 hPa"]
+
+
+def test_convert_merges_files_from_same_run(tmpdir):
+    paths = [str(tmpdir / "um_20200101T0000Z_000.nc"),
+             str(tmpdir / "um_20200101T0000Z_006.nc")]
+    make_file(paths[1], times=[dt.datetime(2020, 1, 1, 9),
+                               dt.datetime(2020, 1, 1, 12)], offset=100)
+    make_file(paths[0])
+    directory = str(tmpdir / "store")
+    fast_store.convert(paths, directory, ["relative_humidity"])
+    store = fast_store.Store(directory)
+    initial = dt.datetime(2020, 1, 1)
+    times = store.valid_times("relative_humidity", initial)
+    assert len(times) == 4
+    _, _, first, _ = store.image("relative_humidity", initial,
+                                 dt.datetime(2020, 1, 1, 3), 1000.)
+    _, _, last, _ = store.image("relative_humidity", initial,
+                                dt.datetime(2020, 1, 1, 12), 1000.)
+    assert first.max() < 100
+    assert last.min() >= 100
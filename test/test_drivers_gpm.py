@@ -1,6 +1,10 @@
+import os
 import pytest
 import datetime as dt
+from types import SimpleNamespace
 import bokeh.models
+import netCDF4
+import numpy as np
 import forest.drivers
 import forest.drivers.gpm
 
@@ -25,3 +29,91 @@ def test_locator_find_paths(paths, date, expect):
     window_size = dt.timedelta(days=1)
     locator = forest.drivers.gpm.Locator()
     assert list(locator.find_paths(paths, date, window_size)) == expect
+
+
+def _gpm(dataset, times, lons, lats):
+    """Helper to define GPM IMERG formatted file"""
+    dataset.createDimension("time", len(times))
+    dataset.createDimension("longitude", len(lons))
+    dataset.createDimension("latitude", len(lats))
+    units = "hours since 1970-01-01 00:00:00"
+    var = dataset.createVariable("time", "d", ("time",))
+    var.units = units
+    var[:] = netCDF4.date2num(times, units=units)
+    var = dataset.createVariable("longitude", "f", ("longitude",))
+    var[:] = lons
+    var = dataset.createVariable("latitude", "f", ("latitude",))
+    var[:] = lats
+    var = dataset.createVariable("precipitation_flux", "f",
+                                 ("time", "latitude", "longitude"))
+    var[:] = np.arange(len(times))[:, None, None] * np.ones(
+        (len(times), len(lats), len(lons)))
+
+
+def test_locator_find_paths_given_unsorted_paths():
+    paths = ["20200103.nc", "20200101.nc", "20200102.nc"]
+    locator = forest.drivers.gpm.Locator()
+    result = list(locator.find_paths(paths, dt.datetime(2020, 1, 2, 12),
+                                     dt.timedelta(days=1)))
+    assert result == ["20200102.nc", "20200103.nc"]
+
+
+def test_locator_find_index(tmpdir):
+    path = str(tmpdir / "gpm_20200101.nc")
+    times = [dt.datetime(2020, 1, 1, 0, 30 * i) for i in range(2)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        _gpm(dataset, times, [0, 1], [0, 1])
+    locator = forest.drivers.gpm.Locator()
+    assert list(locator.find_index(path, times[1])) == [1]
+    assert list(locator.find_index(path, dt.datetime(2020, 1, 1, 0, 15))) == []
+
+
+def test_locator_times_refreshed_when_file_changes(tmpdir):
+    path = str(tmpdir / "gpm_20200101.nc")
+    times = [dt.datetime(2020, 1, 1, 0, 30 * i) for i in range(2)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        _gpm(dataset, times[:1], [0, 1], [0, 1])
+    locator = forest.drivers.gpm.Locator()
+    assert len(locator.times(path)) == 1
+    with netCDF4.Dataset(path, "w") as dataset:
+        _gpm(dataset, times, [0, 1], [0, 1])
+    os.utime(path, (0, os.path.getmtime(path) + 1))
+    assert list(locator.times(path)) == times
+
+
+def test_loader_image_reads_frame(tmpdir):
+    path = str(tmpdir / "gpm_20200101.nc")
+    times = [dt.datetime(2020, 1, 1, 0, 30 * i) for i in range(2)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        _gpm(dataset, times, np.arange(4.), np.arange(3.))
+    pattern = str(tmpdir / "gpm_*.nc")
+    loader = forest.drivers.gpm._Loader(
+        pattern, forest.drivers.gpm.Locator(pattern))
+    data = loader.image(SimpleNamespace(valid_time=times[1]))
+    assert data["image"][0].shape == (3, 4)
+    np.testing.assert_array_equal(data["image"][0], 1)
+
+
+def test_read_plan_shared_by_files_on_same_grid(tmpdir):
+    times = [dt.datetime(2020, 1, 1)]
+    paths = [str(tmpdir / "gpm_20200101.nc"), str(tmpdir / "gpm_20200102.nc")]
+    for path in paths:
+        with netCDF4.Dataset(path, "w") as dataset:
+            _gpm(dataset, times, np.arange(4.), np.arange(3.))
+    plans = [forest.drivers.gpm.read_plan(path, os.path.getmtime(path))
+             for path in paths]
+    assert plans[0] is plans[1]
+
+
+def test_navigator_valid_times_uses_locator_index(tmpdir):
+    path = str(tmpdir / "gpm_20200101.nc")
+    times = [dt.datetime(2020, 1, 1, 0, 30 * i) for i in range(2)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        _gpm(dataset, times, [0, 1], [0, 1])
+    locator = forest.drivers.gpm.Locator(str(tmpdir / "gpm_*.nc"))
+    navigator = forest.drivers.gpm.Navigator(locator.pattern, locator)
+    assert navigator.valid_times() == [dt.datetime(2020, 1, 1)]
+    result = navigator.valid_times(valid_times=[],
+                                   valid_time=dt.datetime(2020, 1, 1))
+    np.testing.assert_array_equal(result, times)
+    assert list(locator._parsed.keys()) == [path]
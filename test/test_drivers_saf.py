@@ -1,7 +1,12 @@
+import os
 import datetime as dt
 import pytest
+from unittest.mock import Mock
 import bokeh.models
+import netCDF4
+import numpy as np
 import forest.drivers
+from forest import geo
 from forest.drivers import saf
 
 
@@ -82,3 +87,66 @@ def test_file_name_locator(paths, date, expect):
     locator = saf.Locator(pattern, )
     frequency = dt.timedelta(minutes=15)
     assert list(locator.find_paths(paths, date, frequency)) == expect
+
+
+def test_locator_find_paths_given_unsorted_paths():
+    paths = [
+        "S_NWC_CTTH_MSG4_GuineaCoast-VISIR_20191021T140000Z.nc",
+        "S_NWC_CTTH_MSG4_GuineaCoast-VISIR_20191021T134500Z.nc",
+        "README.txt"]
+    locator = saf.Locator("")
+    frequency = dt.timedelta(minutes=15)
+    result = list(locator.find_paths(paths, dt.datetime(2019, 10, 21, 13, 50),
+                                     frequency))
+    assert result == [paths[1]]
+    assert list(locator.valid_times(paths)) == [
+        dt.datetime(2019, 10, 21, 13, 45),
+        dt.datetime(2019, 10, 21, 14, 0)]
+
+
+def test_locator_index_parses_new_paths_only():
+    locator = saf.Locator("")
+    paths = ["saf_20191021T134500Z.nc"]
+    locator.index(paths)
+    locator.parse_date = Mock(return_value=dt.datetime(2019, 10, 21, 14))
+    dates, _ = locator.index(paths + ["saf_20191021T140000Z.nc"])
+    locator.parse_date.assert_called_once_with("saf_20191021T140000Z.nc")
+    assert len(dates) == 2
+
+
+def _saf(dataset, values):
+    """Helper to define SAF formatted file"""
+    ny, nx = values.shape
+    dataset.createDimension("ny", ny)
+    dataset.createDimension("nx", nx)
+    lons, lats = np.meshgrid(np.linspace(0, 10, nx), np.linspace(0, 5, ny))
+    for name, data in (("lon", lons), ("lat", lats)):
+        var = dataset.createVariable(name, "f", ("ny", "nx"))
+        var[:] = data
+    var = dataset.createVariable("ctth_alti", "f", ("ny", "nx"))
+    var.long_name = "Cloud top altitude"
+    var.units = "m"
+    var.coordinates = "lon lat"
+    var[:] = values
+
+
+def test_loader_image_reads_requested_variable(tmpdir):
+    path = str(tmpdir / "saf_20191021T134500Z.nc")
+    with netCDF4.Dataset(path, "w") as dataset:
+        _saf(dataset, np.ones((4, 5)))
+    loader = saf.Loader(saf.Locator(path))
+    time = dt.datetime(2019, 10, 21, 13, 45)
+    result = loader._image("Cloud top altitude", time, time, [], None)
+    assert result["name"] == ["Cloud top altitude"]
+    assert result["units"] == ["m"]
+    assert len(result["image"]) == 1
+
+
+def test_loader_geometry_shared_between_files(tmpdir):
+    geo._PROJECTIONS.clear()
+    for name in ("saf_20191021T134500Z.nc", "saf_20191021T140000Z.nc"):
+        path = str(tmpdir / name)
+        with netCDF4.Dataset(path, "w") as dataset:
+            _saf(dataset, np.zeros((4, 5)))
+        saf.Loader.geometry(path, os.path.getmtime(path))
+    assert len(geo._PROJECTIONS) == 1
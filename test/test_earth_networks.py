@@ -6,6 +6,7 @@ import pandas.testing as pdt
 import datetime as dt
 import numpy as np
 import glob
+import forest.data
 import forest.drivers
 from forest.drivers import earth_networks
 
@@ -36,6 +37,26 @@ def test_earth_networks(tmpdir):
     assert abs(result["longitude"] - 31.92064) < atol
 
 
+def test_flash_types():
+    result = earth_networks.flash_types(np.array([0, 1, 9, 5], dtype="i1"))
+    assert list(result) == ["CG", "IC", "Keep alive", "5"]
+
+
+def test_loader_columnar_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(forest.data, "CACHE_DIRECTORY", str(tmpdir / "cache"))
+    path = str(tmpdir / "sample.txt")
+    with open(path, "w") as stream:
+        stream.write("\n".join(LINES))
+    loader = earth_networks.Loader()
+    frame = loader.load([path, path])
+    cached = glob.glob(str(tmpdir / "cache" / "earth_networks" / "*.npy"))
+    assert len(cached) == 1
+    columns = np.load(cached[0])
+    assert columns.dtype == earth_networks.COLUMNS
+    assert list(frame["flash_type"]) == ["IC"] * 4
+    assert frame["date"].iloc[1] == np.datetime64("2019-04-17T00:00:01.093")
+
+
 def test_dataset():
     dataset = forest.drivers.get_dataset("earth_networks")
     assert isinstance(dataset, forest.drivers.earth_networks.Dataset)
@@ -65,6 +86,7 @@ def test_navigator_variables():
 
 def test_view_render_density():
     locator = Mock(specs=["find"])
+    locator.find_period.return_value = []
     loader = Mock(specs=["load"])
     loader.load.return_value = pd.DataFrame({
         "flash_type": [],
@@ -82,6 +104,7 @@ def test_view_render_density():
 
 def test_view_render_time_since_flash():
     locator = Mock(specs=["find"])
+    locator.find_period.return_value = []
     loader = Mock(specs=["load"])
     loader.load.return_value = pd.DataFrame({
         "date": [],
@@ -138,3 +161,146 @@ def test_view_since_flash():
     result = view.since_flash(strike_times, period_start)
     expect = pd.Series([0., 3600.])
     pdt.assert_series_equal(result, expect)
+
+
+def test_locator_find_period(tmpdir):
+    names = ["flash_20190417T{}.txt".format(hhmm)
+             for hhmm in ("0030", "0000", "0015", "0045")]
+    for name in names:
+        (tmpdir / name).write("")
+    locator = earth_networks.TimestampLocator(str(tmpdir / "*.txt"))
+    result = locator.find_period(dt.datetime(2019, 4, 17, 0, 10),
+                                 dt.timedelta(minutes=30))
+    expect = [str(tmpdir / name) for name in names[1:3] + names[:1]]
+    assert result == expect
+
+
+def test_locator_find_period_after_last_file():
+    locator = earth_networks.TimestampLocator(None)
+    locator.refresh(["flash_20190417T0000.txt", "flash_20190417T0015.txt"])
+    window = dt.timedelta(minutes=60)
+    assert locator.find_period(dt.datetime(2019, 4, 17, 0, 20), window) == [
+        "flash_20190417T0015.txt"]
+    assert locator.find_period(dt.datetime(2019, 4, 17, 0, 40), window) == []
+
+
+def test_locator_refresh_adds_new_files():
+    locator = earth_networks.TimestampLocator(None)
+    locator.refresh(["flash_20190417T0015.txt"])
+    added = locator.refresh(["flash_20190417T0015.txt",
+                             "flash_20190417T0000.txt"])
+    assert added == ["flash_20190417T0000.txt"]
+    assert list(locator.valid_times()) == [
+        pd.Timestamp("2019-04-17 00:00"), pd.Timestamp("2019-04-17 00:15")]
+
+
+def test_aggregate_window_count_and_last():
+    grid = earth_networks.Grid((0., 2.), (0., 1.), (1, 2))
+    columns = np.zeros(4, dtype=earth_networks.COLUMNS)
+    minute = earth_networks.NS_PER_MINUTE
+    columns["date"] = [0, 10, minute + 5, 3 * minute]
+    columns["flash_type"] = [0, 0, 1, 0]
+    x = np.array([0.5, 0.5, 1.5, 0.5])
+    y = np.full(4, 0.5)
+    agg = earth_networks.aggregate(columns, x, y, grid)
+    assert list(agg.count) == [2, 1, 1]
+    start = np.datetime64(0, "ns")
+    end = np.datetime64(2 * minute, "ns")
+    result = earth_networks.window_count([agg], start, end, None, grid)
+    np.testing.assert_array_equal(result, [[2, 1]])
+    result = earth_networks.window_count([agg], start, end, [0], grid)
+    np.testing.assert_array_equal(result, [[2, 0]])
+    result = earth_networks.window_last([agg], start, end, None, grid)
+    np.testing.assert_array_equal(result, [[10, minute + 5]])
+
+
+def test_bin_points_outside_grid():
+    grid = earth_networks.Grid((0., 2.), (0., 1.), (1, 2))
+    result = earth_networks.bin_points([-1, 1.5, 3], [0.5, 0.5, 0.5], grid)
+    assert list(result) == [-1, 1, -1]
+
+
+def test_tail_parses_appended_rows(tmpdir):
+    path = str(tmpdir / "live.txt")
+    with open(path, "w") as stream:
+        stream.write(LINES[0] + "\n" + LINES[1][:20])
+    tail = earth_networks.Tail(path)
+    assert len(tail.update()) == 1
+    with open(path, "a") as stream:
+        stream.write(LINES[1][20:] + "\n")
+    rows = tail.update()
+    assert len(rows) == 1
+    assert (rows["date"][0].astype("datetime64[ns]") ==
+            np.datetime64("2019-04-17T00:00:01.093", "ns"))
+    assert len(tail.columns) == 2
+    assert len(tail.update()) == 0
+
+
+def test_loader_uses_followed_file(tmpdir):
+    path = str(tmpdir / "followed.txt")
+    with open(path, "w") as stream:
+        stream.write(LINES[0] + "\n")
+    earth_networks.follow(path)
+    try:
+        loader = earth_networks.Loader()
+        assert len(loader.load([path])) == 1
+        with open(path, "a") as stream:
+            stream.write(LINES[1] + "\n")
+        assert len(loader.load([path])) == 2
+    finally:
+        earth_networks._TAILS.pop(path, None)
+
+
+def test_unfollow_caches_columns_and_loader_falls_back(tmpdir, monkeypatch):
+    monkeypatch.setattr(forest.data, "CACHE_DIRECTORY", str(tmpdir / "cache"))
+    path = str(tmpdir / "retired.txt")
+    with open(path, "w") as stream:
+        stream.write(LINES[0] + "\n" + LINES[1] + "\n")
+    earth_networks.follow(path).update()
+    earth_networks.unfollow(path)
+    assert path not in earth_networks._TAILS
+    assert len(glob.glob(str(tmpdir / "cache" / "earth_networks" / "*.npy"))) == 1
+    assert len(earth_networks.Loader().load([path])) == 2
+
+
+def test_tail_update_does_not_write_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(forest.data, "CACHE_DIRECTORY", str(tmpdir / "cache"))
+    path = str(tmpdir / "live.txt")
+    with open(path, "w") as stream:
+        stream.write(LINES[0] + "\n")
+    earth_networks.Tail(path).update()
+    assert glob.glob(str(tmpdir / "cache" / "**" / "*.npy"),
+                     recursive=True) == []
+
+
+def test_point_rows_bins_onto_viewport():
+    grid = earth_networks.Grid((0., 4.), (0., 1.), (1, 4))
+    minute = earth_networks.NS_PER_MINUTE
+    columns = np.zeros(4, dtype=earth_networks.COLUMNS)
+    columns["date"] = [0, 30 * 10**9, 61 * minute, 5]
+    columns["flash_type"] = [0, 1, 0, 0]
+    x = np.array([0.5, 3.5, 0.5, 9.])
+    y = np.full(4, 0.5)
+    start = np.datetime64(0, "ns")
+    end = np.datetime64(60 * minute, "ns")
+    rows = earth_networks.point_rows(columns, x, y, start, end, None, grid)
+    result = earth_networks.count_image(rows, grid)
+    np.testing.assert_array_equal(result, [[1, 0, 0, 1]])
+    result = earth_networks.last_image(rows, grid)
+    assert result[0, 3] == 30 * 10**9
+
+
+def test_view_image_grid_follows_zoom():
+    figure = Mock()
+    figure.plot_width, figure.plot_height = 200, 100
+    figure.inner_width = figure.inner_height = None
+    view = earth_networks.View(Mock(), Mock())
+    view.figures.append(figure)
+    (x0, x1), (y0, y1) = view.grid.x_range, view.grid.y_range
+    figure.x_range.start, figure.x_range.end = x0, x1
+    figure.y_range.start, figure.y_range.end = y0, y1
+    assert view.image_grid() == view.grid
+    figure.x_range.end = x0 + (x1 - x0) / 10
+    grid = view.image_grid()
+    assert grid.shape == (50, 100)
+    assert grid.x_range == (x0, x0 + (x1 - x0) / 10)
@@ -0,0 +1,106 @@
+import datetime as dt
+from unittest.mock import Mock
+import numpy as np
+import forest.db
+from forest import frame_cache
+
+
+def test_frame_key():
+    state = forest.db.State(variable="air_temperature",
+                            initial_time="2020-01-01 00:00:00",
+                            valid_time=dt.datetime(2020, 1, 1, 3),
+                            pressure=850.)
+    result = frame_cache.frame_key(state)
+    expect = "air_temperature|2020-01-01 00:00:00|2020-01-01 03:00:00|850.0"
+    assert result == expect
+
+
+def test_frame_keys_sorted_like_time_ui():
+    state = forest.db.State(variable="v",
+                            valid_times=[dt.datetime(2020, 1, 2),
+                                         dt.datetime(2020, 1, 1)])
+    result = frame_cache.frame_keys(state)
+    assert result == [
+        "v|None|2020-01-01 00:00:00|None",
+        "v|None|2020-01-02 00:00:00|None"]
+
+
+def test_show_loads_new_frame():
+    source = frame_cache.FrameCacheSource()
+    load = Mock(return_value={"image": [[[0]]]})
+    source.show("a", load)
+    load.assert_called_once_with()
+    assert source.key == "a"
+    assert source.data["frame"] == ["a"]
+
+
+def test_show_cached_frame_only_sends_key():
+    source = frame_cache.FrameCacheSource()
+    source.show("a", lambda: {"image": [[[0]]]})
+    source.show("b", lambda: {"image": [[[1]]]})
+    load = Mock()
+    source.show("a", load)
+    load.assert_not_called()
+    assert source.key == "a"
+    assert source.data["frame"] == ["b"]
+    assert source.current["image"] == [[[0]]]
+
+
+def test_show_evicts_least_recently_used():
+    source = frame_cache.FrameCacheSource(max_frames=2)
+    for key in ["a", "b", "c"]:
+        source.show(key, lambda: {"image": [[[0]]]})
+    load = Mock(return_value={"image": [[[1]]]})
+    source.show("a", load)
+    load.assert_called_once_with()
+
+
+def test_empty_frames_not_cached():
+    source = frame_cache.FrameCacheSource()
+    source.show("a", lambda: {"image": []})
+    assert source.key == ""
+    load = Mock(return_value={"image": []})
+    source.show("a", load)
+    load.assert_called_once_with()
+
+
+def test_miss_resends_frame():
+    source = frame_cache.FrameCacheSource()
+    source.show("a", lambda: {"image": [[[0]]]})
+    source.show("b", lambda: {"image": [[[1]]]})
+    source.key = "a"
+    source.miss = "a"
+    assert source.data["frame"] == ["a"]
+    assert source.miss == ""
+
+
+def test_max_frames_grows_to_hold_every_key():
+    source = frame_cache.FrameCacheSource()
+    source.keys = [str(i) for i in range(40)]
+    source.show("0", lambda: {"image": [np.zeros((2, 2))]})
+    assert source.max_frames == 40
+
+
+def test_max_frames_limited_by_bytes():
+    source = frame_cache.FrameCacheSource(max_bytes=1100)
+    source.keys = [str(i) for i in range(40)]
+    source.show("0", lambda: {"image": [np.zeros((8, 8))]})
+    assert source.max_frames == 2
+
+
+def test_server_does_not_hold_cached_frames():
+    source = frame_cache.FrameCacheSource()
+    source.show("a", lambda: {"image": [np.zeros((2, 2))]})
+    source.show("b", lambda: {"image": [np.ones((2, 2))]})
+    assert all(callable(load) for load in source._frames.values())
+
+
+def test_miss_loads_frame_again():
+    source = frame_cache.FrameCacheSource()
+    load = Mock(return_value={"image": [[[0]]]})
+    source.show("a", load)
+    source.show("b", lambda: {"image": [[[1]]]})
+    source.key = "a"
+    source.miss = "a"
+    assert load.call_count == 2
+    assert source.data["frame"] == ["a"]
@@ -0,0 +1,96 @@
+import pytest
+import numpy as np
+import numpy.testing as npt
+from forest import geo
+
+
+@pytest.mark.parametrize("lons,lats,lon,lat,expect", [
+    # Regular axes
+    ([0, 1, 2], [10, 20, 30], 1.4, 26, (1, 2)),
+    # Descending latitudes
+    ([0, 1, 2], [30, 20, 10], 0, 26, (0, 0)),
+    # Irregular axes use searchsorted
+    ([0, 1, 5], [0, 2, 3], 3.1, 2.4, (2, 1)),
+    # Global 0-360 grid queried with negative longitude
+    (np.arange(0, 360, 1.), [0], -0.2, 0, (0, 0)),
+    (np.arange(0, 360, 1.), [0], -10, 0, (350, 0)),
+    # Regional -180-180 grid queried with 0-360 longitude
+    ([-10, -5, 0, 5], [0], 354, 0, (1, 0)),
+])
+def test_nearest_index_1d(lons, lats, lon, lat, expect):
+    index = geo.NearestIndex(lons, lats)
+    assert index(lon, lat) == expect
+
+
+def test_nearest_index_vectorised():
+    index = geo.NearestIndex([0, 1, 2], [0, 1])
+    i, j = index(np.array([0.1, 1.9]), np.array([0.9, 0.1]))
+    npt.assert_array_equal(i, [0, 2])
+    npt.assert_array_equal(j, [1, 0])
+
+
+def test_nearest_index_2d():
+    lons, lats = np.meshgrid([0, 1, 2], [10, 11])
+    index = geo.NearestIndex(lons + 0.1 * lats, lats)
+    assert index(2.1, 11.2) == (1, 1)
+
+
+def test_nearest_index_cached_by_grid():
+    a = geo.nearest_index(np.array([0, 1, 2]), np.array([0, 1]))
+    b = geo.nearest_index([0., 1., 2.], [0., 1.])
+    c = geo.nearest_index([0., 1., 3.], [0., 1.])
+    assert a is b
+    assert a is not c
+
+
+def test_reprojection_plan_coarsens_grid():
+    lons = np.linspace(-19, 53, 180)
+    lats = np.linspace(-13, 23, 90)
+    plan = geo.reprojection_plan(lons, lats, scale=2)
+    assert plan.window == (slice(0, 90), slice(0, 180))
+    assert plan.rows.shape == (45,)
+    assert plan.cols.shape == (90,)
+    gx, gy = geo.web_mercator_grid(lons, lats)
+    np.testing.assert_almost_equal(plan.x, gx.min())
+    np.testing.assert_almost_equal(plan.dw, gx.max() - gx.min())
+    np.testing.assert_almost_equal(plan.dh, gy.max() - gy.min())
+
+
+def test_reprojection_plan_descending_latitudes():
+    lats = np.linspace(10, -10, 5)
+    plan = geo.reprojection_plan([0, 1], lats, scale=1)
+    np.testing.assert_array_equal(plan.rows, [4, 3, 2, 1, 0])
+
+
+def test_reprojection_plan_crops_window():
+    lons, lats = np.arange(10.), np.arange(8.)
+    plan = geo.reprojection_plan(lons, lats, scale=1,
+                                 lon_range=(2, 5), lat_range=(1, 3))
+    assert plan.window == (slice(1, 4), slice(2, 6))
+    np.testing.assert_array_equal(plan.cols, [0, 1, 2, 3])
+    np.testing.assert_array_equal(plan.rows, [0, 1, 2])
+
+
+def test_reprojection_plan_outside_grid():
+    assert geo.reprojection_plan([0, 1], [0, 1],
+                                 lon_range=(5, 6)) is None
+
+
+def test_shared_plan_cached_by_grid():
+    geo._PLANS.clear()
+    a = geo.shared_plan(np.array([0, 1, 2]), np.array([0, 1]), scale=1)
+    b = geo.shared_plan([0., 1., 2.], [0., 1.], scale=1)
+    c = geo.shared_plan([0., 1., 2.], [0., 1.], scale=2)
+    assert a is b
+    assert a is not c
+    assert len(geo._PLANS) == 2
+
+
+def test_shared_projection_cached_by_grid():
+    geo._PROJECTIONS.clear()
+    lons = np.array([[0., 1.], [0., 1.]])
+    lats = np.array([[0., 0.], [1., 1.]])
+    a = geo.shared_projection(lons, lats)
+    b = geo.shared_projection(lons.copy(), lats.copy())
+    assert a is b
+    assert len(geo._PROJECTIONS) == 1
@@ -0,0 +1,106 @@
+import os
+import json
+import datetime as dt
+import numpy as np
+from forest import image_cache
+
+
+def test_image_key_normalises_times():
+    a = image_cache.image_key("*.nc", "v", "2020-01-01 00:00:00",
+                              dt.datetime(2020, 1, 1, 3), 850.)
+    b = image_cache.image_key("*.nc", "v", dt.datetime(2020, 1, 1),
+                              np.datetime64("2020-01-01T03:00:00"), 850.)
+    assert a == b
+
+
+def test_image_cache_get_missing_key(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    assert cache.get(("key",)) is None
+    assert ("key",) not in cache
+
+
+def test_image_cache_put_get(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    image = np.ma.masked_array([[1, 2], [3, 4]], mask=[[0, 1], [0, 0]])
+    data = {
+        "x": [np.float64(0)],
+        "y": [0.],
+        "dw": [1.],
+        "dh": [1.],
+        "image": [image],
+        "units": ["K"]}
+    cache.put(("key",), data)
+    result = cache.get(("key",))
+    assert ("key",) in cache
+    assert result["x"] == [0.]
+    assert result["units"] == ["K"]
+    np.testing.assert_array_equal(result["image"][0].mask, image.mask)
+    np.testing.assert_array_equal(result["image"][0].compressed(),
+                                  image.compressed())
+
+
+def _data(n=8):
+    return {"x": [0.], "image": [np.zeros((n, n))]}
+
+
+def test_image_cache_ignores_stale_source(tmpdir):
+    source = tmpdir.join("file.nc")
+    source.write("")
+    cache = image_cache.ImageCache(str(tmpdir.join("images")))
+    cache.put(("key",), _data(), source=str(source))
+    assert cache.get(("key",)) is not None
+    os.utime(str(source), (0, 0))
+    assert cache.get(("key",)) is None
+
+
+def test_image_cache_lock(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    with cache.lock(("key",)):
+        cache.put(("key",), _data())
+    assert ("key",) in cache
+
+
+def test_image_cache_evicts_least_recently_used(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    for i, key in enumerate([("a",), ("b",), ("c",)]):
+        cache.put(key, _data(32))
+        os.utime(cache.path(key), (i, i))
+    cache.max_bytes = cache.nbytes() - 1
+    cache.evict()
+    assert ("a",) not in cache
+    assert ("b",) in cache
+    assert ("c",) in cache
+
+
+def test_image_cache_evict_keeps_lock_files(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    with cache.lock(("a",)):
+        cache.put(("a",), _data(32))
+    cache.max_bytes = 0
+    cache.evict()
+    lock = os.path.join(os.path.dirname(cache.path(("a",))), ".lock")
+    assert ("a",) not in cache
+    assert os.path.exists(lock)
+
+
+def test_image_cache_evicts_to_low_water_mark(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    for i, key in enumerate([("a",), ("b",), ("c",), ("d",)]):
+        cache.put(key, _data(32))
+        os.utime(cache.path(key), (i, i))
+    nbytes = cache.nbytes()
+    cache.max_bytes = nbytes - 1
+    cache.evict()
+    assert cache.nbytes() <= image_cache.LOW_WATER * cache.max_bytes
+    assert ("d",) in cache
+
+
+def test_image_cache_older_format_is_a_miss(tmpdir):
+    cache = image_cache.ImageCache(str(tmpdir))
+    path = cache.path(("key",))
+    os.makedirs(path)
+    with open(os.path.join(path, "meta.json"), "w") as stream:
+        json.dump({"x": [0.]}, stream)
+    assert cache.get(("key",)) is None
+    cache.put(("key",), _data())
+    assert cache.get(("key",)) is not None
@@ -6,6 +6,8 @@ import numpy as np
 import numpy.testing as npt
 import datetime as dt
 import bokeh.plotting
+import bokeh.document
+import forest.catalogue
 from forest import screen, redux, rx, config
 from forest import _profile as profile
 
@@ -74,6 +76,17 @@ def test_profile_view():
     profile.ProfileView(figure, {})
 
 
+def test_profile_view_redraws_when_catalogue_updates():
+    figure = bokeh.plotting.figure()
+    document = bokeh.document.Document()
+    document.add_root(figure)
+    view = profile.ProfileView(figure, {})
+    assert view in forest.catalogue.get_catalogue()._subscribers
+    view.render(dt.datetime(2019, 1, 1), "mslp", 0, 0, True)
+    view.on_catalogue()
+    assert len(document.session_callbacks) == 1
+
+
 def test_profile_view_render():
     figure = bokeh.plotting.figure()
     view = profile.ProfileView(figure, {})
@@ -380,3 +393,63 @@ class TestProfile(unittest.TestCase):
             '2019-01-01 00:00',
             '2019-01-01 12:00'], dtype='datetime64[s]')
         npt.assert_array_equal(expect, result)
+
+
+def test_profile_locator_valid_time_index_built_once(tmpdir):
+    path = str(tmpdir / "file_20190101T0000Z.nc")
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 6)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, "air_temperature", times, [1000, 500],
+                    [0, 1], [0, 1], np.zeros((2, 2, 2, 2)))
+    locator = profile.ProfileLocator([path])
+    initial_time = dt.datetime(2019, 1, 1)
+    for _ in range(2):
+        assert locator.locate(initial_time, times[1]) == [path]
+    assert locator.locate(initial_time, dt.datetime(2019, 1, 2)) == []
+    assert list(locator._valid_times.keys()) == [path]
+
+
+def test_profile_locator_valid_times_follow_modified_file(tmpdir):
+    path = str(tmpdir / "file_20190101T0000Z.nc")
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 6)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, "air_temperature", times[:1], [1000, 500],
+                    [0, 1], [0, 1], np.zeros((1, 2, 2, 2)))
+    os.utime(path, (0, 0))
+    locator = profile.ProfileLocator([path])
+    initial_time = dt.datetime(2019, 1, 1)
+    assert locator.locate(initial_time, times[1]) == []
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, "air_temperature", times, [1000, 500],
+                    [0, 1], [0, 1], np.zeros((2, 2, 2, 2)))
+    assert locator.locate(initial_time, times[1]) == [path]
+
+
+def test_profile_locator_forgets_files_no_longer_found(tmpdir):
+    paths = [str(tmpdir / "file_20190101T0000Z_{}.nc".format(i))
+             for i in range(2)]
+    times = [dt.datetime(2019, 1, 1)]
+    for path in paths:
+        with netCDF4.Dataset(path, "w") as dataset:
+            variable_4d(dataset, "air_temperature", times, [1000],
+                        [0, 1], [0, 1], np.zeros((1, 1, 2, 2)))
+    locator = profile.ProfileLocator(paths)
+    initial_time = dt.datetime(2019, 1, 1)
+    assert locator.locate(initial_time, times[0]) == paths
+    locator._paths = paths[1:]
+    assert locator.locate(initial_time, times[0]) == paths[1:]
+    assert list(locator._valid_times.keys()) == paths[1:]
+
+
+def test_profile_loader_4d_hyperslab(tmpdir):
+    path = str(tmpdir / "file.nc")
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 6)]
+    pressures = [1000, 500, 250]
+    values = np.arange(2*3*2*2).reshape(2, 3, 2, 2)
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, "air_temperature", times, pressures,
+                    [0, 1], [0, 1], values)
+    loader = profile.ProfileLoader([path])
+    result = loader.profile_file(path, "air_temperature", 0.9, 0.1, times[1])
+    npt.assert_array_equal(result["x"], values[1, :, 0, 1])
+    npt.assert_array_equal(result["y"], pressures)
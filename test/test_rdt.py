@@ -6,6 +6,7 @@ import os
 import glob
 import json
 import numpy as np
+import netCDF4
 import forest.drivers
 from forest.drivers import rdt
 from forest import (
@@ -42,10 +43,10 @@ def test_loader(tmpdir):
     with open(path, "w") as stream:
         stream.write(content)
     loader = rdt.Loader(path)
-    json_texts = loader.load_date(dt.datetime(2020, 1, 1))
-    polygons = json_texts[0]
-    result = json.loads(polygons)
-    assert result == {"features": []}
+    polygons = loader.load_date(dt.datetime(2020, 1, 1))[0]
+    assert polygons["xs"] == []
+    assert polygons["ys"] == []
+    assert polygons["PhaseLife"] == []
 
 
 @pytest.mark.parametrize("state", [
@@ -108,3 +109,109 @@ def test_in_bounds_given_point_outside_bounds():
     result = locate.in_bounds(bounds, time)
     expect = [False]
     np.testing.assert_array_equal(expect, result)
+
+
+def rdt_netcdf(path):
+    """Minimal NWCSAF RDT file with two cloud cells"""
+    with netCDF4.Dataset(path, "w") as dataset:
+        dataset.createDimension("recNUM", 2)
+        dataset.createDimension("nlevel", 2)
+        dataset.createDimension("ncontour", 4)
+        dataset.createDimension("nbpttraj", 3)
+        for name in ("LonContour", "LatContour"):
+            var = dataset.createVariable(
+                name, "f", ("recNUM", "nlevel", "ncontour"), fill_value=-999)
+            values = np.ma.masked_all((2, 2, 4))
+            values[0, 0, :3] = [0, 1, 0]
+            values[1, 0, :4] = [10, 11, 11, 10]
+            if name == "LatContour":
+                values[0, 0, :3] = [0, 0, 1]
+                values[1, 0, :4] = [10, 10, 11, 11]
+            var[:] = values
+        for name in ("LonG", "LatG"):
+            var = dataset.createVariable(name, "f", ("recNUM", "nlevel"))
+            var[:] = [[0.5, 0.5], [10.5, 10.5]]
+        for name in ("LonTrajCellCG", "LatTrajCellCG"):
+            var = dataset.createVariable(
+                name, "f", ("recNUM", "nbpttraj"), fill_value=-999)
+            values = np.ma.masked_all((2, 3))
+            values[0, :2] = [0, 1]
+            values[1, :3] = [10, 11, 12]
+            var[:] = values
+        var = dataset.createVariable("NumIdCell", "i", ("recNUM",))
+        var[:] = [7, 8]
+        var = dataset.createVariable("PhaseLife", "i", ("recNUM",))
+        var[:] = [0, 3]
+        var = dataset.createVariable("CTPressure", "f", ("recNUM",))
+        var[:] = [25000., 30000.]
+        var = dataset.createVariable("MvtSpeed", "f", ("recNUM",))
+        var[:] = [0., 10.]
+        var = dataset.createVariable("MvtDirection", "f", ("recNUM",))
+        var[:] = [0., 90.]
+
+
+def test_get_rdt_netcdf(tmpdir):
+    path = str(tmpdir / "S_NWC_RDT-CW_MSG4_Africa-VISIR_20200101T000000Z.nc")
+    rdt_netcdf(path)
+    polygons, tail_lines, tail_points, centre_points = rdt.getRDT(
+        path, 0, "All")
+    assert [len(xs) for xs in polygons["xs"]] == [3, 4]
+    assert [len(ys) for ys in polygons["ys"]] == [3, 4]
+    assert polygons["PhaseLife"] == ["Triggering", "Mature"]
+    np.testing.assert_array_equal(polygons["CTPressure"], [250, 300])
+    np.testing.assert_array_equal(polygons["NumIdCell"], [7, 8])
+    assert polygons["CTPhase"] == ["-", "-"]
+    assert [len(xs) for xs in tail_lines["xs"]] == [2, 3]
+    assert len(tail_points["x"]) == 5
+    np.testing.assert_array_equal(tail_points["NumIdCell"],
+                                  [7, 7, 8, 8, 8])
+    assert centre_points["NumIdCell"] == [7, 8]
+    assert len(centre_points["Arrowxs"]) == 2
+
+
+def test_get_rdt_netcdf_cached_per_file(tmpdir):
+    path = str(tmpdir / "S_NWC_RDT-CW_MSG4_Africa-VISIR_20200101T000000Z.nc")
+    rdt_netcdf(path)
+    rdt.getRDT(path, 0, "All")
+    with patch("forest.drivers.rdt.read_records") as read_records:
+        tail_lines = rdt.getRDT(path, 0, "All")[1]
+        tail_lines["xs"] = []
+        assert len(rdt.getRDT(path, 0, "All")[1]["xs"]) == 2
+    read_records.assert_not_called()
+
+
+def test_get_rdt_netcdf_cache_not_modified_in_place(tmpdir):
+    path = str(tmpdir / "S_NWC_RDT-CW_MSG4_Africa-VISIR_20200101T000000Z.nc")
+    rdt_netcdf(path)
+    polygons, tail_lines = rdt.getRDT(path, 0, "All")[:2]
+    polygons["PhaseLife"].append("Dissipating")
+    polygons["xs"][0][0] = -1.
+    tail_lines["xs"][0][0] = -1.
+    polygons, tail_lines = rdt.getRDT(path, 0, "All")[:2]
+    assert polygons["PhaseLife"] == ["Triggering", "Mature"]
+    assert polygons["xs"][0][0] != -1.
+    assert tail_lines["xs"][0][0] != -1.
+
+
+def test_load_polygon_json_columns(tmpdir):
+    path = str(tmpdir / "rdt_202001010000.json")
+    content = {
+        "features": [
+            {
+                "geometry": {"coordinates": [[[0, 0], [1, 0], [0, 1]]]},
+                "properties": {"PhaseLife": 2, "NumIdCell": 1}
+            },
+            {
+                "geometry": {"coordinates": [[[5, 5], [6, 5], [6, 6], [5, 6]]]},
+                "properties": {"PhaseLife": 4, "BTmin": 210.5}
+            }
+        ]
+    }
+    with open(path, "w") as stream:
+        json.dump(content, stream)
+    result = rdt.Loader.load_polygon_json(path)
+    assert [len(xs) for xs in result["xs"]] == [3, 4]
+    assert result["PhaseLife"] == ["Growing", "Decaying"]
+    np.testing.assert_array_equal(result["NumIdCell"], [1, np.nan])
+    assert len(result["CType"]) == 2
+    assert all(len(values) == 2 for values in result.values())
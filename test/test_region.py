@@ -0,0 +1,211 @@
+import datetime as dt
+import unittest.mock
+import netCDF4
+import numpy as np
+import numpy.testing as npt
+import bokeh.models
+import bokeh.plotting
+import forest.region
+from forest import region
+
+
+SQUARE = ((0.5, 0.5), (2.5, 0.5), (2.5, 2.5), (0.5, 2.5))
+
+
+def variable_surface(dataset, variable, times, longitudes, latitudes,
+                     values):
+    variable_4d(dataset, variable, times, None, longitudes, latitudes,
+                values)
+
+
+def variable_4d(dataset, variable, times, pressures, longitudes,
+                latitudes, values):
+    dataset.createDimension("latitude", len(latitudes))
+    dataset.createDimension("longitude", len(longitudes))
+    dataset.createDimension("time", len(times))
+    dimensions = ("time", "latitude", "longitude")
+    if pressures is not None:
+        dataset.createDimension("pressure", len(pressures))
+        var = dataset.createVariable("pressure", "d", ("pressure",))
+        var[:] = pressures
+        dimensions = ("time", "pressure", "latitude", "longitude")
+    var = dataset.createVariable("longitude", "d", ("longitude",))
+    var[:] = longitudes
+    var = dataset.createVariable("latitude", "d", ("latitude",))
+    var[:] = latitudes
+    units = "hours since 1970-01-01 00:00:00"
+    var = dataset.createVariable("time", "d", ("time",))
+    var.units = units
+    var[:] = netCDF4.date2num(times, units=units)
+    var = dataset.createVariable(variable, "f", dimensions)
+    var.coordinates = "forecast_reference_time"
+    var[:] = values
+
+
+def area_mean(cells, lats):
+    weights = np.cos(np.radians(lats))
+    return np.average(cells, axis=1, weights=weights)
+
+
+def test_polygon_mask_1d_axes():
+    lons = [0, 1, 2, 3]
+    lats = [0, 1, 2]
+    result = region.polygon_mask(lons, lats, SQUARE)
+    expect = [
+        [False, False, False, False],
+        [False, True, True, False],
+        [False, True, True, False]]
+    npt.assert_array_equal(result, expect)
+
+
+def test_polygon_mask_triangle():
+    lons, lats = np.meshgrid([0, 1, 2, 3], [0, 1, 2, 3])
+    triangle = ((-0.5, -0.5), (3.7, -0.5), (-0.5, 3.7))
+    result = region.polygon_mask(lons, lats, triangle)
+    npt.assert_array_equal(result, (lons + lats) <= 3)
+
+
+def test_polygon_mask_given_0_360_longitudes():
+    lons = [0, 90, 180, 270]
+    lats = [0]
+    vertices = ((-100, -1), (-80, -1), (-80, 1), (-100, 1))
+    result = region.polygon_mask(lons, lats, vertices)
+    npt.assert_array_equal(result, [[False, False, False, True]])
+
+
+def test_reduce_ignores_missing_values():
+    block = np.ma.masked_array([[[1., 2.], [3., 100.]]],
+                               mask=[[[False, False], [False, True]]])
+    mask = np.ones((2, 2), dtype=bool)
+    result = region.RegionLoader.reduce(block, mask)
+    npt.assert_array_almost_equal(result["mean"], [2.])
+    npt.assert_array_almost_equal(result["max"], [3.])
+    npt.assert_array_almost_equal(result["p50"], [2.])
+
+
+def test_reduce_weights_mean_by_area():
+    block = np.array([[[1., 1.], [4., 4.]]])
+    mask = np.ones((2, 2), dtype=bool)
+    weights = [[3., 3.], [1., 1.]]
+    result = region.RegionLoader.reduce(block, mask, weights)
+    npt.assert_array_almost_equal(result["mean"], [1.75])
+    npt.assert_array_almost_equal(result["max"], [4.])
+
+
+def test_reduce_weighted_mean_ignores_missing_values():
+    block = np.ma.masked_array([[[1., 2.], [3., 100.]]],
+                               mask=[[[False, False], [False, True]]])
+    mask = np.ones((2, 2), dtype=bool)
+    weights = [[1., 1.], [2., 2.]]
+    result = region.RegionLoader.reduce(block, mask, weights)
+    npt.assert_array_almost_equal(result["mean"], [9. / 4.])
+
+
+def test_statistics_file_surface_variable(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "air_pressure_at_sea_level"
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 12)]
+    values = np.arange(2 * 3 * 4).reshape(2, 3, 4)
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_surface(dataset, variable, times,
+                         [0, 1, 2, 3], [0, 1, 2], values)
+    loader = region.RegionLoader([path])
+    result = loader.statistics_file(path, variable, SQUARE)
+    cells = values[:, 1:, 1:3].reshape(2, -1)
+    npt.assert_array_equal(result["x"], times)
+    npt.assert_array_almost_equal(result["mean"],
+                                  area_mean(cells, [1, 1, 2, 2]))
+    npt.assert_array_almost_equal(result["max"], cells.max(axis=1))
+    npt.assert_array_almost_equal(result["p90"],
+                                  np.percentile(cells, 90, axis=1))
+
+
+def test_statistics_file_reads_time_steps_in_chunks(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "air_pressure_at_sea_level"
+    times = [dt.datetime(2019, 1, 1, hour) for hour in range(5)]
+    values = np.arange(5 * 3 * 4).reshape(5, 3, 4)
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_surface(dataset, variable, times,
+                         [0, 1, 2, 3], [0, 1, 2], values)
+    loader = region.RegionLoader([path], max_cells=8)
+    result = loader.statistics_file(path, variable, SQUARE)
+    cells = values[:, 1:, 1:3].reshape(5, -1)
+    npt.assert_array_almost_equal(result["mean"],
+                                  area_mean(cells, [1, 1, 2, 2]))
+
+
+def test_statistics_file_selects_pressure_level(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "wet_bulb_potential_temperature"
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 6)]
+    pressures = [1000., 500.]
+    values = np.arange(2 * 2 * 3 * 4).reshape(2, 2, 3, 4)
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, variable, times, pressures,
+                    [0, 1, 2, 3], [0, 1, 2], values)
+    loader = region.RegionLoader([path])
+    result = loader.statistics_file(path, variable, SQUARE, pressure=500.)
+    cells = values[:, 1, 1:, 1:3].reshape(2, -1)
+    npt.assert_array_almost_equal(result["mean"],
+                                  area_mean(cells, [1, 1, 2, 2]))
+
+
+def test_statistics_file_outside_grid_returns_empty(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "air_pressure_at_sea_level"
+    times = [dt.datetime(2019, 1, 1)]
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_surface(dataset, variable, times,
+                         [0, 1, 2, 3], [0, 1, 2], np.zeros((1, 3, 4)))
+    vertices = ((50, 50), (51, 50), (51, 51))
+    loader = region.RegionLoader([path])
+    result = loader.statistics_file(path, variable, vertices)
+    assert len(result["x"]) == 0
+
+
+def test_mask_shared_between_files(tmpdir):
+    variable = "air_pressure_at_sea_level"
+    times = [dt.datetime(2019, 1, 1)]
+    paths = [str(tmpdir / "a.nc"), str(tmpdir / "b.nc")]
+    for path in paths:
+        with netCDF4.Dataset(path, "w") as dataset:
+            variable_surface(dataset, variable, times,
+                             [0, 1, 2, 3], [0, 1, 2], np.zeros((1, 3, 4)))
+    forest.region._MASKS.clear()
+    loader = region.RegionLoader(paths)
+    for path in paths:
+        loader.statistics_file(path, variable, SQUARE)
+    assert len(forest.region._MASKS) == 1
+
+
+def test_statistics_file_weights_mean_by_latitude(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "air_pressure_at_sea_level"
+    times = [dt.datetime(2019, 1, 1)]
+    values = np.array([[[0., 0.], [1., 1.]]])
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_surface(dataset, variable, times,
+                         [0, 1], [0, 60], values)
+    vertices = ((-1, -1), (2, -1), (2, 61), (-1, 61))
+    loader = region.RegionLoader([path])
+    result = loader.statistics_file(path, variable, vertices)
+    npt.assert_array_almost_equal(result["mean"], [1. / 3.])
+
+
+def test_region_view_skips_shapes_while_hidden():
+    figure = bokeh.plotting.figure()
+    loader = unittest.mock.Mock()
+    loader.statistics.return_value = {"x": []}
+    view = region.RegionView(figure, {"label": loader})
+    source = bokeh.models.ColumnDataSource({
+        "xs": [[0, 1e5, 1e5]],
+        "ys": [[0, 0, 1e5]],
+        "colour": ["red"]})
+    view.add_source(source)
+    variables = (("label", "air_temperature"),)
+    view.render(False, None, None, ())
+    view.on_shapes("data", None, None)
+    loader.statistics.assert_not_called()
+    view.render(True, dt.datetime(2020, 1, 1), None, variables)
+    loader.statistics.assert_called_once()
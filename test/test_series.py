@@ -7,6 +7,8 @@ import numpy as np
 import numpy.testing as npt
 import datetime as dt
 import bokeh.plotting
+import bokeh.document
+import forest.catalogue
 from forest import screen, series, redux, rx, config
 
 
@@ -73,6 +75,17 @@ def test_series_view():
     series.SeriesView(figure, {})
 
 
+def test_series_view_redraws_when_catalogue_updates():
+    figure = bokeh.plotting.figure()
+    document = bokeh.document.Document()
+    document.add_root(figure)
+    view = series.SeriesView(figure, {})
+    assert view in forest.catalogue.get_catalogue()._subscribers
+    view.render(dt.datetime(2019, 1, 1), "mslp", 0, 0, True)
+    view.on_catalogue()
+    assert len(document.session_callbacks) == 1
+
+
 def test_series_view_render():
     figure = bokeh.plotting.figure()
     view = series.SeriesView(figure, {})
@@ -321,6 +334,41 @@ def test_4d_variable(tmpdir):
     npt.assert_array_equal(expect["y"], result["y"])
 
 
+def test_4d_variable_level_switch_reuses_column(tmpdir):
+    path = str(tmpdir / "file.nc")
+    variable = "wet_bulb_potential_temperature"
+    times = [dt.datetime(2019, 1, 1), dt.datetime(2019, 1, 1, 6)]
+    pressures = [1000., 500.]
+    values = np.arange(2*2*2*2).reshape(2, 2, 2, 2)
+    with netCDF4.Dataset(path, "w") as dataset:
+        variable_4d(dataset, variable, times, pressures,
+                    [0, 1], [0, 1], values)
+    loader = series.SeriesLoader([path])
+    loader.series_file(path, variable, 0.1, 0.1, pressure=500)
+    hits = loader._column.cache_info().hits
+    result = loader.series_file(path, variable, 0.1, 0.1, pressure=1000)
+    assert loader._column.cache_info().hits == hits + 1
+    npt.assert_array_equal(result["y"], values[:, 0, 0, 0])
+
+
+def test_series_loader_shares_grid_between_files(tmpdir):
+    variable = "wet_bulb_potential_temperature"
+    times = [dt.datetime(2019, 1, 1)]
+    values = np.zeros((1, 1, 2, 2))
+    paths = [str(tmpdir / "a.nc"), str(tmpdir / "b.nc")]
+    for path in paths:
+        with netCDF4.Dataset(path, "w") as dataset:
+            variable_4d(dataset, variable, times, [1000.],
+                        [0, 1], [0, 1], values)
+    loader = series.SeriesLoader(paths)
+    for path in paths:
+        loader.series_file(path, variable, 0.1, 0.1, pressure=1000)
+    mtimes = [os.path.getmtime(path) for path in paths]
+    a, b = [loader._metadata(path, mtime, variable)
+            for path, mtime in zip(paths, mtimes)]
+    assert a.index is b.index
+
+
 @pytest.mark.parametrize("value,expect", [
     (dt.datetime(2020, 1, 1), "2020-01-01 00:00:00"),
     (cftime.DatetimeGregorian(2020, 1, 1), "2020-01-01 00:00:00")
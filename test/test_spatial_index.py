@@ -0,0 +1,93 @@
+from unittest.mock import Mock
+import numpy as np
+import numpy.testing as npt
+from forest import spatial_index
+
+
+def test_line_boxes():
+    xs = [[0, 2, 1], [np.nan, 5], []]
+    ys = [[1, 0, 3], [np.nan, 6], []]
+    result = spatial_index.line_boxes(xs, ys)
+    npt.assert_array_equal(result[0], [0, 0, 2, 3])
+    npt.assert_array_equal(result[1], [5, 6, 5, 6])
+    assert np.isnan(result[2]).all()
+
+
+def test_point_boxes():
+    result = spatial_index.point_boxes([1, 2], [3, 4])
+    npt.assert_array_equal(result, [[1, 3, 1, 3], [2, 4, 2, 4]])
+
+
+def test_spatial_index_query_matches_brute_force():
+    random = np.random.RandomState(0)
+    lower = random.uniform(0, 100, size=(500, 2))
+    size = random.uniform(0, 5, size=(500, 2))
+    boxes = np.hstack([lower, lower + size])
+    index = spatial_index.SpatialIndex(boxes, cells=16)
+    x_range, y_range = (20, 40), (55, 60)
+    result = index.query(x_range, y_range)
+    expect, = np.nonzero((boxes[:, 0] <= 40) & (boxes[:, 2] >= 20) &
+                         (boxes[:, 1] <= 60) & (boxes[:, 3] >= 55))
+    npt.assert_array_equal(result, expect)
+
+
+def test_spatial_index_large_boxes_always_tested():
+    boxes = [[0, 0, 100, 100], [0, 0, 1, 1], [99, 99, 100, 100]]
+    index = spatial_index.SpatialIndex(boxes, cells=8, max_span=4)
+    npt.assert_array_equal(index.large, [0])
+    npt.assert_array_equal(index.query((50, 60), (50, 60)), [0])
+    npt.assert_array_equal(index.query((98, 101), (98, 101)), [0, 2])
+
+
+def test_spatial_index_ignores_invalid_boxes():
+    boxes = [[np.nan] * 4, [1, 1, 2, 2]]
+    index = spatial_index.SpatialIndex(boxes)
+    npt.assert_array_equal(index.query((0, 3), (0, 3)), [1])
+
+
+def test_spatial_index_query_outside_extent():
+    index = spatial_index.SpatialIndex([[0, 0, 1, 1]])
+    assert len(index.query((5, 6), (5, 6))) == 0
+
+
+def test_select():
+    data = {"x": np.array([1, 2, 3]), "xs": [[1], [2, 2], [3]]}
+    result = spatial_index.select(data, [0, 2])
+    npt.assert_array_equal(result["x"], [1, 3])
+    assert result["xs"] == [[1], [3]]
+
+
+def test_culled_source_sends_visible_features():
+    culled = spatial_index.CulledSource({"x": [0, 5, 10], "y": [0, 5, 10],
+                                         "name": ["a", "b", "c"]})
+    assert culled.source.data["name"] == ["a", "b", "c"]
+    culled.cull((-1, 1), (-1, 1))
+    assert culled.source.data["name"] == ["a"]
+
+
+def test_culled_source_streams_newly_visible_features():
+    culled = spatial_index.CulledSource({"x": [0, 5, 10], "y": [0, 5, 10],
+                                         "name": ["a", "b", "c"]})
+    culled.cull((-1, 1), (-1, 1))
+    culled.cull((-1, 6), (-1, 6))
+    assert culled.source.data["name"] == ["a", "b"]
+    npt.assert_array_equal(culled.shown, [0, 1])
+
+
+def test_culled_source_update_keeps_viewport():
+    culled = spatial_index.CulledSource({"x": [], "y": []})
+    culled.cull((-1, 1), (-1, 1))
+    culled.update({"x": [0, 5], "y": [0, 5]})
+    npt.assert_array_equal(culled.source.data["x"], [0])
+
+
+def test_culled_source_max_features():
+    culled = spatial_index.CulledSource({"x": [0, 1, 2], "y": [0, 1, 2]},
+                                        max_features=2)
+    npt.assert_array_equal(culled.source.data["x"], [0, 1])
+
+
+def test_screen_size_prefers_browser_size():
+    figure = Mock(inner_width=800, inner_height=None,
+                  plot_width=600, plot_height=400)
+    assert spatial_index.screen_size(figure) == (800, 400)
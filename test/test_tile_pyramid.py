@@ -0,0 +1,131 @@
+import os
+import datetime as dt
+import pytest
+from unittest.mock import Mock
+import numpy as np
+from forest import tile_pyramid
+
+
+def test_tile_bounds_zoom_zero_covers_world():
+    world = tile_pyramid.WORLD
+    result = tile_pyramid.tile_bounds(0, 0, 0)
+    np.testing.assert_allclose(result, (-world, -world, world, world))
+
+
+def test_tile_bounds_xyz_origin_is_north_west():
+    x_start, y_start, x_end, y_end = tile_pyramid.tile_bounds(1, 0, 0)
+    assert x_end == pytest.approx(0)
+    assert y_start == pytest.approx(0)
+
+
+@pytest.mark.parametrize("x_range,plot_width,expect", [
+    ((-tile_pyramid.WORLD, tile_pyramid.WORLD), 256, 0),
+    ((-tile_pyramid.WORLD, tile_pyramid.WORLD), 1024, 2),
+    ((0, 1), 256, tile_pyramid.MAX_ZOOM),
+    ((None, None), 256, 0),
+])
+def test_zoom_level(x_range, plot_width, expect):
+    assert tile_pyramid.zoom_level(x_range, plot_width) == expect
+
+
+def test_visible_tiles():
+    x_range = (1, 2)
+    y_range = (1, 2)
+    result = list(tile_pyramid.visible_tiles(1, x_range, y_range))
+    assert result == [(1, 1, 0)]
+
+
+def test_visible_tiles_clipped_to_world():
+    world = tile_pyramid.WORLD
+    x_range = (-2 * world, 2 * world)
+    y_range = (-2 * world, 2 * world)
+    result = list(tile_pyramid.visible_tiles(1, x_range, y_range))
+    assert len(result) == 4
+
+
+def _load():
+    lons = np.linspace(0, 10, 11)
+    lats = np.linspace(0, 10, 11)
+    values = np.arange(11 * 11, dtype="f").reshape(11, 11)
+    return lons, lats, values, "K"
+
+
+def test_pyramid_renders_tile_once():
+    load = Mock(side_effect=_load)
+    pyramid = tile_pyramid.TilePyramid()
+    first = pyramid.tile("key", 1, 1, 0, load)
+    second = pyramid.tile("key", 1, 1, 0, load)
+    assert first is second
+    load.assert_called_once_with()
+
+
+def test_pyramid_tile_outside_field_is_none():
+    pyramid = tile_pyramid.TilePyramid()
+    assert pyramid.tile("key", 1, 0, 1, _load) is None
+
+
+def test_pyramid_reads_tiles_from_disk(tmpdir):
+    directory = str(tmpdir)
+    tile_pyramid.TilePyramid(directory).tile("key", 1, 1, 0, _load)
+    load = Mock(side_effect=_load)
+    result = tile_pyramid.TilePyramid(directory).tile("key", 1, 1, 0, load)
+    assert result.shape == (tile_pyramid.TILE_SIZE, tile_pyramid.TILE_SIZE)
+    load.assert_not_called()
+
+
+def test_pyramid_evicts_least_recently_used_tiles(tmpdir):
+    directory = str(tmpdir)
+    tile_pyramid.TilePyramid(directory).tile("key", 1, 1, 0, _load)
+    old, = [path for _, path, _ in
+            tile_pyramid.TilePyramid(directory)._entries()]
+    os.utime(old, (0, 0))
+    pyramid = tile_pyramid.TilePyramid(directory, max_bytes=400000)
+    pyramid.tile("other", 1, 1, 0, _load)
+    paths = [path for _, path, _ in pyramid._entries()]
+    assert len(paths) == 1
+    assert old not in paths
+
+
+def test_pyramid_units_read_from_disk_without_loading_field(tmpdir):
+    directory = str(tmpdir)
+    pyramid = tile_pyramid.TilePyramid(directory)
+    pyramid.tile("key", 1, 1, 0, _load)
+    assert pyramid.units("key", _load) == "K"
+    load = Mock(side_effect=_load)
+    pyramid = tile_pyramid.TilePyramid(directory)
+    pyramid.tile("key", 1, 1, 0, load)
+    assert pyramid.units("key", load) == "K"
+    load.assert_not_called()
+
+
+def test_pyramid_evicts_to_low_water_mark(tmpdir):
+    directory = str(tmpdir)
+    pyramid = tile_pyramid.TilePyramid(directory, max_bytes=600000)
+    for key in ("a", "b", "c"):
+        pyramid.tile(key, 1, 1, 0, _load)
+    assert len(list(pyramid._entries())) == 1
+    assert pyramid._bytes <= tile_pyramid.LOW_WATER * 600000
+
+
+def test_tiled_image_view_key_includes_file_mtime(tmpdir):
+    path = str(tmpdir / "file.nc")
+    with open(path, "w"):
+        pass
+    loader = Mock()
+    loader.name = "Label"
+    loader.locate.return_value = (path, ())
+    loader.field.side_effect = lambda state: _load()
+    pyramid = Mock()
+    pyramid.tile.return_value = None
+    view = tile_pyramid.TiledImageView(loader, pyramid, Mock())
+    view.figures = [Mock(inner_width=256)]
+    view.figures[0].x_range.start = 0
+    view.figures[0].x_range.end = 1
+    view.figures[0].y_range.start = 0
+    view.figures[0].y_range.end = 1
+    time = dt.datetime(2020, 1, 1)
+    view.state = Mock(valid_time=time, initial_time=time,
+                      pressures=[], pressure=None)
+    view.render_tiles()
+    key = pyramid.tile.call_args[0][0]
+    assert key[2:] == (path, os.path.getmtime(path))